@@ -1,9 +1,13 @@
+import hashlib
 import aiohttp
 from typing import Any, Dict, Optional, Tuple
 
 # GraphQL API endpoint
 API_URL = "http://localhost:8000/graphql/"
 
+# Error returned by the server for an unknown persisted query hash
+PERSISTED_QUERY_NOT_FOUND = "PersistedQueryNotFound"
+
 class ApiClient:
     """Client for interacting with the GraphQL API"""
     
@@ -17,62 +21,97 @@ class ApiClient:
         return {}
     
     async def _execute_query(self, query: str, variables: Optional[Dict] = None) -> Tuple[Any, Optional[str]]:
-        """Execute a GraphQL query asynchronously"""
+        """Execute a GraphQL query asynchronously
+        
+        Queries are sent as automatic persisted queries: only the SHA-256 of
+        the query text goes over the wire, and the full text is sent once
+        when the server does not know the hash yet.
+        """
         if variables is None:
             variables = {}
             
         headers = self._get_headers()
         headers["Content-Type"] = "application/json"
         
+        extensions = {
+            "persistedQuery": {
+                "version": 1,
+                "sha256Hash": hashlib.sha256(query.encode("utf-8")).hexdigest(),
+            }
+        }
+        
         async with aiohttp.ClientSession() as session:
             try:
-                async with session.post(
-                    API_URL,
-                    json={"query": query, "variables": variables},
-                    headers=headers
-                ) as response:
+                payload = {"variables": variables, "extensions": extensions}
+                async with session.post(API_URL, json=payload, headers=headers) as response:
                     result = await response.json()
+                
+                if any(error.get("message") == PERSISTED_QUERY_NOT_FOUND for error in result.get("errors", [])):
+                    payload["query"] = query
+                    async with session.post(API_URL, json=payload, headers=headers) as response:
+                        result = await response.json()
                     
-                    if "errors" in result:
-                        return None, result["errors"][0]["message"]
-                        
-                    return result.get("data"), None
+                if "errors" in result:
+                    return None, result["errors"][0]["message"]
+                    
+                return result.get("data"), None
                     
             except Exception as e:
                 return None, str(e)
     
-    async def get_newsletters(self, status=None):
-        """Fetch newsletters from the API"""
+    @staticmethod
+    def _nodes(connection):
+        """Unwrap the nodes of a paginated connection"""
+        if not connection:
+            return []
+        return [edge["node"] for edge in connection.get("edges", [])]
+    
+    async def get_newsletters(self, status=None, first=None, after=None, featured=None,
+                              category_ids=None, search=None, order_by=None):
+        """Fetch a page of newsletters from the API, filtered on the server"""
         query = """
-        query GetNewsletters($status: String) {
-            newsletters(status: $status) {
-                id
-                title
-                subtitle
-                content
-                createdAt
-                publishedAt
-                featured
-                createdBy {
-                    email
-                    firstName
-                    lastName
-                }
-                categories {
-                    id
-                    name
+        query GetNewsletters($status: String, $first: Int, $after: String, $featured: Boolean,
+                             $categoryIds: [ID], $search: String, $orderBy: String) {
+            newsletters(status: $status, first: $first, after: $after, featured: $featured,
+                        categoryIds: $categoryIds, search: $search, orderBy: $orderBy) {
+                edges {
+                    node {
+                        id
+                        title
+                        subtitle
+                        content
+                        createdAt
+                        publishedAt
+                        featured
+                        createdBy {
+                            email
+                            firstName
+                            lastName
+                        }
+                        categories {
+                            id
+                            name
+                        }
+                        coverImage
+                    }
                 }
-                coverImage
             }
         }
         """
         
-        variables = {}
+        variables = {
+            "first": first,
+            "after": after,
+            "featured": featured,
+            "categoryIds": category_ids,
+            "search": search,
+            "orderBy": order_by,
+        }
         if status:
             variables["status"] = status
             
         data, error = await self._execute_query(query, variables)
-        return data.get("newsletters", []) if data else [], error
+        return self._nodes(data.get("newsletters")) if data else [], error
     
     async def get_newsletter_detail(self, newsletter_id):
         """Fetch a specific newsletter by ID"""
@@ -111,61 +150,95 @@ class ApiClient:
         data, error = await self._execute_query(query, {"id": newsletter_id})
         return (data.get("newsletter"), error) if data else (None, error or "No data returned")
     
-    async def get_announcements(self, is_active=True):
-        """Fetch announcements from the API"""
+    async def get_announcements(self, is_active=True, first=None, after=None, priority=None,
+                                category_ids=None, search=None):
+        """Fetch a page of announcements from the API, filtered on the server"""
         query = """
-        query GetAnnouncements($isActive: Boolean) {
-            announcements(isActive: $isActive) {
-                id
-                title
-                content
-                priority
-                isActive
-                createdAt
-                expiryDate
-                createdBy {
-                    id
-                    firstName
-                    lastName
-                }
-                categories {
-                    id
-                    name
+        query GetAnnouncements($isActive: Boolean, $first: Int, $after: String, $priority: [String],
+                               $categoryIds: [ID], $search: String) {
+            announcements(isActive: $isActive, first: $first, after: $after, priority: $priority,
+                          categoryIds: $categoryIds, search: $search) {
+                edges {
+                    node {
+                        id
+                        title
+                        content
+                        priority
+                        isActive
+                        createdAt
+                        expiryDate
+                        createdBy {
+                            id
+                            firstName
+                            lastName
+                        }
+                        categories {
+                            id
+                            name
+                        }
+                    }
                 }
             }
         }
         """
         
-        data, error = await self._execute_query(query, {"isActive": is_active})
-        return (data.get("announcements", []), error) if data else ([], error or "No data returned")
+        variables = {
+            "isActive": is_active,
+            "first": first,
+            "after": after,
+            "priority": priority,
+            "categoryIds": category_ids,
+            "search": search,
+        }
+        data, error = await self._execute_query(query, variables)
+        return (self._nodes(data.get("announcements")), error) if data else ([], error or "No data returned")
     
-    async def get_events(self, is_active=True):
-        """Fetch events from the API"""
+    async def get_events(self, is_active=True, first=None, after=None, starts_after=None,
+                         starts_before=None, category_ids=None, search=None):
+        """Fetch a page of events from the API, filtered on the server"""
         query = """
-        query GetEvents($isActive: Boolean) {
-            events(isActive: $isActive) {
-                id
-                title
-                description
-                startDate
-                endDate
-                location
-                createdBy {
-                    email
-                    firstName
-                    lastName
-                }
-                categories {
-                    id
-                    name
+        query GetEvents($isActive: Boolean, $first: Int, $after: String, $startsBetween: DateTimeRangeInput,
+                        $categoryIds: [ID], $search: String) {
+            events(isActive: $isActive, first: $first, after: $after, startsBetween: $startsBetween,
+                   categoryIds: $categoryIds, search: $search) {
+                edges {
+                    node {
+                        id
+                        title
+                        description
+                        startDate
+                        endDate
+                        location
+                        createdBy {
+                            email
+                            firstName
+                            lastName
+                        }
+                        categories {
+                            id
+                            name
+                        }
+                        image
+                    }
                 }
-                image
             }
         }
         """
         
-        data, error = await self._execute_query(query, {"isActive": is_active})
-        return (data.get("events", []), error) if data else ([], error or "No data returned")
+        variables = {
+            "isActive": is_active,
+            "first": first,
+            "after": after,
+            "categoryIds": category_ids,
+            "search": search,
+        }
+        if starts_after or starts_before:
+            variables["startsBetween"] = {
+                "after": starts_after.isoformat() if starts_after else None,
+                "before": starts_before.isoformat() if starts_before else None,
+            }
+        data, error = await self._execute_query(query, variables)
+        return (self._nodes(data.get("events")), error) if data else ([], error or "No data returned")
     
     async def create_announcement(self, title, content, priority="MEDIUM", expiry_date=None, category_ids=None):
         """Create a new announcement"""
@@ -207,35 +280,128 @@ class ApiClient:
         if error:
             return None, error
             
-        return data.get("createAnnouncement", {}).get("announcement"), None
+        return (data.get("createAnnouncement") or {}).get("announcement"), None
     
-    async def get_upcoming_events(self):
-        """Fetch upcoming events from the API"""
+    async def get_upcoming_events(self, first=None, after=None):
+        """Fetch a page of upcoming events from the API"""
         query = """
-        query {
-            upcomingEvents {
-                id
-                title
-                description
-                startDate
-                endDate
-                location
-                createdBy {
-                    email
-                    firstName
-                    lastName
+        query GetUpcomingEvents($first: Int, $after: String) {
+            upcomingEvents(first: $first, after: $after) {
+                edges {
+                    node {
+                        id
+                        title
+                        description
+                        startDate
+                        endDate
+                        location
+                        createdBy {
+                            email
+                            firstName
+                            lastName
+                        }
+                        categories {
+                            id
+                            name
+                        }
+                        image
+                    }
                 }
-                categories {
-                    id
-                    name
+            }
+        }
+        """
+        
+        data, error = await self._execute_query(query, {"first": first, "after": after})
+        return (self._nodes(data.get("upcomingEvents")), error) if data else ([], error or "No data returned")
+    
+    async def get_feed(self, first=None, after=None, types=None):
+        """Fetch a page of the merged newsletter/announcement/event feed"""
+        query = """
+        query GetFeed($first: Int, $after: String, $types: [FeedItemKind]) {
+            feed(first: $first, after: $after, types: $types) {
+                edges {
+                    cursor
+                    timestamp
+                    node {
+                        __typename
+                        ... on NewsletterType {
+                            id
+                            title
+                            subtitle
+                            content
+                            createdAt
+                            publishedAt
+                            featured
+                            createdBy {
+                                email
+                                firstName
+                                lastName
+                            }
+                            categories {
+                                id
+                                name
+                            }
+                            coverImage
+                        }
+                        ... on AnnouncementType {
+                            id
+                            title
+                            content
+                            priority
+                            isActive
+                            createdAt
+                            expiryDate
+                            createdBy {
+                                id
+                                firstName
+                                lastName
+                            }
+                            categories {
+                                id
+                                name
+                            }
+                        }
+                        ... on EventType {
+                            id
+                            title
+                            description
+                            startDate
+                            endDate
+                            location
+                            createdBy {
+                                email
+                                firstName
+                                lastName
+                            }
+                            categories {
+                                id
+                                name
+                            }
+                            image
+                        }
+                    }
                 }
-                image
             }
         }
         """
         
-        data, error = await self._execute_query(query, {})
-        return (data.get("upcomingEvents", []), error) if data else ([], error or "No data returned")
+        variables = {"first": first, "after": after, "types": types}
+        data, error = await self._execute_query(query, variables)
+        if not data:
+            return [], error or "No data returned"
+        
+        items = []
+        for edge in (data.get("feed") or {}).get("edges", []):
+            item = edge["node"]
+            item["type"] = item.pop("__typename").replace("Type", "").lower()
+            item["timestamp"] = edge.get("timestamp") or ""
+            item["cursor"] = edge["cursor"]
+            if item["type"] == "newsletter":
+                # Add a preview of the content
+                content = item.get("content", "")
+                item["preview"] = content[:150] + "..." if content and len(content) > 150 else content
+            items.append(item)
+        return items, error
     
     async def get_user_profile(self):
         """Fetch the current user's profile"""
@@ -312,4 +478,4 @@ class ApiClient:
         if error:
             return None, error
             
-        return data.get("updateSubscription", {}).get("subscription"), None
+        return (data.get("updateSubscription") or {}).get("subscription"), None
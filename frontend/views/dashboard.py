@@ -206,59 +206,14 @@ class DashboardView(Container):
         
         async def load_data():
             try:
-                # Load all data types for the feed
-                newsletters, news_error = await self.api_client.get_newsletters()
-                announcements, announcement_error = await self.api_client.get_announcements()
-                events, events_error = await self.api_client.get_upcoming_events()
-                
-                # Log any errors
-                if news_error:
-                    print(f"Error loading newsletters: {news_error}")
-                if announcement_error:
-                    print(f"Error loading announcements: {announcement_error}")
-                if events_error:
-                    print(f"Error loading events: {events_error}")
-                
-                # Ensure we have lists (handle None cases)
-                newsletters = newsletters or []
-                announcements = announcements or []
-                events = events or []
-                
-                # Combine all items into a single feed with timestamps
-                feed_items = []
-                
-                # Add newsletters to feed with preview content
-                if newsletters:
-                    for item in newsletters:
-                        item['type'] = 'newsletter'
-                        item['timestamp'] = item.get('publishedAt', '')
-                        # Add a preview of the content
-                        content = item.get('content', '')
-                        if content and len(content) > 150:
-                            item['preview'] = content[:150] + '...'
-                        else:
-                            item['preview'] = content
-                        feed_items.append(item)
-                
-                # Add announcements to feed
-                if announcements:
-                    for item in announcements:
-                        item['type'] = 'announcement'
-                        item['timestamp'] = item.get('createdAt', '')
-                        feed_items.append(item)
-                
-                # Add events to feed
-                if events:
-                    for item in events:
-                        item['type'] = 'event'
-                        item['timestamp'] = item.get('date', '')
-                        feed_items.append(item)
-                
-                # Sort all items by timestamp (newest first)
-                feed_items.sort(key=lambda x: x.get('timestamp', ''), reverse=True)
+                # Load the merged feed in a single request; the server
+                # merges and orders the three content types
+                feed_items, feed_error = await self.api_client.get_feed()
+                if feed_error:
+                    print(f"Error loading feed: {feed_error}")
                 
                 # Update the feed with the loaded items
-                await self.update_feed(feed_items, news_error, announcement_error, events_error)
+                await self.update_feed(feed_items, feed_error)
             except Exception as e:
                 print(f"Error loading dashboard data: {e}")
                 # Show error state
@@ -280,39 +235,17 @@ class DashboardView(Container):
             
         loop.create_task(load_data())
     
-    async def update_feed(self, feed_items, news_error=None, announcement_error=None, events_error=None):
+    async def update_feed(self, feed_items, feed_error=None):
         """Update the feed with the given items"""
         try:
             # Clear existing items
             self.feed_items.controls = []
             
-            # Add error messages if any
-            if news_error:
-                self.feed_items.controls.append(
-                    Container(
-                        content=Text(f"Error loading newsletters: {news_error}", color="#F44336"),  
-                        padding=padding.all(10),
-                        bgcolor="#FFEBEE",  
-                        border_radius=8,
-                        margin=margin.only(bottom=10),
-                    )
-                )
-            
-            if announcement_error:
-                self.feed_items.controls.append(
-                    Container(
-                        content=Text(f"Error loading announcements: {announcement_error}", color="#F44336"),  
-                        padding=padding.all(10),
-                        bgcolor="#FFEBEE",  
-                        border_radius=8,
-                        margin=margin.only(bottom=10),
-                    )
-                )
-            
-            if events_error:
+            # Add an error message if the feed failed to load
+            if feed_error:
                 self.feed_items.controls.append(
                     Container(
-                        content=Text(f"Error loading events: {events_error}", color="#F44336"),  
+                        content=Text(f"Error loading updates: {feed_error}", color="#F44336"),  
                         padding=padding.all(10),
                         bgcolor="#FFEBEE",  
                         border_radius=8,
@@ -325,7 +258,7 @@ class DashboardView(Container):
                 self.feed_items.controls.append(self.create_feed_item(item))
                 
             # If no items and no errors, show a message
-            if not feed_items and not any([news_error, announcement_error, events_error]):
+            if not feed_items and not feed_error:
                 self.feed_items.controls.append(
                     Container(
                         content=Column(
@@ -401,71 +334,18 @@ class DashboardView(Container):
             if self.page is not None:
                 await self.page.update_async()
             
-            # Get all data types
-            newsletters, news_error = await self.api_client.get_newsletters()
-            announcements, announcement_error = await self.api_client.get_announcements()
-            events, events_error = await self.api_client.get_upcoming_events()
-            
-            # Filter based on tab
-            feed_items = []
-            
-            if self.selected_tab_index == 0:  # All Updates
-                # Add all content types
-                if newsletters:
-                    for item in newsletters:
-                        item['type'] = 'newsletter'
-                        item['timestamp'] = item.get('publishedAt', '')
-                        # Add preview for better readability
-                        content = item.get('content', '')
-                        if content and len(content) > 150:
-                            item['preview'] = content[:150] + '...'
-                        else:
-                            item['preview'] = content
-                        feed_items.append(item)
-                        
-                if announcements:
-                    for item in announcements:
-                        item['type'] = 'announcement'
-                        item['timestamp'] = item.get('createdAt', '')
-                        feed_items.append(item)
-                        
-                if events:
-                    for item in events:
-                        item['type'] = 'event'
-                        item['timestamp'] = item.get('startDate', '')
-                        feed_items.append(item)
-                        
-            elif self.selected_tab_index == 1:  # Newsletters
-                if newsletters:
-                    for item in newsletters:
-                        item['type'] = 'newsletter'
-                        item['timestamp'] = item.get('publishedAt', '')
-                        content = item.get('content', '')
-                        if content and len(content) > 150:
-                            item['preview'] = content[:150] + '...'
-                        else:
-                            item['preview'] = content
-                        feed_items.append(item)
-                        
-            elif self.selected_tab_index == 2:  # Announcements
-                if announcements:
-                    for item in announcements:
-                        item['type'] = 'announcement'
-                        item['timestamp'] = item.get('createdAt', '')
-                        feed_items.append(item)
-                        
-            elif self.selected_tab_index == 3:  # Events
-                if events:
-                    for item in events:
-                        item['type'] = 'event'
-                        item['timestamp'] = item.get('startDate', '')
-                        feed_items.append(item)
-            
-            # Sort by timestamp
-            feed_items.sort(key=lambda x: x.get('timestamp', ''), reverse=True)
+            # Map the selected tab to the feed types to request
+            tab_types = {
+                1: ["NEWSLETTER"],
+                2: ["ANNOUNCEMENT"],
+                3: ["EVENT"],
+            }
+            feed_items, feed_error = await self.api_client.get_feed(
+                types=tab_types.get(self.selected_tab_index)
+            )
             
             # Update the feed with the filtered items
-            await self.update_feed(feed_items, news_error, announcement_error, events_error)
+            await self.update_feed(feed_items, feed_error)
             
         except Exception as e:
             print(f"Error filtering content: {e}")
@@ -525,42 +405,11 @@ class DashboardView(Container):
                     if self.page is not None:
                         await self.page.update_async()
                     
-                    # Reload all data
-                    newsletters, news_error = await self.api_client.get_newsletters()
-                    announcements, announcement_error = await self.api_client.get_announcements()
-                    events, events_error = await self.api_client.get_upcoming_events()
-                    
-                    # Combine and sort all items
-                    feed_items = []
-                    
-                    if newsletters:
-                        for item in newsletters:
-                            item['type'] = 'newsletter'
-                            item['timestamp'] = item.get('publishedAt', '')
-                            content = item.get('content', '')
-                            if content and len(content) > 150:
-                                item['preview'] = content[:150] + '...'
-                            else:
-                                item['preview'] = content
-                            feed_items.append(item)
-                    
-                    if announcements:
-                        for item in announcements:
-                            item['type'] = 'announcement'
-                            item['timestamp'] = item.get('createdAt', '')
-                            feed_items.append(item)
-                    
-                    if events:
-                        for item in events:
-                            item['type'] = 'event'
-                            item['timestamp'] = item.get('startDate', '')
-                            feed_items.append(item)
-                    
-                    # Sort by timestamp
-                    feed_items.sort(key=lambda x: x.get('timestamp', ''), reverse=True)
+                    # Reload the merged feed
+                    feed_items, feed_error = await self.api_client.get_feed()
                     
                     # Update the feed
-                    await self.update_feed(feed_items, news_error, announcement_error, events_error)
+                    await self.update_feed(feed_items, feed_error)
                     
                 except Exception as load_error:
                     print(f"Error refreshing feed: {load_error}")
@@ -312,8 +312,16 @@ class NewsletterListView(Container):
             if self.page is not None:
                 await self.page.update_async()
             
-            # Get newsletters from API
-            newsletters, error = await self.api_client.get_newsletters()
+            # Let the server do the filtering so only matching rows are sent
+            filters = {}
+            if filter_featured:
+                filters["featured"] = True
+            if filter_recent:
+                # Newest first is the default ordering
+                filters["first"] = 5
+            if filter_archived:
+                filters["status"] = "ARCHIVED"
+            newsletters, error = await self.api_client.get_newsletters(**filters)
             
             # Clear the column
             self.newsletters_column.controls.clear()
@@ -333,26 +341,8 @@ class NewsletterListView(Container):
                 # Show empty state
                 self.newsletters_column.controls.append(self.empty_state)
             else:
-                # Apply filters
-                filtered_newsletters = newsletters
-                
-                # Additional filtering based on parameters
-                if filter_featured:
-                    filtered_newsletters = [n for n in filtered_newsletters if n.get("featured", False)]
-                if filter_recent:
-                    # Sort by date and take most recent
-                    from datetime import datetime
-                    filtered_newsletters.sort(
-                        key=lambda x: datetime.fromisoformat(x.get("publishedAt", "").replace('Z', '+00:00')) 
-                        if x.get("publishedAt") else datetime.min,
-                        reverse=True
-                    )
-                    filtered_newsletters = filtered_newsletters[:5]  # Take top 5 recent
-                if filter_archived:
-                    filtered_newsletters = [n for n in filtered_newsletters if n.get("archived", False)]
-                
                 # Create cards for each newsletter
-                for newsletter in filtered_newsletters:
+                for newsletter in newsletters:
                     self.newsletters_column.controls.append(
                         self.create_newsletter_card(newsletter)
                     )
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.10 on 2026-10-17 02:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='child',
+            index=models.Index(fields=['parent', 'group'], name='child_parent_group'),
+        ),
+        migrations.AddIndex(
+            model_name='child',
+            index=models.Index(fields=['group'], name='child_group'),
+        ),
+    ]
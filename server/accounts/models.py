@@ -87,6 +87,11 @@ class Child(models.Model):
     group = models.CharField(_('group'), max_length=50, blank=True, help_text=_('Class/Group assignment'))
     
     class Meta:
+        indexes = [
+            # Group audiences look children up by parent and group
+            models.Index(fields=['parent', 'group'], name='child_parent_group'),
+            models.Index(fields=['group'], name='child_group'),
+        ]
         verbose_name = _('child')
         verbose_name_plural = _('children')
     
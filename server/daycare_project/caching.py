@@ -0,0 +1,154 @@
+"""
+Response cache for public GraphQL read operations.
+
+Operations whose root fields are all in ``CACHEABLE_FIELDS`` return the same
+data to every parent, so their results are stored in Django's cache keyed by
+document, operation name, variables, the caller's role and the copy of the
+database the operation reads (see ``routers.read_source``). Every key also
+embeds a version number that ``bump_version()`` increments; the
+``newsletter`` app bumps it from ``post_save``/``post_delete``/``m2m_changed``
+signals, which invalidates all cached results at once without having to
+enumerate keys. The version lives in ``GRAPHQL_SHARED_CACHE``, which every
+web worker and management command reads, so a bump in one process reaches
+the results cached by all of them.
+
+Announcements also change without a write when they expire, so results that
+read them are stored with the next expiry as their end of validity
+(``valid_until``) and stop being served at exactly that moment.
+"""
+import hashlib
+import json
+import math
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from graphene.utils.str_converters import to_snake_case
+from graphql.language import FieldNode, FragmentSpreadNode, InlineFragmentNode, OperationType
+from graphql_jwt.shortcuts import get_user_by_token
+from graphql_jwt.utils import get_credentials
+
+from newsletter.models import Announcement
+
+VERSION_KEY = 'graphql:result-version'
+# Bumped whenever the format of the cached entries changes
+RESULT_PREFIX = 'graphql:result:2:'
+
+CACHEABLE_FIELDS = frozenset({
+    'newsletters',
+    'featured_newsletters',
+    'categories',
+    'events',
+    'announcements',
+})
+
+
+def get_cache():
+    return caches[getattr(settings, 'GRAPHQL_RESULT_CACHE', 'default')]
+
+
+def get_shared_cache():
+    """The cache for keys that web workers and management commands must all see."""
+    return caches[getattr(settings, 'GRAPHQL_SHARED_CACHE', 'default')]
+
+
+def get_version():
+    cache = get_shared_cache()
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, 1, None)
+        version = cache.get(VERSION_KEY, 1)
+    return version
+
+
+def bump_version():
+    """Invalidate every cached result."""
+    cache = get_shared_cache()
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.set(VERSION_KEY, 2, None)
+
+
+def _root_fields(operation, fragments):
+    names = set()
+    selections = list(operation.selection_set.selections)
+    while selections:
+        selection = selections.pop()
+        if isinstance(selection, FieldNode):
+            names.add(to_snake_case(selection.name.value))
+        elif isinstance(selection, InlineFragmentNode):
+            selections.extend(selection.selection_set.selections)
+        elif isinstance(selection, FragmentSpreadNode):
+            selections.extend(fragments[selection.name.value].selection_set.selections)
+    return names
+
+
+def root_fields(document, operation):
+    fragments = {
+        definition.name.value: definition
+        for definition in document.definitions
+        if definition.kind == 'fragment_definition'
+    }
+    return _root_fields(operation, fragments) - {'__typename'}
+
+
+def is_cacheable(document, operation):
+    """Return True when ``operation`` only reads public, cacheable fields."""
+    if operation is None or operation.operation != OperationType.QUERY:
+        return False
+    names = root_fields(document, operation)
+    return bool(names) and names <= CACHEABLE_FIELDS
+
+
+def valid_until(document, operation):
+    """Return the timestamp at which the operation's result expires by itself, or None."""
+    if 'announcements' not in root_fields(document, operation):
+        return None
+    next_expiry = Announcement.objects.next_expiry()
+    return next_expiry.timestamp() if next_expiry else None
+
+
+def request_role(request):
+    """Return the caller's role, or None when it cannot be determined."""
+    user = getattr(request, 'user', None)
+    if user is None or not user.is_authenticated:
+        token = get_credentials(request)
+        if not token:
+            return 'ANONYMOUS'
+        try:
+            user = get_user_by_token(token, request)
+        except Exception:
+            # An invalid token must reach the resolvers and fail there
+            return None
+    if user is None or not user.is_active:
+        return None
+    return user.role
+
+
+def result_key(query_hash, operation_name, variables, role, source):
+    payload = json.dumps(
+        [query_hash, operation_name, variables or {}, role, source, get_version()],
+        sort_keys=True,
+        default=str,
+    )
+    return RESULT_PREFIX + hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def get_result(key):
+    entry = get_cache().get(key)
+    if entry is None:
+        return None
+    data, until = entry
+    if until is not None and time.time() >= until:
+        return None
+    return data
+
+
+def set_result(key, data, timeout=None, valid_until=None):
+    if timeout is None:
+        timeout = getattr(settings, 'GRAPHQL_RESULT_CACHE_TIMEOUT', 300)
+    if valid_until is not None:
+        # Backends count whole seconds; get_result enforces the exact moment
+        timeout = min(timeout, max(1, math.ceil(valid_until - time.time())))
+    get_cache().set(key, (data, valid_until), timeout)
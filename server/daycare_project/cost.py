@@ -0,0 +1,176 @@
+"""
+Static cost and depth analysis for GraphQL operations.
+
+Every object-typed field costs one unit per parent object, and list fields
+multiply the cost of everything below them by their expected size: the
+``first`` argument of a connection when given, otherwise the configured
+default. Reverse relations such as newsletter -> recipients -> user ->
+receivedNewsletters therefore grow geometrically with depth, and
+``QueryCostRule`` rejects operations whose estimate exceeds the budget in
+``settings.GRAPHQL_QUERY_COST`` before any resolver runs.
+"""
+from django.conf import settings
+from graphene_django.settings import graphene_settings
+from graphql import GraphQLError, ValidationRule
+from graphql.language import (
+    FieldNode, FragmentSpreadNode, InlineFragmentNode, IntValueNode, VariableNode
+)
+from graphql.type import (
+    GraphQLInterfaceType, GraphQLList, GraphQLNonNull, GraphQLObjectType, GraphQLUnionType,
+    get_named_type,
+)
+
+DEFAULTS = {
+    'MAX_COST': 10000,
+    'MAX_DEPTH': 10,
+    'DEFAULT_LIST_SIZE': 10,
+}
+
+
+def get_setting(name):
+    return getattr(settings, 'GRAPHQL_QUERY_COST', {}).get(name, DEFAULTS[name])
+
+
+def _is_list(type_):
+    if isinstance(type_, GraphQLNonNull):
+        type_ = type_.of_type
+    return isinstance(type_, GraphQLList)
+
+
+class CostCalculator:
+    """Walks one operation and returns ``(cost, depth)``."""
+
+    def __init__(self, schema, fragments, variables=None):
+        self.schema = schema
+        self.fragments = fragments
+        self.variables = variables or {}
+        self.default_list_size = get_setting('DEFAULT_LIST_SIZE')
+        self.max_page_size = graphene_settings.RELAY_CONNECTION_MAX_LIMIT
+
+    def page_size(self, node, field_def):
+        """Return the page size a paginated field will produce, else None."""
+        if 'first' not in field_def.args:
+            return None
+        for argument in node.arguments or ():
+            if argument.name.value != 'first':
+                continue
+            value = argument.value
+            if isinstance(value, IntValueNode):
+                size = int(value.value)
+            elif isinstance(value, VariableNode):
+                size = self.variables.get(value.name.value)
+            else:
+                size = None
+            if size is None:
+                return self.max_page_size
+            return max(0, min(size, self.max_page_size or size))
+        return self.max_page_size
+
+    def fields(self, selection_set, parent_type):
+        """Yield ``(field_node, field_def)`` pairs, expanding fragments."""
+        for selection in selection_set.selections:
+            if isinstance(selection, FieldNode):
+                name = selection.name.value
+                if name.startswith('__'):
+                    continue
+                if isinstance(parent_type, GraphQLObjectType):
+                    field_def = parent_type.fields.get(name)
+                    if field_def is not None:
+                        yield selection, field_def
+                continue
+
+            if isinstance(selection, FragmentSpreadNode):
+                fragment = self.fragments.get(selection.name.value)
+                if fragment is None:
+                    continue
+            elif isinstance(selection, InlineFragmentNode):
+                fragment = selection
+            else:
+                continue
+            if fragment.type_condition and not self.applies(fragment.type_condition.name.value, parent_type):
+                continue
+            yield from self.fields(fragment.selection_set, parent_type)
+
+    def applies(self, type_name, parent_type):
+        """Return True when a fragment on ``type_name`` is selected for ``parent_type`` objects."""
+        fragment_type = self.schema.get_type(type_name)
+        if fragment_type is None:
+            return False
+        if fragment_type is parent_type:
+            return True
+        return isinstance(fragment_type, (GraphQLInterfaceType, GraphQLUnionType)) and self.schema.is_sub_type(
+            fragment_type, parent_type
+        )
+
+    def selection_cost(self, selection_set, parent_type, page_size=None):
+        if isinstance(parent_type, (GraphQLInterfaceType, GraphQLUnionType)):
+            # Each item is one of the possible types and only its own
+            # fragments apply; charge the most expensive type per item
+            costs = [
+                self.selection_cost(selection_set, member, page_size)
+                for member in self.schema.get_possible_types(parent_type)
+            ]
+            return max((cost for cost, _ in costs), default=0), max((depth for _, depth in costs), default=0)
+
+        cost = 0
+        depth = 0
+        for node, field_def in self.fields(selection_set, parent_type):
+            if not node.selection_set:
+                continue
+            size = 1
+            if _is_list(field_def.type):
+                size = page_size if page_size is not None else self.default_list_size
+            child_page_size = self.page_size(node, field_def)
+            child_cost, child_depth = self.selection_cost(
+                node.selection_set, get_named_type(field_def.type), child_page_size
+            )
+            cost += size * (1 + child_cost)
+            depth = max(depth, child_depth + 1)
+        return cost, depth
+
+    def operation_cost(self, operation):
+        root_type = self.schema.get_root_type(operation.operation)
+        return self.selection_cost(operation.selection_set, root_type)
+
+
+def analyze(schema, document, operation, variables=None):
+    """Return ``(cost, depth)`` for ``operation`` in ``document``."""
+    fragments = {
+        definition.name.value: definition
+        for definition in document.definitions
+        if definition.kind == 'fragment_definition'
+    }
+    return CostCalculator(schema, fragments, variables).operation_cost(operation)
+
+
+def cost_rule(variables, operation_name=None, report=None):
+    """Build a validation rule bound to the request's variables.
+
+    ``report`` receives ``requested``, ``maximum`` and ``depth`` for the operation
+    that will be executed, so the view can return them in ``extensions``.
+    """
+
+    class QueryCostRule(ValidationRule):
+        def enter_operation_definition(self, node, *args):
+            name = node.name.value if node.name else None
+            if operation_name and name != operation_name:
+                return self.SKIP
+            schema = self.context.schema
+            cost, depth = analyze(schema, self.context.document, node, variables)
+            max_cost = get_setting('MAX_COST')
+            max_depth = get_setting('MAX_DEPTH')
+            if report is not None:
+                report.update({'requested': cost, 'maximum': max_cost, 'depth': depth})
+            if depth > max_depth:
+                self.report_error(GraphQLError(
+                    f'Query depth {depth} exceeds the maximum of {max_depth}.', node,
+                    extensions={'code': 'QUERY_TOO_DEEP'},
+                ))
+            elif cost > max_cost:
+                self.report_error(GraphQLError(
+                    f'Query cost {cost} exceeds the maximum of {max_cost}.', node,
+                    extensions={'code': 'QUERY_TOO_COMPLEX'},
+                ))
+            return self.SKIP
+
+    return QueryCostRule
@@ -0,0 +1,103 @@
+"""
+Caches for GraphQL documents.
+
+``DocumentCache`` keeps an LRU of parsed and validated documents keyed by the
+SHA-256 of the query text, so the fixed operations the Flet client sends are
+parsed and validated once per process instead of on every request.
+
+Automatic persisted queries map the same hash to the query text in Django's
+cache framework. A client may send only ``extensions.persistedQuery.sha256Hash``
+and fall back to sending the full query once when the server answers
+``PersistedQueryNotFound``.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from graphql import GraphQLError, parse, validate
+
+PERSISTED_QUERY_NOT_FOUND = 'PersistedQueryNotFound'
+PERSISTED_QUERY_PREFIX = 'graphql:apq:'
+
+
+def query_hash(query):
+    return hashlib.sha256(query.encode('utf-8')).hexdigest()
+
+
+class DocumentCache:
+    """Thread-safe LRU of ``(document, validation_errors)`` per query hash."""
+
+    def __init__(self, schema, maxsize=None):
+        self.schema = schema
+        self.maxsize = maxsize or getattr(settings, 'GRAPHQL_DOCUMENT_CACHE_SIZE', 256)
+        self._documents = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, query, key=None):
+        """Return ``(document, errors)``; parse errors propagate as exceptions."""
+        key = key or query_hash(query)
+        with self._lock:
+            entry = self._documents.get(key)
+            if entry is not None:
+                self._documents.move_to_end(key)
+                return entry
+
+        document = parse(query)
+        entry = (document, validate(self.schema.graphql_schema, document))
+        with self._lock:
+            self._documents[key] = entry
+            self._documents.move_to_end(key)
+            while len(self._documents) > self.maxsize:
+                self._documents.popitem(last=False)
+        return entry
+
+    def clear(self):
+        with self._lock:
+            self._documents.clear()
+
+
+_document_caches = {}
+_document_caches_lock = threading.Lock()
+
+
+def get_document_cache(schema):
+    """Return the process-wide document cache for ``schema``."""
+    with _document_caches_lock:
+        cache = _document_caches.get(id(schema))
+        if cache is None:
+            cache = _document_caches[id(schema)] = DocumentCache(schema)
+        return cache
+
+
+def _persisted_query_cache():
+    return caches[getattr(settings, 'GRAPHQL_PERSISTED_QUERY_CACHE', 'default')]
+
+
+def resolve_persisted_query(query, extensions):
+    """Return the query text for a request, honouring persisted-query hashes.
+
+    Raises ``GraphQLError`` when the hash is unknown or does not match the
+    query sent alongside it.
+    """
+    persisted = (extensions or {}).get('persistedQuery') if isinstance(extensions, dict) else None
+    if not persisted or not persisted.get('sha256Hash'):
+        return query
+
+    sha256_hash = persisted['sha256Hash']
+    cache = _persisted_query_cache()
+    if query:
+        if query_hash(query) != sha256_hash:
+            raise GraphQLError('Provided sha256Hash does not match query.')
+        cache.set(
+            PERSISTED_QUERY_PREFIX + sha256_hash,
+            query,
+            getattr(settings, 'GRAPHQL_PERSISTED_QUERY_TIMEOUT', None),
+        )
+        return query
+
+    query = cache.get(PERSISTED_QUERY_PREFIX + sha256_hash)
+    if query is None:
+        raise GraphQLError(PERSISTED_QUERY_NOT_FOUND, extensions={'code': 'PERSISTED_QUERY_NOT_FOUND'})
+    return query
@@ -0,0 +1,130 @@
+"""
+Unified dashboard feed of newsletters, announcements and upcoming events.
+
+Every item is placed by when it was posted: newsletters by ``published_at``,
+announcements and events by ``created_at`` (upcoming events only). The three
+tables are merged in SQL with ``UNION ALL`` over a common ``(ts, kind, id)``
+key and paginated with a keyset cursor on that key. Each branch first takes
+its own newest ``first + 1`` keys in index order, so the database only merge
+sorts those; a page is one query for the keys plus one query per content type
+for the rows themselves.
+"""
+from django.db.models import Exists, F, OuterRef, Q, Value
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from graphql import GraphQLError
+
+from daycare_project.loaders import register
+from daycare_project.optimizer import optimize
+from daycare_project.pagination import decode_values, encode_cursor
+from newsletter.models import Newsletter, Announcement, Event
+
+NEWSLETTER = 'newsletter'
+ANNOUNCEMENT = 'announcement'
+EVENT = 'event'
+
+KINDS = {
+    NEWSLETTER: Newsletter,
+    ANNOUNCEMENT: Announcement,
+    EVENT: Event,
+}
+
+# Indexed column each content type is ordered by
+TIMESTAMPS = {
+    NEWSLETTER: 'published_at',
+    ANNOUNCEMENT: 'created_at',
+    EVENT: 'created_at',
+}
+
+
+def _branch(kind, category_ids=None):
+    """Return the feed rows of one content type, annotated with ``ts``."""
+    model = KINDS[kind]
+    if kind == NEWSLETTER:
+        # Saving a published newsletter sets published_at; only rows
+        # bulk-created without it are left out
+        queryset = model.objects.filter(status=Newsletter.Status.PUBLISHED, published_at__isnull=False)
+    elif kind == ANNOUNCEMENT:
+        queryset = model.objects.current()
+    else:
+        queryset = model.objects.filter(is_active=True, start_date__gte=timezone.now())
+
+    if category_ids:
+        through = model.categories.through
+        queryset = queryset.filter(Exists(through.objects.filter(
+            **{f'{model._meta.model_name}_id': OuterRef('pk'), 'category_id__in': category_ids}
+        )))
+
+    return queryset.order_by().annotate(ts=F(TIMESTAMPS[kind]))
+
+
+def _keys(kind, ids):
+    """Return ``(kind, ts, id)`` rows for the given pks of one content type."""
+    return (
+        KINDS[kind].objects.filter(pk__in=ids)
+        .order_by()
+        .annotate(kind=Value(kind), ts=F(TIMESTAMPS[kind]))
+        .values_list('kind', 'ts', 'id')
+    )
+
+
+def _seek(queryset, kind, after):
+    """Keep rows after the ``(ts, kind, id)`` cursor, newest first."""
+    after_ts, after_kind, after_id = after
+    if kind < after_kind:
+        return queryset.filter(ts__lte=after_ts)
+    if kind > after_kind:
+        return queryset.filter(ts__lt=after_ts)
+    return queryset.filter(Q(ts__lt=after_ts) | Q(ts=after_ts, id__lt=after_id))
+
+
+def decode_feed_cursor(cursor):
+    ts, kind, pk = decode_values(cursor, 3)
+    ts = parse_datetime(ts) if isinstance(ts, str) else None
+    if ts is None or kind not in KINDS or not isinstance(pk, int):
+        raise GraphQLError('Invalid cursor.')
+    return ts, kind, pk
+
+
+def feed_keys(limit, after=None, kinds=None, category_ids=None):
+    """Return a queryset of the first ``limit`` ``(kind, ts, id)`` keys after the decoded cursor."""
+    branches = []
+    for kind in sorted(kinds or KINDS):
+        branch = _branch(kind, category_ids)
+        if after:
+            branch = _seek(branch, kind, after)
+        # A sort over the union could not use any index; each branch takes
+        # its newest keys from its own index instead
+        newest = branch.order_by('-ts', '-id').values('id')[:limit]
+        branches.append(_keys(kind, newest))
+
+    merged = branches[0]
+    if len(branches) > 1:
+        merged = merged.union(*branches[1:], all=True)
+    return merged.order_by('-ts', '-kind', '-id')[:limit]
+
+
+def feed_page(info, first, after=None, kinds=None, category_ids=None):
+    """Return ``([(instance, ts, cursor)], has_next_page)`` for one page."""
+    after = decode_feed_cursor(after) if after else None
+    keys = list(feed_keys(first + 1, after, kinds, category_ids))
+    has_next_page = len(keys) > first
+    keys = keys[:first]
+
+    ids_by_kind = {}
+    for kind, _, pk in keys:
+        ids_by_kind.setdefault(kind, []).append(pk)
+    rows = {}
+    for kind, ids in ids_by_kind.items():
+        model = KINDS[kind]
+        queryset = optimize(model.objects.all(), info, ('edges', 'node'), f'{model.__name__}Type')
+        instances = queryset.in_bulk(ids)
+        register(info, instances.values())
+        rows.update({(kind, pk): instance for pk, instance in instances.items()})
+
+    page = [
+        (rows[(kind, pk)], ts, encode_cursor([ts, kind, pk]))
+        for kind, ts, pk in keys
+        if (kind, pk) in rows
+    ]
+    return page, has_next_page
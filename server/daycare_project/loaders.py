@@ -0,0 +1,172 @@
+"""
+Request-scoped batching loaders for nested GraphQL relations.
+
+The schema is executed synchronously, so a loader cannot wait for sibling
+resolvers before hitting the database. Instead, list resolvers register the
+rows they return (see ``register``) and each relation loader queues the keys
+of those rows. The first ``load()`` for any queued key fetches the whole
+queue in one query, so a nested selection costs one query per relation no
+matter how many rows the list holds.
+"""
+from collections import defaultdict
+
+from accounts.models import User
+from newsletter.models import Newsletter, Announcement, Event, NewsletterRecipient
+
+
+class DataLoader:
+    """Caches results per key and batches queued keys into one lookup."""
+
+    def __init__(self, batch_load_fn, default=None):
+        self.batch_load_fn = batch_load_fn
+        self.default = default
+        self._cache = {}
+        self._queue = set()
+
+    def prime(self, keys):
+        """Queue keys so they are fetched together with the next miss."""
+        self._queue.update(key for key in keys if key is not None and key not in self._cache)
+
+    def load(self, key):
+        if key is None:
+            return self.default() if callable(self.default) else self.default
+        if key not in self._cache:
+            keys = (self._queue | {key}) - self._cache.keys()
+            self._queue.clear()
+            results = self.batch_load_fn(list(keys))
+            for batch_key in keys:
+                value = results.get(batch_key)
+                if value is None:
+                    value = self.default() if callable(self.default) else self.default
+                self._cache[batch_key] = value
+        return self._cache[key]
+
+    def load_many(self, keys):
+        keys = list(keys)
+        self.prime(keys)
+        return [self.load(key) for key in keys]
+
+
+def _group_by(rows, key_attr, value_attr):
+    grouped = defaultdict(list)
+    for row in rows:
+        grouped[getattr(row, key_attr)].append(getattr(row, value_attr))
+    return grouped
+
+
+class Loaders:
+    """All loaders used while resolving a single request."""
+
+    def __init__(self):
+        self.users = DataLoader(self._load_users)
+        self.newsletter_categories = DataLoader(
+            self._m2m_loader(Newsletter.categories.through, 'newsletter_id', 'category'), default=list
+        )
+        self.announcement_categories = DataLoader(
+            self._m2m_loader(Announcement.categories.through, 'announcement_id', 'category'), default=list
+        )
+        self.event_categories = DataLoader(
+            self._m2m_loader(Event.categories.through, 'event_id', 'category'), default=list
+        )
+        self.newsletter_events = DataLoader(
+            self._m2m_loader(Event.newsletters.through, 'newsletter_id', 'event'), default=list
+        )
+        self.event_newsletters = DataLoader(
+            self._m2m_loader(Event.newsletters.through, 'event_id', 'newsletter'), default=list
+        )
+        self.newsletter_recipients = DataLoader(self._load_recipients, default=list)
+
+        # Which loaders to prime, and with which key, for each model
+        self._relations = {
+            Newsletter: (
+                (self.users, 'created_by_id'),
+                (self.newsletter_categories, 'pk'),
+                (self.newsletter_events, 'pk'),
+                (self.newsletter_recipients, 'pk'),
+            ),
+            Announcement: (
+                (self.users, 'created_by_id'),
+                (self.announcement_categories, 'pk'),
+            ),
+            Event: (
+                (self.users, 'created_by_id'),
+                (self.event_categories, 'pk'),
+                (self.event_newsletters, 'pk'),
+            ),
+            NewsletterRecipient: (
+                (self.users, 'user_id'),
+            ),
+        }
+
+    def register(self, instances):
+        """Queue the relation keys of rows that are about to be resolved."""
+        instances = list(instances)
+        by_model = defaultdict(list)
+        for instance in instances:
+            by_model[type(instance)].append(instance)
+        for model, rows in by_model.items():
+            for loader, attr in self._relations.get(model, ()):
+                # Skip deferred columns rather than loading them row by row
+                loader.prime(row.pk if attr == 'pk' else row.__dict__.get(attr) for row in rows)
+        return instances
+
+    def _m2m_loader(self, through, key_field, related_field):
+        def batch_load(keys):
+            related_model = through._meta.get_field(related_field).related_model
+            ordering = [
+                f'-{related_field}__{name[1:]}' if name.startswith('-') else f'{related_field}__{name}'
+                for name in related_model._meta.ordering
+            ]
+            rows = (
+                through.objects.filter(**{f'{key_field}__in': keys})
+                .select_related(related_field)
+                .order_by(*ordering, 'pk')
+            )
+            grouped = _group_by(rows, key_field, related_field)
+            # Related rows may carry relations of their own (event.created_by)
+            for values in grouped.values():
+                self.register(values)
+            return grouped
+        return batch_load
+
+    def _load_users(self, keys):
+        return User.objects.in_bulk(keys)
+
+    def _load_recipients(self, keys):
+        rows = self.register(NewsletterRecipient.objects.filter(newsletter_id__in=keys))
+        grouped = defaultdict(list)
+        for row in rows:
+            grouped[row.newsletter_id].append(row)
+        return grouped
+
+
+def get_loaders(info):
+    """Return the loaders bound to the current request, creating them once."""
+    context = info.context
+    loaders = getattr(context, '_loaders', None)
+    if loaders is None:
+        loaders = Loaders()
+        context._loaders = loaders
+    return loaders
+
+
+def load_related(info, instance, name, loader_name):
+    """Resolve relation ``name`` of ``instance``, preferring already-fetched rows.
+
+    Querysets shaped by the optimizer arrive with ``select_related`` or
+    ``prefetch_related`` caches; everything else goes through the loader.
+    """
+    field = instance._meta.get_field(name)
+    loader = getattr(get_loaders(info), loader_name)
+    if field.many_to_many or field.one_to_many:
+        if name in getattr(instance, '_prefetched_objects_cache', {}):
+            return list(getattr(instance, name).all())
+        return loader.load(instance.pk)
+    if field.is_cached(instance):
+        return getattr(instance, name)
+    return loader.load(getattr(instance, field.attname))
+
+
+def register(info, instances):
+    """Evaluate ``instances`` and queue their relations for batched loading."""
+    return get_loaders(info).register(instances)
@@ -0,0 +1,219 @@
+"""
+Per-resolver timing and SQL instrumentation for GraphQL operations.
+
+``OperationMetrics`` is attached to the request while an operation executes
+(see ``DaycareGraphQLView``). It hooks the database connections with
+``connection.execute_wrapper`` and charges every query to the resolver path
+that is running, which ``ResolverMetricsMiddleware`` keeps in a context
+variable so attribution survives ``sync_to_async`` and async resolvers.
+Queries issued outside a resolver, such as a returned queryset evaluated by
+the executor, count towards the operation total only.
+
+Paths drop list indices, so ``newsletters.edges.node.createdBy`` aggregates
+every author lookup of a page. Finished operations are folded into the
+process-wide ``registry``, a set of latency histograms per operation name and
+resolver path that staff can dump from ``/graphql/metrics/``. Operation names
+and aliased paths come from the client, so only the first ``MAX_OPERATIONS``
+names and ``MAX_RESOLVERS`` paths get their own histograms; the rest are
+folded into ``<other>``. Clients may ask
+for the numbers of a single operation with ``extensions: {"metrics": true}``
+when ``DEBUG`` is on or they are staff.
+"""
+import bisect
+import contextvars
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import connections
+
+# Upper bounds in milliseconds; the last bucket is unbounded
+BUCKETS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+ANONYMOUS_OPERATION = '<anonymous>'
+OTHER = '<other>'
+
+# Distinct operation names and (operation, path) pairs the registry tracks
+MAX_OPERATIONS = 200
+MAX_RESOLVERS = 5000
+
+current_path = contextvars.ContextVar('graphql_resolver_path', default=None)
+
+
+def resolver_path(info):
+    """Return ``info.path`` as a dotted string without list indices."""
+    return '.'.join(key for key in info.path.as_list() if isinstance(key, str))
+
+
+class Timing:
+    """Call count, wall time and SQL totals for one resolver path."""
+
+    __slots__ = ('count', 'duration', 'sql_count', 'sql_duration')
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.sql_count = 0
+        self.sql_duration = 0.0
+
+    def as_dict(self):
+        return {
+            'count': self.count,
+            'duration': round(self.duration * 1000, 3),
+            'sqlCount': self.sql_count,
+            'sqlDuration': round(self.sql_duration * 1000, 3),
+        }
+
+
+class OperationMetrics:
+    """Timings for one executing operation; also the SQL execute wrapper."""
+
+    def __init__(self, operation_name):
+        self.operation_name = operation_name or ANONYMOUS_OPERATION
+        self.resolvers = defaultdict(Timing)
+        self.total = Timing()
+        self._lock = threading.Lock()
+        self._started = None
+
+    def start(self):
+        self._started = time.perf_counter()
+        # Queries may run on the read replica as well as the primary
+        for connection in connections.all():
+            connection.execute_wrappers.append(self)
+
+    def finish(self):
+        for connection in connections.all():
+            if self in connection.execute_wrappers:
+                connection.execute_wrappers.remove(self)
+        self.total.count = 1
+        self.total.duration = time.perf_counter() - self._started
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.record_sql(current_path.get(), time.perf_counter() - started)
+
+    def record_sql(self, path, duration):
+        with self._lock:
+            self.total.sql_count += 1
+            self.total.sql_duration += duration
+            if path is not None:
+                timing = self.resolvers[path]
+                timing.sql_count += 1
+                timing.sql_duration += duration
+
+    def record_resolver(self, path, duration):
+        with self._lock:
+            timing = self.resolvers[path]
+            timing.count += 1
+            timing.duration += duration
+
+    def as_dict(self):
+        return {
+            'operation': self.operation_name,
+            **self.total.as_dict(),
+            'resolvers': [
+                {'path': path, **timing.as_dict()}
+                for path, timing in sorted(self.resolvers.items())
+            ],
+        }
+
+
+class Histogram:
+    __slots__ = ('counts', 'count', 'sum', 'sql_count', 'sql_sum')
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.sql_count = 0
+        self.sql_sum = 0.0
+
+    def observe(self, timing):
+        milliseconds = timing.duration * 1000
+        self.counts[bisect.bisect_left(BUCKETS, milliseconds)] += 1
+        self.count += 1
+        self.sum += milliseconds
+        self.sql_count += timing.sql_count
+        self.sql_sum += timing.sql_duration * 1000
+
+    def as_dict(self):
+        return {
+            'count': self.count,
+            'sum': round(self.sum, 3),
+            'sqlCount': self.sql_count,
+            'sqlSum': round(self.sql_sum, 3),
+            'buckets': {
+                str(bound): count for bound, count in zip(BUCKETS + ('+Inf',), self.counts)
+            },
+        }
+
+
+class MetricsRegistry:
+    """Process-wide histograms per operation name and resolver path.
+
+    Each resolver path is observed once per operation with its summed time,
+    so the histogram shows what a field costs a whole request.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._operations = defaultdict(Histogram)
+        self._resolvers = defaultdict(Histogram)
+
+    def observe(self, metrics):
+        with self._lock:
+            name = metrics.operation_name
+            if name not in self._operations and len(self._operations) >= MAX_OPERATIONS:
+                name = OTHER
+            self._operations[name].observe(metrics.total)
+            for path, timing in metrics.resolvers.items():
+                key = (name, path)
+                if key not in self._resolvers and len(self._resolvers) >= MAX_RESOLVERS:
+                    key = (name, OTHER)
+                self._resolvers[key].observe(timing)
+
+    def snapshot(self):
+        with self._lock:
+            operations = {}
+            for name, histogram in self._operations.items():
+                operations[name] = {**histogram.as_dict(), 'resolvers': {}}
+            for (name, path), histogram in self._resolvers.items():
+                operations[name]['resolvers'][path] = histogram.as_dict()
+        return {'buckets': list(BUCKETS), 'operations': operations}
+
+    def reset(self):
+        with self._lock:
+            self._operations.clear()
+            self._resolvers.clear()
+
+
+registry = MetricsRegistry()
+
+
+def start_operation(request, operation_name):
+    metrics = request.graphql_metrics = OperationMetrics(operation_name)
+    metrics.start()
+    return metrics
+
+
+def finish_operation(request, extensions, payload):
+    """Record the request's operation and report it in ``payload`` if asked to."""
+    metrics = getattr(request, 'graphql_metrics', None)
+    if metrics is None:
+        return
+    metrics.finish()
+    del request.graphql_metrics
+    registry.observe(metrics)
+    if wants_report(request, extensions):
+        payload['metrics'] = metrics.as_dict()
+
+
+def wants_report(request, extensions):
+    if not isinstance(extensions, dict) or not extensions.get('metrics'):
+        return False
+    user = getattr(request, 'user', None)
+    return settings.DEBUG or bool(user is not None and user.is_staff)
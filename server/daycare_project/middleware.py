@@ -0,0 +1,95 @@
+"""
+Graphene middleware for the daycare API.
+"""
+import time
+from functools import partial
+from inspect import isawaitable, iscoroutinefunction
+
+from asgiref.sync import sync_to_async
+from django.db.models import Model, QuerySet
+from graphene.types.resolver import dict_or_attr_resolver
+from graphql.type import get_named_type, is_leaf_type
+
+from daycare_project.metrics import current_path, resolver_path
+
+
+def is_default_resolver(info):
+    """Return True when the field is a plain attribute or key read."""
+    field = info.parent_type.fields.get(info.field_name)
+    if field is None:
+        # Introspection fields such as __typename
+        return True
+    return isinstance(field.resolve, partial) and field.resolve.func is dict_or_attr_resolver
+
+
+class SyncToAsyncMiddleware:
+    """Let synchronous resolvers run under async execution.
+
+    The Django ORM refuses to run on the event loop, so every resolver of an
+    object or list field is called through ``sync_to_async`` and querysets it
+    returns are materialised with async iteration. Async resolvers, and
+    coroutines returned by wrapped ones, are awaited on the event loop.
+    Scalar fields are resolved inline; the optimizer has already loaded the
+    columns they read. So are plain attribute reads on objects that are not
+    model instances, such as connection edges, which cannot hit the database.
+
+    ``sync_to_async`` is thread-sensitive, and Django's ASGI handler gives each
+    request its own thread, so resolvers of one request never run concurrently
+    while different requests do.
+    """
+
+    def resolve(self, next, root, info, **kwargs):
+        if is_leaf_type(get_named_type(info.return_type)):
+            return next(root, info, **kwargs)
+        if root is not None and not isinstance(root, Model) and is_default_resolver(info):
+            return next(root, info, **kwargs)
+        return self.resolve_async(next, root, info, **kwargs)
+
+    async def resolve_async(self, next, root, info, **kwargs):
+        if iscoroutinefunction(next):
+            result = next(root, info, **kwargs)
+        else:
+            result = await sync_to_async(next)(root, info, **kwargs)
+        if isawaitable(result):
+            result = await result
+        if isinstance(result, QuerySet):
+            result = [row async for row in result]
+        return result
+
+
+class ResolverMetricsMiddleware:
+    """Record wall time and SQL per resolver path (see ``daycare_project.metrics``).
+
+    Scalar fields read straight off their parent are skipped; they cost
+    nothing worth measuring and would dominate the overhead.
+    """
+
+    def resolve(self, next, root, info, **kwargs):
+        metrics = getattr(info.context, 'graphql_metrics', None)
+        if metrics is None or (
+            is_leaf_type(get_named_type(info.return_type)) and is_default_resolver(info)
+        ):
+            return next(root, info, **kwargs)
+
+        path = resolver_path(info)
+        started = time.perf_counter()
+        token = current_path.set(path)
+        result = None
+        try:
+            result = next(root, info, **kwargs)
+        finally:
+            current_path.reset(token)
+            if not isawaitable(result):
+                metrics.record_resolver(path, time.perf_counter() - started)
+        if isawaitable(result):
+            return self.resolve_async(result, metrics, path, started)
+        return result
+
+    @staticmethod
+    async def resolve_async(result, metrics, path, started):
+        token = current_path.set(path)
+        try:
+            return await result
+        finally:
+            current_path.reset(token)
+            metrics.record_resolver(path, time.perf_counter() - started)
@@ -0,0 +1,118 @@
+"""
+Shape querysets after the GraphQL selection set that will consume them.
+
+``optimize(queryset, info)`` walks the fields requested below the current
+resolver and restricts the queryset to those columns with ``.only()``. It
+joins requested foreign keys with ``select_related`` and prefetches requested
+many-to-many and reverse relations with querysets optimized the same way.
+Large columns nobody asked for (``Newsletter.content``, ``Event.description``,
+``User.bio``) are then never read.
+"""
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+from graphene.utils.str_converters import to_snake_case
+from graphql.language import FieldNode, FragmentSpreadNode, InlineFragmentNode
+
+
+def _collect(info, selection_set, fields, type_name=None):
+    """Merge the fields of a selection set, following fragments, into ``fields``."""
+    for selection in selection_set.selections:
+        if isinstance(selection, FieldNode):
+            name = selection.name.value
+            if name.startswith('__'):
+                continue
+            sub_selections = fields.setdefault(to_snake_case(name), [])
+            if selection.selection_set:
+                sub_selections.append(selection.selection_set)
+        else:
+            if isinstance(selection, FragmentSpreadNode):
+                fragment = info.fragments[selection.name.value]
+            elif isinstance(selection, InlineFragmentNode):
+                fragment = selection
+            else:
+                continue
+            condition = fragment.type_condition
+            if type_name and condition and condition.name.value != type_name:
+                continue
+            _collect(info, fragment.selection_set, fields, type_name)
+    return fields
+
+
+def _merge(info, selection_sets, type_name=None):
+    fields = {}
+    for selection_set in selection_sets:
+        _collect(info, selection_set, fields, type_name)
+    return fields
+
+
+def selected_fields(info, path=(), type_name=None):
+    """Return ``{snake_name: [sub selection sets]}`` for the current field.
+
+    ``path`` descends through wrapper fields first, e.g. ``('edges', 'node')``
+    for a connection.
+    """
+    selection_sets = [node.selection_set for node in info.field_nodes if node.selection_set]
+    for key in path:
+        selection_sets = _merge(info, selection_sets).get(key, [])
+    return _merge(info, selection_sets, type_name)
+
+
+def _plan(info, model, fields, prefix=''):
+    """Return the ``only``, ``select_related`` and ``Prefetch`` lists for ``fields``."""
+    only = [prefix + model._meta.pk.name]
+    select_related = []
+    prefetches = []
+    restrict = True
+
+    for name, sub_selections in fields.items():
+        if name == 'id':
+            continue
+        try:
+            field = model._meta.get_field(name)
+        except FieldDoesNotExist:
+            # Computed field: its resolver may read any column
+            restrict = False
+            continue
+
+        if field.many_to_many or field.one_to_many:
+            related_model = field.related_model
+            queryset = related_model._default_manager.all()
+            if field.one_to_many:
+                # Prefetching a reverse FK joins back on the remote column
+                queryset = _apply(info, queryset, _merge(info, sub_selections), (field.field.name,))
+            else:
+                queryset = _apply(info, queryset, _merge(info, sub_selections))
+            prefetches.append(Prefetch(prefix + name, queryset=queryset))
+        elif field.is_relation and field.concrete:
+            only.append(prefix + name)
+            if sub_selections:
+                nested_only, nested_related, nested_prefetches, nested_restrict = _plan(
+                    info, field.related_model, _merge(info, sub_selections), f'{prefix}{name}__'
+                )
+                select_related.append(prefix + name)
+                select_related.extend(nested_related)
+                prefetches.extend(nested_prefetches)
+                if nested_restrict:
+                    only.extend(nested_only)
+        elif field.concrete:
+            only.append(prefix + field.name)
+        else:
+            restrict = False
+
+    return only, select_related, prefetches, restrict
+
+
+def _apply(info, queryset, fields, required=()):
+    only, select_related, prefetches, restrict = _plan(info, queryset.model, fields)
+    if select_related:
+        queryset = queryset.select_related(*select_related)
+    if prefetches:
+        queryset = queryset.prefetch_related(*prefetches)
+    if restrict:
+        queryset = queryset.only(*only, *required)
+    return queryset
+
+
+def optimize(queryset, info, path=(), type_name=None):
+    """Apply ``only``/``select_related``/``prefetch_related`` for ``info``."""
+    return _apply(info, queryset, selected_fields(info, path, type_name))
@@ -0,0 +1,186 @@
+"""
+Relay-style connections paginated with keyset (seek) cursors.
+
+A cursor encodes the values of the ordering columns for the last row of a
+page, so fetching the next page is a range scan from that point instead of
+an ``OFFSET`` that re-reads every earlier row. Ordering comes from the
+queryset (usually the model's ``Meta.ordering``) with the primary key
+appended as a tie-breaker. One extra row is fetched to answer
+``hasNextPage`` without a ``COUNT``.
+
+Resolvers may also be coroutines returning a queryset (see ``AsyncQuery`` in
+``daycare_project.schema``); the page is then fetched with async iteration.
+"""
+import base64
+import json
+from functools import partial
+from inspect import isawaitable
+
+import graphene
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from django.db.models.constants import LOOKUP_SEP
+from graphene_django.settings import graphene_settings
+from graphql import GraphQLError
+
+from daycare_project.loaders import register
+from daycare_project.optimizer import optimize
+
+
+def get_ordering(queryset):
+    """Return ``[(field_name, descending)]`` with the pk as final tie-breaker."""
+    model = queryset.model
+    names = list(queryset.query.order_by or model._meta.ordering)
+    ordering = []
+    for name in names:
+        descending = name.startswith('-')
+        name = name.lstrip('-')
+        if name == 'pk':
+            name = model._meta.pk.name
+        ordering.append((name, descending))
+    pk_name = model._meta.pk.name
+    if pk_name not in [name for name, _ in ordering]:
+        ordering.append((pk_name, ordering[-1][1] if ordering else False))
+    return ordering
+
+
+def _field(model, name):
+    for part in name.split(LOOKUP_SEP)[:-1]:
+        model = model._meta.get_field(part).related_model
+    return model._meta.get_field(name.split(LOOKUP_SEP)[-1])
+
+
+def _value(instance, name):
+    for part in name.split(LOOKUP_SEP):
+        instance = getattr(instance, part)
+    return getattr(instance, 'pk', instance)
+
+
+def encode_cursor(values):
+    payload = json.dumps(
+        [value.isoformat() if hasattr(value, 'isoformat') else value for value in values],
+        separators=(',', ':'),
+    )
+    return base64.urlsafe_b64encode(payload.encode()).decode()
+
+
+def decode_values(cursor, size):
+    """Return the ``size`` raw values packed into ``cursor``."""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except ValueError:
+        values = None
+    if not isinstance(values, list) or len(values) != size:
+        raise GraphQLError('Invalid cursor.')
+    return values
+
+
+def decode_cursor(cursor, model, ordering):
+    values = decode_values(cursor, len(ordering))
+    try:
+        return [_field(model, name).to_python(value) for (name, _), value in zip(ordering, values)]
+    except ValidationError:
+        raise GraphQLError('Invalid cursor.')
+
+
+def cursor_for(instance, ordering):
+    return encode_cursor([_value(instance, name) for name, _ in ordering])
+
+
+def seek(queryset, ordering, values):
+    """Filter ``queryset`` to rows strictly after ``values`` in ``ordering``."""
+    condition = Q()
+    equal = Q()
+    for (name, descending), value in zip(ordering, values):
+        lookup = 'lt' if descending else 'gt'
+        condition |= equal & Q(**{f'{name}__{lookup}': value})
+        equal &= Q(**{name: value})
+    return queryset.filter(condition)
+
+
+def page_queryset(queryset, first=None, after=None):
+    """Return ``(queryset, ordering, first)``; the queryset is sliced to ``first + 1`` rows."""
+    max_limit = graphene_settings.RELAY_CONNECTION_MAX_LIMIT
+    if first is None:
+        first = max_limit
+    if first < 0:
+        raise GraphQLError('Argument "first" must be a non-negative integer.')
+    if max_limit:
+        first = min(first, max_limit)
+
+    ordering = get_ordering(queryset)
+    loaded, deferred = queryset.query.deferred_loading
+    if not deferred:
+        # Cursors read the ordering columns, so .only() must keep them
+        queryset = queryset.only(*loaded, *[name for name, _ in ordering])
+    queryset = queryset.order_by(*[('-' if descending else '') + name for name, descending in ordering])
+    if after:
+        queryset = seek(queryset, ordering, decode_cursor(after, queryset.model, ordering))
+    return queryset[:first + 1], ordering, first
+
+
+def paginate(queryset, first=None, after=None):
+    """Return ``(rows, ordering, has_next_page)`` for one keyset page."""
+    queryset, ordering, first = page_queryset(queryset, first, after)
+    rows = list(queryset)
+    return rows[:first], ordering, len(rows) > first
+
+
+async def apaginate(queryset, first=None, after=None):
+    """Async counterpart of ``paginate``."""
+    queryset, ordering, first = page_queryset(queryset, first, after)
+    rows = [row async for row in queryset]
+    return rows[:first], ordering, len(rows) > first
+
+
+def build_connection(connection_type, info, rows, ordering, has_next_page):
+    register(info, rows)
+    edges = [
+        connection_type.Edge(node=row, cursor=cursor_for(row, ordering))
+        for row in rows
+    ]
+    return connection_type(
+        edges=edges,
+        page_info=graphene.relay.PageInfo(
+            start_cursor=edges[0].cursor if edges else None,
+            end_cursor=edges[-1].cursor if edges else None,
+            # Forward-only pagination; the Relay spec allows answering False
+            has_previous_page=False,
+            has_next_page=has_next_page,
+        ),
+    )
+
+
+def connection_from_queryset(connection_type, queryset, info, first=None, after=None):
+    queryset = optimize(queryset, info, path=('edges', 'node'))
+    return build_connection(connection_type, info, *paginate(queryset, first, after))
+
+
+async def aconnection_from_queryset(connection_type, queryset, info, first=None, after=None):
+    queryset = await queryset
+    if queryset is None:
+        return None
+    queryset = optimize(queryset, info, path=('edges', 'node'))
+    return build_connection(connection_type, info, *await apaginate(queryset, first, after))
+
+
+class KeysetConnectionField(graphene.Field):
+    """Connection field whose resolver returns a queryset to be paginated."""
+
+    def __init__(self, connection_type, *args, **kwargs):
+        kwargs.setdefault('first', graphene.Int())
+        kwargs.setdefault('after', graphene.String())
+        super().__init__(connection_type, *args, **kwargs)
+
+    @staticmethod
+    def connection_resolver(resolver, connection_type, root, info, first=None, after=None, **kwargs):
+        queryset = resolver(root, info, **kwargs)
+        if isawaitable(queryset):
+            return aconnection_from_queryset(connection_type, queryset, info, first, after)
+        if queryset is None:
+            return None
+        return connection_from_queryset(connection_type, queryset, info, first, after)
+
+    def wrap_resolve(self, parent_resolver):
+        resolver = super().wrap_resolve(parent_resolver)
+        return partial(self.connection_resolver, resolver, self.type)
@@ -0,0 +1,112 @@
+"""
+Read-replica routing for GraphQL operations.
+
+``ReplicaRouter`` sends reads to whatever alias ``read_database`` holds for
+the current context and every write to ``default``. ``DaycareGraphQLView``
+sets it for the duration of a ``query`` operation when ``GRAPHQL_READ_REPLICA``
+names a configured database; mutations, the admin and everything else keep
+using the primary.
+
+The replica is a copy of the primary refreshed by ``manage.py sync_replica``,
+so it lags behind. After a client runs a mutation its queries stay on the
+primary for ``GRAPHQL_READ_YOUR_WRITES`` seconds, so it sees its own writes.
+Clients are told apart by their JWT, session user or address, which needs no
+database lookup.
+
+Each ``sync_replica`` run bumps the replica's generation. Cached results are
+keyed by the copy they were read from (``read_source``), so a result read
+from a lagging replica is never served to clients reading the primary, and
+stops being served once the replica has been refreshed. The generations and
+the read-your-writes markers are kept in ``GRAPHQL_SHARED_CACHE``, so they
+reach every web worker and the ``sync_replica`` process alike.
+"""
+import hashlib
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from graphql_jwt.utils import get_credentials
+
+from daycare_project.caching import get_shared_cache
+
+WRITE_PREFIX = 'replica:recent-write:'
+GENERATION_PREFIX = 'replica:generation:'
+
+read_database = ContextVar('read_database', default=DEFAULT_DB_ALIAS)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        return read_database.get()
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replica holds the same rows as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica gets its schema with the data from sync_replica
+        return db == DEFAULT_DB_ALIAS
+
+
+@contextmanager
+def reading_from(alias):
+    token = read_database.set(alias)
+    try:
+        yield
+    finally:
+        read_database.reset(token)
+
+
+def get_replica():
+    alias = getattr(settings, 'GRAPHQL_READ_REPLICA', None)
+    return alias if alias in settings.DATABASES else None
+
+
+def client_key(request):
+    token = get_credentials(request)
+    if token:
+        identity = f'jwt:{token}'
+    elif getattr(request, 'user', None) is not None and request.user.is_authenticated:
+        identity = f'user:{request.user.pk}'
+    else:
+        identity = f"addr:{request.META.get('REMOTE_ADDR', '')}"
+    return WRITE_PREFIX + hashlib.sha256(identity.encode()).hexdigest()
+
+
+def record_write(request):
+    """Keep the client's reads on the primary for the read-your-writes window."""
+    window = getattr(settings, 'GRAPHQL_READ_YOUR_WRITES', 10)
+    if get_replica() and window:
+        get_shared_cache().set(client_key(request), True, window)
+
+
+def replica_generation(alias):
+    return get_shared_cache().get(GENERATION_PREFIX + alias, 0)
+
+
+def bump_generation(alias):
+    """Record that ``alias`` now holds a newer copy of the primary."""
+    cache = get_shared_cache()
+    try:
+        cache.incr(GENERATION_PREFIX + alias)
+    except ValueError:
+        cache.set(GENERATION_PREFIX + alias, 1, None)
+
+
+def read_source(alias):
+    """Identify the copy of the data a read from ``alias`` sees."""
+    if alias == DEFAULT_DB_ALIAS:
+        return alias
+    return f'{alias}:{replica_generation(alias)}'
+
+
+def database_for_query(request):
+    """The alias a query operation from ``request`` should read from."""
+    replica = get_replica()
+    if replica is None or get_shared_cache().get(client_key(request)):
+        return DEFAULT_DB_ALIAS
+    return replica
@@ -1,12 +1,20 @@
 import graphene
 from graphene_django import DjangoObjectType
+from graphene_django.settings import graphene_settings
 from graphql_jwt.decorators import login_required
 import graphql_jwt
 
+from daycare_project import feed as feed_service
+from daycare_project import search as search_service
+from daycare_project.loaders import load_related, register
+from daycare_project.optimizer import optimize, selected_fields
+from daycare_project.pagination import KeysetConnectionField
 from accounts.models import User, Child
+from jobs.models import Job
+from newsletter.filters import AnnouncementFilter, EventFilter, NewsletterFilter, filter_queryset
 from newsletter.models import (
     Category, Newsletter, Announcement, Event,
-    SubscriptionGroup, Subscription, NewsletterRecipient
+    SubscriptionGroup, Subscription, NewsletterRecipient, NewsletterStats, UserNewsletterCounter
 )
 
 
@@ -17,6 +25,34 @@ class UserType(DjangoObjectType):
         exclude = ('password',)
 
 
+def newsletter_counter(user):
+    try:
+        return user.newsletter_counter
+    except UserNewsletterCounter.DoesNotExist:
+        return UserNewsletterCounter(user=user)
+
+
+class ViewerType(DjangoObjectType):
+    """The signed-in user as returned by `me`, with the counts only they may see.
+
+    Kept apart from UserType, which is reachable from result-cached fields
+    whose cache keys only hold the caller's role.
+    """
+    unread_newsletters = graphene.Int()
+    received_newsletter_count = graphene.Int()
+    
+    class Meta:
+        model = User
+        exclude = ('password',)
+        skip_registry = True
+    
+    def resolve_unread_newsletters(self, info):
+        return newsletter_counter(self).unread
+    
+    def resolve_received_newsletter_count(self, info):
+        return newsletter_counter(self).received
+
+
 class ChildType(DjangoObjectType):
     class Meta:
         model = Child
@@ -31,16 +67,43 @@ class CategoryType(DjangoObjectType):
 class NewsletterType(DjangoObjectType):
     class Meta:
         model = Newsletter
+    
+    def resolve_created_by(self, info):
+        return load_related(info, self, 'created_by', 'users')
+    
+    def resolve_categories(self, info):
+        return load_related(info, self, 'categories', 'newsletter_categories')
+    
+    def resolve_events(self, info):
+        return load_related(info, self, 'events', 'newsletter_events')
+    
+    def resolve_recipients(self, info):
+        return load_related(info, self, 'recipients', 'newsletter_recipients')
 
 
 class AnnouncementType(DjangoObjectType):
     class Meta:
         model = Announcement
+    
+    def resolve_created_by(self, info):
+        return load_related(info, self, 'created_by', 'users')
+    
+    def resolve_categories(self, info):
+        return load_related(info, self, 'categories', 'announcement_categories')
 
 
 class EventType(DjangoObjectType):
     class Meta:
         model = Event
+    
+    def resolve_created_by(self, info):
+        return load_related(info, self, 'created_by', 'users')
+    
+    def resolve_categories(self, info):
+        return load_related(info, self, 'categories', 'event_categories')
+    
+    def resolve_newsletters(self, info):
+        return load_related(info, self, 'newsletters', 'event_newsletters')
 
 
 class SubscriptionGroupType(DjangoObjectType):
@@ -56,17 +119,108 @@ class SubscriptionType(DjangoObjectType):
 class NewsletterRecipientType(DjangoObjectType):
     class Meta:
         model = NewsletterRecipient
+    
+    def resolve_user(self, info):
+        return load_related(info, self, 'user', 'users')
+
+
+class NewsletterStatsType(DjangoObjectType):
+    open_rate = graphene.Float(required=True)
+    click_rate = graphene.Float(required=True)
+    
+    class Meta:
+        model = NewsletterStats
+        fields = ('newsletter', 'sent', 'opened', 'clicked', 'first_opened_at', 'last_opened_at')
+
+
+# Types for jobs app
+class JobType(DjangoObjectType):
+    class Meta:
+        model = Job
+        fields = ('id', 'name', 'status', 'attempts', 'result', 'error', 'created_at', 'started_at', 'finished_at')
+    
+    def resolve_status(self, info):
+        # A just-enqueued job holds the TextChoices member, which the enum cannot serialize
+        return str(self.status)
+
+
+# Connections (keyset-paginated lists)
+class UserConnection(graphene.relay.Connection):
+    class Meta:
+        node = UserType
+
+
+class ChildConnection(graphene.relay.Connection):
+    class Meta:
+        node = ChildType
+
+
+class NewsletterConnection(graphene.relay.Connection):
+    class Meta:
+        node = NewsletterType
+
+
+class AnnouncementConnection(graphene.relay.Connection):
+    class Meta:
+        node = AnnouncementType
+
+
+class EventConnection(graphene.relay.Connection):
+    class Meta:
+        node = EventType
+
+
+# Unified dashboard feed
+class FeedItemKind(graphene.Enum):
+    NEWSLETTER = feed_service.NEWSLETTER
+    ANNOUNCEMENT = feed_service.ANNOUNCEMENT
+    EVENT = feed_service.EVENT
+
+
+class FeedItem(graphene.Union):
+    class Meta:
+        types = (NewsletterType, AnnouncementType, EventType)
+
+
+class FeedConnection(graphene.relay.Connection):
+    class Meta:
+        node = FeedItem
+    
+    class Edge:
+        timestamp = graphene.DateTime()
+
+
+# Full-text search
+class SearchConnection(graphene.relay.Connection):
+    class Meta:
+        node = FeedItem
+    
+    class Edge:
+        snippet = graphene.String(description='Best matching fragment as HTML, matched words in <mark>.')
+
+
+# Filter arguments (see newsletter.filters)
+class DateTimeRangeInput(graphene.InputObjectType):
+    after = graphene.DateTime()
+    before = graphene.DateTime()
+
+
+CONTENT_FILTERS = {
+    'category_ids': graphene.List(graphene.ID),
+    'search': graphene.String(),
+    'order_by': graphene.String(description='Comma-separated fields, prefixed with "-" for descending.'),
+}
 
 
 # Queries
 class Query(graphene.ObjectType):
     # User queries
-    users = graphene.List(UserType)
+    users = KeysetConnectionField(UserConnection)
     user = graphene.Field(UserType, id=graphene.ID())
-    me = graphene.Field(UserType)
+    me = graphene.Field(ViewerType)
     
     # Child queries
-    children = graphene.List(ChildType)
+    children = KeysetConnectionField(ChildConnection)
     child = graphene.Field(ChildType, id=graphene.ID())
     
     # Category queries
@@ -74,18 +228,59 @@ class Query(graphene.ObjectType):
     category = graphene.Field(CategoryType, id=graphene.ID())
     
     # Newsletter queries
-    newsletters = graphene.List(NewsletterType, status=graphene.String())
+    newsletters = KeysetConnectionField(
+        NewsletterConnection,
+        status=graphene.String(),
+        featured=graphene.Boolean(),
+        published_after=graphene.DateTime(),
+        published_before=graphene.DateTime(),
+        **CONTENT_FILTERS,
+    )
     newsletter = graphene.Field(NewsletterType, id=graphene.ID())
     featured_newsletters = graphene.List(NewsletterType)
+    newsletter_stats = graphene.Field(NewsletterStatsType, id=graphene.ID(required=True))
     
     # Announcement queries
-    announcements = graphene.List(AnnouncementType, is_active=graphene.Boolean())
+    announcements = KeysetConnectionField(
+        AnnouncementConnection,
+        is_active=graphene.Boolean(),
+        priority=graphene.List(graphene.String),
+        published_after=graphene.DateTime(),
+        published_before=graphene.DateTime(),
+        **CONTENT_FILTERS,
+    )
     announcement = graphene.Field(AnnouncementType, id=graphene.ID())
     
     # Event queries
-    events = graphene.List(EventType, is_active=graphene.Boolean())
+    events = KeysetConnectionField(
+        EventConnection,
+        is_active=graphene.Boolean(),
+        starts_between=DateTimeRangeInput(),
+        **CONTENT_FILTERS,
+    )
     event = graphene.Field(EventType, id=graphene.ID())
-    upcoming_events = graphene.List(EventType)
+    upcoming_events = KeysetConnectionField(EventConnection)
+    
+    # Feed queries
+    feed = graphene.Field(
+        FeedConnection,
+        first=graphene.Int(),
+        after=graphene.String(),
+        types=graphene.List(FeedItemKind),
+        category_ids=graphene.List(graphene.ID),
+    )
+    
+    # Search queries
+    search = graphene.Field(
+        SearchConnection,
+        query=graphene.String(required=True),
+        types=graphene.List(FeedItemKind),
+        first=graphene.Int(),
+        after=graphene.String(),
+    )
+    
+    # Background job queries
+    job = graphene.Field(JobType, id=graphene.ID(required=True))
     
     # Subscription queries
     subscription_groups = graphene.List(SubscriptionGroupType)
@@ -104,12 +299,16 @@ class Query(graphene.ObjectType):
         # Only staff or admin users can see user details
         user = info.context.user
         if user.is_staff or user.is_admin:
-            return User.objects.get(pk=id)
+            return optimize(User.objects.all(), info).get(pk=id)
         return None
     
     @login_required
     def resolve_me(self, info):
         user = info.context.user
+        # Load the counter here: on the async endpoint ViewerType's scalar
+        # fields are resolved on the event loop, where the ORM cannot run
+        if selected_fields(info).keys() & {'unread_newsletters', 'received_newsletter_count'}:
+            newsletter_counter(user)
         return user
     
     @login_required
@@ -125,47 +324,108 @@ class Query(graphene.ObjectType):
     def resolve_child(self, info, id):
         user = info.context.user
         if user.is_staff or user.is_admin:
-            return Child.objects.get(pk=id)
+            return optimize(Child.objects.all(), info).get(pk=id)
         elif user.is_parent:
-            return Child.objects.get(pk=id, parent=user)
+            return optimize(Child.objects.all(), info).get(pk=id, parent=user)
         return None
     
     def resolve_categories(self, info):
-        return Category.objects.all()
+        return optimize(Category.objects.all(), info)
     
     def resolve_category(self, info, id):
-        return Category.objects.get(pk=id)
+        return optimize(Category.objects.all(), info).get(pk=id)
     
-    def resolve_newsletters(self, info, status=None):
+    def resolve_newsletters(self, info, status=None, **filters):
         if status:
-            return Newsletter.objects.filter(status=status)
-        return Newsletter.objects.filter(status=Newsletter.Status.PUBLISHED)
+            queryset = Newsletter.objects.filter(status=status)
+        else:
+            queryset = Newsletter.objects.filter(status=Newsletter.Status.PUBLISHED)
+        return filter_queryset(NewsletterFilter, queryset, filters)
     
     def resolve_newsletter(self, info, id):
-        return Newsletter.objects.get(pk=id)
+        return optimize(Newsletter.objects.all(), info).get(pk=id)
+    
+    @login_required
+    def resolve_newsletter_stats(self, info, id):
+        # Engagement is only shown on staff dashboards
+        user = info.context.user
+        if not (user.is_staff or user.is_admin):
+            return None
+        stats = optimize(NewsletterStats.objects.all(), info).filter(newsletter_id=id).first()
+        if stats is None and Newsletter.objects.filter(pk=id).exists():
+            # Nothing was sent yet
+            stats = NewsletterStats(newsletter_id=id)
+        return stats
     
     def resolve_featured_newsletters(self, info):
-        return Newsletter.objects.filter(featured=True, status=Newsletter.Status.PUBLISHED)
+        return register(info, optimize(Newsletter.objects.filter(featured=True, status=Newsletter.Status.PUBLISHED), info))
     
-    def resolve_announcements(self, info, is_active=True):
-        return Announcement.objects.filter(is_active=is_active)
+    def resolve_announcements(self, info, is_active=True, **filters):
+        queryset = Announcement.objects.current() if is_active else Announcement.objects.inactive()
+        return filter_queryset(AnnouncementFilter, queryset, filters)
     
     def resolve_announcement(self, info, id):
-        return Announcement.objects.get(pk=id)
+        return optimize(Announcement.objects.all(), info).get(pk=id)
     
-    def resolve_events(self, info, is_active=True):
-        return Event.objects.filter(is_active=is_active)
+    def resolve_events(self, info, is_active=True, **filters):
+        return filter_queryset(EventFilter, Event.objects.filter(is_active=is_active), filters)
     
     def resolve_event(self, info, id):
-        return Event.objects.get(pk=id)
+        return optimize(Event.objects.all(), info).get(pk=id)
     
     def resolve_upcoming_events(self, info):
         from django.utils import timezone
         return Event.objects.filter(start_date__gte=timezone.now(), is_active=True)
     
+    def resolve_feed(self, info, first=None, after=None, types=None, category_ids=None):
+        max_limit = graphene_settings.RELAY_CONNECTION_MAX_LIMIT
+        first = max_limit if first is None else min(max(first, 0), max_limit)
+        kinds = [kind.value if hasattr(kind, 'value') else kind for kind in types or []]
+        items, has_next_page = feed_service.feed_page(info, first, after, kinds, category_ids)
+        edges = [
+            FeedConnection.Edge(node=node, cursor=cursor, timestamp=timestamp)
+            for node, timestamp, cursor in items
+        ]
+        return FeedConnection(
+            edges=edges,
+            page_info=graphene.relay.PageInfo(
+                start_cursor=edges[0].cursor if edges else None,
+                end_cursor=edges[-1].cursor if edges else None,
+                has_previous_page=False,
+                has_next_page=has_next_page,
+            ),
+        )
+    
+    def resolve_search(self, info, query, types=None, first=None, after=None):
+        max_limit = graphene_settings.RELAY_CONNECTION_MAX_LIMIT
+        first = max_limit if first is None else min(max(first, 0), max_limit)
+        kinds = [kind.value if hasattr(kind, 'value') else kind for kind in types or []]
+        items, has_next_page = search_service.search_page(info, query, first, after, kinds)
+        edges = [
+            SearchConnection.Edge(node=node, cursor=cursor, snippet=snippet)
+            for node, snippet, cursor in items
+        ]
+        return SearchConnection(
+            edges=edges,
+            page_info=graphene.relay.PageInfo(
+                start_cursor=edges[0].cursor if edges else None,
+                end_cursor=edges[-1].cursor if edges else None,
+                has_previous_page=False,
+                has_next_page=has_next_page,
+            ),
+        )
+    
+    @login_required
+    def resolve_job(self, info, id):
+        # Jobs are enqueued by staff actions, so only staff can poll them
+        user = info.context.user
+        if user.is_staff or user.is_admin:
+            return optimize(Job.objects.all(), info).get(pk=id)
+        return None
+    
     @login_required
     def resolve_subscription_groups(self, info):
-        return SubscriptionGroup.objects.all()
+        return optimize(SubscriptionGroup.objects.all(), info)
     
     @login_required
     def resolve_my_subscription(self, info):
@@ -316,38 +576,41 @@ class CreateNewsletterMutation(graphene.Mutation):
 
 class PublishNewsletterMutation(graphene.Mutation):
     newsletter = graphene.Field(NewsletterType)
+    job = graphene.Field(JobType)
     
     class Arguments:
         id = graphene.ID(required=True)
         send_to_all = graphene.Boolean()
+        group_ids = graphene.List(graphene.ID)
+        child_groups = graphene.List(graphene.String)
     
     @login_required
-    def mutate(self, info, id, send_to_all=False):
+    def mutate(self, info, id, send_to_all=False, group_ids=None, child_groups=None):
         user = info.context.user
         
         # Only staff and admin can publish newsletters
         if not (user.is_staff or user.is_admin):
             raise Exception("Permission denied. Only staff and admins can publish newsletters.")
         
-        newsletter = Newsletter.objects.get(pk=id)
-        newsletter.publish()
+        targeted = bool(group_ids or child_groups)
+        if send_to_all and targeted:
+            raise Exception("Pass either sendToAll or groupIds/childGroups, not both.")
         
+        newsletter = Newsletter.objects.get(pk=id)
         if send_to_all:
             newsletter.sent_to_all = True
-            newsletter.save()
-            
-            # Create recipient records for all subscribed users
-            subscribed_users = User.objects.filter(
-                subscriptions__is_subscribed=True
-            )
-            
-            for recipient in subscribed_users:
-                NewsletterRecipient.objects.create(
-                    newsletter=newsletter,
-                    user=recipient
-                )
-        
-        return PublishNewsletterMutation(newsletter=newsletter)
+        newsletter.publish()
+        
+        payload = {'newsletter_id': newsletter.pk}
+        if targeted:
+            payload.update(group_ids=[int(group_id) for group_id in group_ids or []], child_groups=child_groups or [])
+        
+        job = None
+        if send_to_all or targeted:
+            # Recipient fan-out runs in a worker; the client polls `job`
+            job = Job.objects.enqueue('newsletter.fan_out', payload)
+        
+        return PublishNewsletterMutation(newsletter=newsletter, job=job)
 
 
 class CreateAnnouncementMutation(graphene.Mutation):
@@ -474,4 +737,48 @@ class Mutation(graphene.ObjectType):
     update_subscription = UpdateSubscriptionMutation.Field()
 
 
+class AsyncQuery(Query):
+    """Query root for async execution, served by ``AsyncDaycareGraphQLView``.
+
+    The public newsletter reads use the async ORM; connection resolvers return
+    querysets that ``KeysetConnectionField`` pages with async iteration. Every
+    other field is inherited and runs through ``SyncToAsyncMiddleware``.
+    """
+
+    class Meta:
+        name = 'Query'
+
+    async def resolve_categories(self, info):
+        return [category async for category in optimize(Category.objects.all(), info)]
+
+    async def resolve_category(self, info, id):
+        return await optimize(Category.objects.all(), info).aget(pk=id)
+
+    async def resolve_newsletters(self, info, status=None, **filters):
+        return Query.resolve_newsletters(self, info, status, **filters)
+
+    async def resolve_newsletter(self, info, id):
+        return await optimize(Newsletter.objects.all(), info).aget(pk=id)
+
+    async def resolve_featured_newsletters(self, info):
+        queryset = optimize(Newsletter.objects.filter(featured=True, status=Newsletter.Status.PUBLISHED), info)
+        return register(info, [newsletter async for newsletter in queryset])
+
+    async def resolve_announcements(self, info, is_active=True, **filters):
+        return Query.resolve_announcements(self, info, is_active, **filters)
+
+    async def resolve_announcement(self, info, id):
+        return await optimize(Announcement.objects.all(), info).aget(pk=id)
+
+    async def resolve_events(self, info, is_active=True, **filters):
+        return Query.resolve_events(self, info, is_active, **filters)
+
+    async def resolve_event(self, info, id):
+        return await optimize(Event.objects.all(), info).aget(pk=id)
+
+    async def resolve_upcoming_events(self, info):
+        return Query.resolve_upcoming_events(self, info)
+
+
 schema = graphene.Schema(query=Query, mutation=Mutation)
+async_schema = graphene.Schema(query=AsyncQuery, mutation=Mutation)
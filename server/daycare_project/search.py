@@ -0,0 +1,65 @@
+"""
+Ranked full-text search across newsletters, announcements and events.
+
+Matching and ranking happen in the FTS5 indexes (see ``newsletter.fulltext``):
+a page is one query for the ranked ``(score, kind, id)`` keys, then one query
+per content type for the snippets and one for the rows. The cursor is the key
+of the last result, so later pages seek past it instead of re-ranking and
+skipping earlier matches.
+"""
+from graphql import GraphQLError
+
+from daycare_project.feed import ANNOUNCEMENT, KINDS, NEWSLETTER
+from daycare_project.loaders import register
+from daycare_project.optimizer import optimize
+from daycare_project.pagination import decode_values, encode_cursor
+from newsletter import fulltext
+from newsletter.models import Newsletter, Announcement, Event
+
+
+def searchable(kind):
+    """The rows of ``kind`` that search results may include."""
+    if kind == NEWSLETTER:
+        return Newsletter.objects.filter(status=Newsletter.Status.PUBLISHED)
+    if kind == ANNOUNCEMENT:
+        return Announcement.objects.current()
+    return Event.objects.filter(is_active=True)
+
+
+def decode_search_cursor(cursor):
+    score, kind, pk = decode_values(cursor, 3)
+    if not isinstance(score, (int, float)) or kind not in KINDS or not isinstance(pk, int):
+        raise GraphQLError('Invalid cursor.')
+    return score, kind, pk
+
+
+def search_page(info, query, first, after=None, kinds=None):
+    """Return ``([(instance, snippet, cursor)], has_next_page)`` for one page."""
+    querysets = {kind: searchable(kind) for kind in kinds or KINDS}
+    using = next(iter(querysets.values())).db
+    if not fulltext.is_available(using):
+        raise GraphQLError('Search is not available.')
+    after = decode_search_cursor(after) if after else None
+
+    keys = fulltext.rank(querysets, query, first + 1, after)
+    has_next_page = len(keys) > first
+    keys = keys[:first]
+
+    ids_by_kind = {}
+    for _, kind, pk in keys:
+        ids_by_kind.setdefault(kind, []).append(pk)
+    rows = {}
+    for kind, ids in ids_by_kind.items():
+        model = KINDS[kind]
+        texts = fulltext.snippets(model, query, ids, using)
+        queryset = optimize(model.objects.all(), info, ('edges', 'node'), f'{model.__name__}Type')
+        instances = queryset.in_bulk(ids)
+        register(info, instances.values())
+        rows.update({(kind, pk): (instance, texts.get(pk, '')) for pk, instance in instances.items()})
+
+    page = [
+        (*rows[(kind, pk)], encode_cursor([score, kind, pk]))
+        for score, kind, pk in keys
+        if (kind, pk) in rows
+    ]
+    return page, has_next_page
@@ -48,6 +48,7 @@ INSTALLED_APPS = [
     # Local apps
     'accounts',
     'newsletter',
+    'jobs',
 ]
 
 MIDDLEWARE = [
@@ -85,13 +86,28 @@ WSGI_APPLICATION = 'daycare_project.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
+# SQLite with WAL and tuned pragmas (see daycare_project/sqlite3/base.py);
+# connections are kept for CONN_MAX_AGE seconds instead of one per request
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        'ENGINE': 'daycare_project.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
-    }
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+    },
+    # Copy of the primary refreshed by `manage.py sync_replica`; only used
+    # when GRAPHQL_READ_REPLICA names it
+    'replica': {
+        'ENGINE': 'daycare_project.sqlite3',
+        'NAME': BASE_DIR / 'db.replica.sqlite3',
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+        'TEST': {'MIRROR': 'default'},
+    },
 }
 
+DATABASE_ROUTERS = ['daycare_project.routers.ReplicaRouter']
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -146,11 +162,78 @@ AUTH_USER_MODEL = 'accounts.User'
 # GraphQL settings
 GRAPHENE = {
     'SCHEMA': 'daycare_project.schema.schema',
+    # graphql-core wraps resolvers in list order, so the last entry runs first;
+    # resolver metrics sit innermost to leave JWT authentication out of them
     'MIDDLEWARE': [
+        'daycare_project.middleware.ResolverMetricsMiddleware',
         'graphql_jwt.middleware.JSONWebTokenMiddleware',
     ],
 }
 
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # Keys every process must agree on: the result cache version, replica
+    # generations and read-your-writes markers
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache',
+    },
+}
+GRAPHQL_SHARED_CACHE = 'shared'
+
+# Parsed/validated GraphQL documents kept per process, and how long
+# automatic persisted queries stay registered (None = until evicted)
+GRAPHQL_DOCUMENT_CACHE_SIZE = 256
+GRAPHQL_PERSISTED_QUERY_CACHE = 'default'
+GRAPHQL_PERSISTED_QUERY_TIMEOUT = None
+
+# Response cache for public read operations; entries are also invalidated
+# whenever newsletters, announcements, events or categories change
+GRAPHQL_RESULT_CACHE = 'default'
+GRAPHQL_RESULT_CACHE_TIMEOUT = 300
+
+# Database alias GraphQL queries read from (None = the primary), and how many
+# seconds a client's queries stay on the primary after it ran a mutation
+GRAPHQL_READ_REPLICA = os.environ.get('GRAPHQL_READ_REPLICA') or None
+GRAPHQL_READ_YOUR_WRITES = 10
+
+# Static cost analysis: each object field costs 1 per parent and list fields
+# multiply their children by `first` (or DEFAULT_LIST_SIZE)
+GRAPHQL_QUERY_COST = {
+    'MAX_COST': 10000,
+    'MAX_DEPTH': 10,
+    'DEFAULT_LIST_SIZE': 10,
+}
+
+# Email
+# https://docs.djangoproject.com/en/4.2/topics/email/
+
+EMAIL_HOST = os.environ.get('EMAIL_HOST', 'localhost')
+EMAIL_PORT = int(os.environ.get('EMAIL_PORT', 25))
+DEFAULT_FROM_EMAIL = os.environ.get('DEFAULT_FROM_EMAIL', 'newsletter@discoverers-daycare.example')
+
+# Newsletter delivery: recipients per delivery job, messages per second all
+# worker processes together may send (None = unlimited), and seconds after
+# which the recipients claimed by a worker that died mid-send are sent again
+NEWSLETTER_DELIVERY = {
+    'BATCH_SIZE': 200,
+    'RATE_LIMIT': 10,
+    'CLAIM_TIMEOUT': 600,
+}
+
+# Open/click tracking: the site URL used in emailed links, and how often
+# (seconds) or after how many pending events recorded events are written
+NEWSLETTER_TRACKING = {
+    'BASE_URL': os.environ.get('SITE_URL', 'http://localhost:8000'),
+    'FLUSH_INTERVAL': 5,
+    'MAX_BUFFER': 1000,
+}
+
 # GraphQL JWT settings
 AUTHENTICATION_BACKENDS = [
     'graphql_jwt.backends.JSONWebTokenBackend',
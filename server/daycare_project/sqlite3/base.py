@@ -0,0 +1,68 @@
+"""
+SQLite backend tuned for a web process and job workers sharing one file.
+
+Select it with ``'ENGINE': 'daycare_project.sqlite3'``. Every new connection
+runs ``PRAGMAS`` (from the database settings, defaulting to ``DEFAULT_PRAGMAS``):
+
+* ``journal_mode=WAL`` lets readers keep reading while a fan-out writes;
+* ``synchronous=NORMAL`` is durable across application crashes under WAL
+  and skips an fsync per commit;
+* ``busy_timeout`` makes a writer wait for the lock instead of failing with
+  "database is locked" at once;
+* ``mmap_size``/``cache_size`` keep hot pages in memory.
+
+Blocks that write use ``write_atomic()`` instead of ``atomic()``: the
+outermost one starts with ``BEGIN IMMEDIATE``, so the transaction takes the
+write lock up front, where ``busy_timeout`` applies. A deferred transaction
+that reads first and then writes fails immediately when another writer got
+there in between. Plain ``atomic()`` blocks, such as the admin's change
+views, stay deferred and do not hold the single write lock while they read
+(``TRANSACTION_MODE`` overrides the mode of every transaction).
+"""
+from django.db import transaction
+from django.db.backends.sqlite3 import base
+
+DEFAULT_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,
+    'mmap_size': 128 * 1024 * 1024,
+    # Negative values are KiB: a 64 MiB page cache
+    'cache_size': -64 * 1024,
+    'temp_store': 'MEMORY',
+}
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    # Set by write_atomic() while it opens the outermost transaction
+    begin_immediate = False
+
+    @property
+    def pragmas(self):
+        pragmas = self.settings_dict.get('PRAGMAS')
+        return DEFAULT_PRAGMAS if pragmas is None else pragmas
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for name, value in self.pragmas.items():
+            conn.execute(f'PRAGMA {name} = {value}')
+        return conn
+
+    def _start_transaction_under_autocommit(self):
+        mode = self.settings_dict.get('TRANSACTION_MODE') or ('IMMEDIATE' if self.begin_immediate else None)
+        self.cursor().execute(f'BEGIN {mode}' if mode else 'BEGIN')
+
+
+class WriteAtomic(transaction.Atomic):
+    def __enter__(self):
+        connection = transaction.get_connection(self.using)
+        connection.begin_immediate = True
+        try:
+            super().__enter__()
+        finally:
+            connection.begin_immediate = False
+
+
+def write_atomic(using=None, savepoint=True):
+    """``transaction.atomic()`` for a block that writes; on SQLite it takes the write lock at once."""
+    return WriteAtomic(using, savepoint, False)
@@ -15,15 +15,21 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 from django.contrib import admin
-from django.urls import path
+from django.urls import include, path
 from django.conf import settings
 from django.conf.urls.static import static
-from graphene_django.views import GraphQLView
 from django.views.decorators.csrf import csrf_exempt
 
+from daycare_project.schema import async_schema
+from daycare_project.views import AsyncDaycareGraphQLView, DaycareGraphQLView, metrics_view
+
 urlpatterns = [
     path('admin/', admin.site.urls),
-    path('graphql/', csrf_exempt(GraphQLView.as_view(graphiql=True))),
+    path('graphql/', csrf_exempt(DaycareGraphQLView.as_view(graphiql=True))),
+    # Async execution; serve it from daycare_project.asgi for concurrency
+    path('graphql/async/', csrf_exempt(AsyncDaycareGraphQLView.as_view(schema=async_schema))),
+    path('graphql/metrics/', metrics_view),
+    path('newsletter/', include('newsletter.urls')),
 ]
 
 # Add media and static URL patterns in development
@@ -0,0 +1,376 @@
+"""
+GraphQL endpoint for the daycare API.
+
+``DaycareGraphQLView`` keeps graphene-django's request handling but executes
+documents taken from the process-wide ``DocumentCache``, accepts automatic
+persisted queries (see ``daycare_project.documents``), rejects operations over
+the cost budget (see ``daycare_project.cost``) and serves public read
+operations from the response cache (see ``daycare_project.caching``). Query
+operations read from the configured replica (see ``daycare_project.routers``).
+Anything resolvers or middleware put in ``request.graphql_extensions`` is
+returned to the client under the response's ``extensions`` key.
+
+``AsyncDaycareGraphQLView`` serves the same pipeline with async execution for
+ASGI deployments. Executed operations are timed per resolver (see
+``daycare_project.metrics``) and ``metrics_view`` dumps the aggregates.
+"""
+import json
+from contextlib import nullcontext
+from inspect import isawaitable
+from typing import NamedTuple
+
+from asgiref.sync import sync_to_async
+from django.contrib.admin.views.decorators import staff_member_required
+from django.contrib.auth import authenticate
+from django.db import connection, transaction
+from django.http import HttpResponse, HttpResponseNotAllowed, JsonResponse
+from django.http.response import HttpResponseBadRequest
+from graphene_django.constants import MUTATION_ERRORS_FLAG
+from graphene_django.settings import graphene_settings
+from graphene_django.utils.utils import set_rollback
+from graphene_django.views import GraphQLView, HttpError
+from graphql import GraphQLError, OperationType, execute, get_operation_ast, validate
+from graphql.execution import ExecutionResult
+from graphql_jwt.exceptions import JSONWebTokenError
+from graphql_jwt.middleware import JSONWebTokenMiddleware
+from graphql_jwt.utils import get_http_authorization
+
+from daycare_project import caching, metrics, routers
+from daycare_project.cost import cost_rule
+from daycare_project.documents import get_document_cache, query_hash, resolve_persisted_query
+from daycare_project.middleware import SyncToAsyncMiddleware
+from daycare_project.sqlite3.base import write_atomic
+
+
+class PreparedOperation(NamedTuple):
+    """A validated operation ready to execute."""
+
+    options: dict
+    operation_ast: object
+    result_key: str
+    extensions: dict
+    # Alias a query operation reads from; None for mutations
+    database: str = None
+
+    @property
+    def operation_name(self):
+        if self.operation_ast is not None and self.operation_ast.name:
+            return self.operation_ast.name.value
+        return None
+
+
+class DaycareGraphQLView(GraphQLView):
+    """GraphQL view with cached documents and persisted-query support."""
+
+    @staticmethod
+    def get_extensions(request, data):
+        extensions = request.GET.get('extensions') or data.get('extensions')
+        if extensions and isinstance(extensions, str):
+            try:
+                extensions = json.loads(extensions)
+            except ValueError:
+                raise HttpError(HttpResponseBadRequest('Extensions are invalid JSON.'))
+        return extensions
+
+    def execute_graphql_request(
+        self, request, data, query, variables, operation_name, show_graphiql=False
+    ):
+        # The user is looked up here, on the primary, rather than by the JWT
+        # middleware while reads go to a replica that may not have them yet
+        try:
+            self.authenticate(request)
+        except JSONWebTokenError as e:
+            return ExecutionResult(errors=[GraphQLError(str(e))])
+
+        prepared = self.prepare_operation(request, data, query, variables, operation_name, show_graphiql)
+        if not isinstance(prepared, PreparedOperation):
+            return prepared
+        return self.execute_prepared(request, prepared)
+
+    def prepare_operation(
+        self, request, data, query, variables, operation_name, show_graphiql=False
+    ):
+        """Return a ``PreparedOperation``, or the ``ExecutionResult`` to answer with."""
+        extensions = self.get_extensions(request, data)
+        try:
+            query = resolve_persisted_query(query, extensions)
+        except GraphQLError as e:
+            return ExecutionResult(errors=[e])
+
+        if not query:
+            if show_graphiql:
+                return None
+            raise HttpError(HttpResponseBadRequest('Must provide query string.'))
+
+        document_key = query_hash(query)
+        try:
+            document, validation_errors = get_document_cache(self.schema).get(query, document_key)
+        except Exception as e:
+            return ExecutionResult(errors=[e])
+        if validation_errors:
+            return ExecutionResult(data=None, errors=validation_errors)
+
+        # Cost depends on variables such as `first`, so it is checked per request
+        cost = self.get_extensions_payload(request).setdefault('cost', {})
+        cost_errors = validate(
+            self.schema.graphql_schema, document, [cost_rule(variables, operation_name, cost)]
+        )
+        if cost_errors:
+            return ExecutionResult(data=None, errors=cost_errors)
+
+        operation_ast = get_operation_ast(document, operation_name)
+        if request.method.lower() == 'get':
+            if operation_ast and operation_ast.operation != OperationType.QUERY:
+                if show_graphiql:
+                    return None
+
+                raise HttpError(
+                    HttpResponseNotAllowed(
+                        ['POST'],
+                        'Can only perform a {} operation from a POST request.'.format(
+                            operation_ast.operation.value
+                        ),
+                    )
+                )
+
+        try:
+            options = {
+                'document': document,
+                'root_value': self.get_root_value(request),
+                'variable_values': variables,
+                'operation_name': operation_name,
+                'context_value': self.get_context(request),
+                'middleware': self.get_middleware(request),
+            }
+            if self.execution_context_class:
+                options['execution_context_class'] = self.execution_context_class
+
+            database = None
+            result_key = None
+            if not self.is_mutation(operation_ast):
+                database = routers.database_for_query(request)
+                result_key = self.get_result_key(
+                    request, document, operation_ast, document_key, variables, operation_name, database
+                )
+        except Exception as e:
+            return ExecutionResult(errors=[e])
+        return PreparedOperation(options, operation_ast, result_key, extensions, database)
+
+    def execute_prepared(self, request, prepared):
+        try:
+            until = None
+            if prepared.result_key:
+                data = caching.get_result(prepared.result_key)
+                if data is not None:
+                    return ExecutionResult(data=data)
+                # Taken before executing, so nothing can expire unnoticed in between
+                until = caching.valid_until(prepared.options['document'], prepared.operation_ast)
+
+            metrics.start_operation(request, prepared.operation_name)
+            try:
+                with self.read_database(request, prepared):
+                    result = self.execute_operation(request, prepared)
+            finally:
+                metrics.finish_operation(request, prepared.extensions, self.get_extensions_payload(request))
+                if self.is_mutation(prepared.operation_ast):
+                    routers.record_write(request)
+
+            if prepared.result_key and not result.errors:
+                caching.set_result(prepared.result_key, result.data, valid_until=until)
+            return result
+        except Exception as e:
+            return ExecutionResult(errors=[e])
+
+    def execute_operation(self, request, prepared):
+        if self.is_mutation(prepared.operation_ast) and (
+            graphene_settings.ATOMIC_MUTATIONS is True
+            or connection.settings_dict.get('ATOMIC_MUTATIONS', False) is True
+        ):
+            with write_atomic():
+                result = self.execute_document(**prepared.options)
+                if getattr(request, MUTATION_ERRORS_FLAG, False) is True:
+                    transaction.set_rollback(True)
+            return result
+        return self.execute_document(**prepared.options)
+
+    @staticmethod
+    def read_database(request, prepared):
+        """Route the reads of a query operation to the replica, if one is configured."""
+        if prepared.database is None:
+            return nullcontext()
+        return routers.reading_from(prepared.database)
+    
+    @staticmethod
+    def is_mutation(operation_ast):
+        return operation_ast is not None and operation_ast.operation == OperationType.MUTATION
+
+    @staticmethod
+    def get_result_key(request, document, operation_ast, document_key, variables, operation_name, database):
+        """Return the response-cache key, or None if the result must not be cached."""
+        if not caching.is_cacheable(document, operation_ast):
+            return None
+        role = caching.request_role(request)
+        if role is None:
+            return None
+        return caching.result_key(document_key, operation_name, variables, role, routers.read_source(database))
+
+    @staticmethod
+    def authenticate(request):
+        """Resolve ``request.user``, authenticating a JWT if one was sent."""
+        if request.user.is_anonymous and get_http_authorization(request) is not None:
+            user = authenticate(request=request)
+            if user is not None:
+                request.user = user
+
+    @staticmethod
+    def get_extensions_payload(request):
+        """Return the dict returned to the client as the response's ``extensions``."""
+        if not hasattr(request, 'graphql_extensions'):
+            request.graphql_extensions = {}
+        return request.graphql_extensions
+
+    def get_response(self, request, data, show_graphiql=False):
+        query, variables, operation_name, id = self.get_graphql_params(request, data)
+
+        execution_result = self.execute_graphql_request(
+            request, data, query, variables, operation_name, show_graphiql
+        )
+        return self.build_response(request, execution_result, id, show_graphiql)
+
+    def build_response(self, request, execution_result, id=None, show_graphiql=False):
+        """Return ``(body, status_code)`` for an ``ExecutionResult``."""
+        if getattr(request, MUTATION_ERRORS_FLAG, False) is True:
+            set_rollback()
+
+        status_code = 200
+        if execution_result:
+            response = {}
+
+            if execution_result.errors:
+                set_rollback()
+                response['errors'] = [
+                    self.format_error(e) for e in execution_result.errors
+                ]
+
+            if execution_result.errors and any(
+                not getattr(e, 'path', None) for e in execution_result.errors
+            ):
+                status_code = 400
+            else:
+                response['data'] = execution_result.data
+
+            extensions = self.get_extensions_payload(request)
+            if extensions:
+                response['extensions'] = extensions
+
+            if self.batch:
+                response['id'] = id
+                response['status'] = status_code
+
+            result = self.json_encode(request, response, pretty=show_graphiql)
+        else:
+            result = None
+
+        return result, status_code
+
+    def execute_document(self, **options):
+        result = execute(self.schema.graphql_schema, **options)
+        if isawaitable(result):
+            raise GraphQLError('GraphQL execution failed to complete synchronously.')
+        return result
+
+
+class AsyncDaycareGraphQLView(DaycareGraphQLView):
+    """Async GraphQL endpoint for ASGI deployments.
+
+    Queries run with ``graphql.execute`` on the event loop, so a worker waiting
+    on slow clients or on the database does not hold a thread per request.
+    Resolvers may be coroutines using the async ORM; synchronous ones are
+    offloaded by ``SyncToAsyncMiddleware``. Mutations keep running as one
+    synchronous block in a worker thread so ``ATOMIC_MUTATIONS`` still wraps
+    them in a single transaction.
+
+    GraphiQL and batching are only served by the synchronous view.
+    """
+
+    view_is_async = True
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        # The JWT middleware reads request.user lazily, which would query the
+        # session on the event loop; the view authenticates up front instead.
+        self.sync_middleware = [
+            middleware for middleware in self.middleware
+            if not isinstance(middleware, JSONWebTokenMiddleware)
+        ]
+        # The last middleware is the outermost, so the others run off the loop too
+        self.middleware = [*self.sync_middleware, SyncToAsyncMiddleware()]
+
+    async def dispatch(self, request, *args, **kwargs):
+        try:
+            if request.method.lower() not in ('get', 'post'):
+                raise HttpError(
+                    HttpResponseNotAllowed(
+                        ['GET', 'POST'], 'GraphQL only supports GET and POST requests.'
+                    )
+                )
+
+            data = self.parse_body(request)
+            query, variables, operation_name, id = self.get_graphql_params(request, data)
+            execution_result = await self.execute_graphql_request_async(
+                request, data, query, variables, operation_name
+            )
+            result, status_code = await sync_to_async(self.build_response)(request, execution_result, id)
+            return HttpResponse(status=status_code, content=result, content_type='application/json')
+
+        except HttpError as e:
+            response = e.response
+            response['Content-Type'] = 'application/json'
+            response.content = self.json_encode(request, {'errors': [self.format_error(e)]})
+            return response
+
+    async def execute_graphql_request_async(self, request, data, query, variables, operation_name):
+        try:
+            await sync_to_async(self.authenticate)(request)
+        except JSONWebTokenError as e:
+            return ExecutionResult(errors=[GraphQLError(str(e))])
+
+        prepared = await sync_to_async(self.prepare_operation)(
+            request, data, query, variables, operation_name
+        )
+        if not isinstance(prepared, PreparedOperation):
+            return prepared
+
+        if self.is_mutation(prepared.operation_ast):
+            options = dict(prepared.options, middleware=self.sync_middleware)
+            return await sync_to_async(self.execute_prepared)(request, prepared._replace(options=options))
+
+        try:
+            until = None
+            if prepared.result_key:
+                data = await sync_to_async(caching.get_result)(prepared.result_key)
+                if data is not None:
+                    return ExecutionResult(data=data)
+                until = await sync_to_async(caching.valid_until)(prepared.options['document'], prepared.operation_ast)
+
+            await sync_to_async(metrics.start_operation)(request, prepared.operation_name)
+            try:
+                with self.read_database(request, prepared):
+                    result = execute(self.schema.graphql_schema, **prepared.options)
+                    if isawaitable(result):
+                        result = await result
+            finally:
+                await sync_to_async(metrics.finish_operation)(
+                    request, prepared.extensions, self.get_extensions_payload(request)
+                )
+            if prepared.result_key and not result.errors:
+                await sync_to_async(caching.set_result)(prepared.result_key, result.data, valid_until=until)
+            return result
+        except Exception as e:
+            return ExecutionResult(errors=[e])
+
+
+@staff_member_required
+def metrics_view(request):
+    """Dump the process-wide resolver histograms as JSON."""
+    return JsonResponse(metrics.registry.snapshot())
@@ -0,0 +1,25 @@
+from django.contrib import admin
+from django.utils.translation import gettext_lazy as _
+
+from .models import Job
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'name', 'status', 'attempts', 'created_at', 'started_at', 'finished_at', 'locked_by')
+    list_filter = ('status', 'name')
+    readonly_fields = (
+        'name', 'payload', 'attempts', 'locked_by', 'locked_until', 'result', 'error',
+        'created_at', 'started_at', 'finished_at',
+    )
+    actions = ['retry_jobs']
+
+    def has_add_permission(self, request):
+        return False
+
+    def retry_jobs(self, request, queryset):
+        count = queryset.filter(status=Job.Status.FAILED).update(
+            status=Job.Status.QUEUED, attempts=0, error='', finished_at=None,
+        )
+        self.message_user(request, _(f'{count} jobs were queued again.'))
+    retry_jobs.short_description = _('Retry selected failed jobs')
@@ -0,0 +1,62 @@
+import multiprocessing
+import signal
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from jobs.worker import Worker
+
+
+def _run_worker(options, burst):
+    worker = Worker(
+        lease=timedelta(seconds=options['lease']),
+        backoff=timedelta(seconds=options['backoff']),
+        poll_interval=options['poll_interval'],
+    )
+
+    def stop(signum, frame):
+        # Let the current job finish; its lease covers a hard kill
+        worker.stopping = True
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    worker.run(burst=burst)
+
+
+class Command(BaseCommand):
+    help = 'Run background jobs from the job table.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=1, help='Worker processes to start.')
+        parser.add_argument('--lease', type=int, default=300, help='Seconds a claimed job stays leased.')
+        parser.add_argument('--backoff', type=int, default=30, help='Base retry delay in seconds.')
+        parser.add_argument('--poll-interval', type=float, default=1.0, help='Seconds to wait when idle.')
+        parser.add_argument('--burst', action='store_true', help='Exit once no job is due.')
+
+    def handle(self, *args, **options):
+        processes = max(1, options['processes'])
+        if processes == 1:
+            _run_worker(options, options['burst'])
+            return
+
+        # Children must open their own connections rather than share the parent's
+        connections.close_all()
+        context = multiprocessing.get_context('fork')
+        children = [
+            context.Process(target=_run_worker, args=(options, options['burst']), daemon=True)
+            for _ in range(processes)
+        ]
+        for child in children:
+            child.start()
+        self.stdout.write(f'Started {processes} workers.')
+
+        def stop(signum, frame):
+            for child in children:
+                if child.is_alive():
+                    child.terminate()
+
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+        for child in children:
+            child.join()
@@ -0,0 +1,122 @@
+from datetime import timedelta
+
+from django.db import models
+from django.db.models import F, Q
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+
+from .registry import get_task
+
+# How long a claimed job stays leased to its worker, and the base delay
+# before a failed job is retried (doubled on every further attempt)
+DEFAULT_LEASE = timedelta(minutes=5)
+DEFAULT_BACKOFF = timedelta(seconds=30)
+
+
+class JobManager(models.Manager):
+    def enqueue(self, name, payload=None, **fields):
+        """Queue a run of the task registered as ``name``."""
+        get_task(name)
+        return self.create(name=name, payload=payload or {}, **fields)
+
+    def enqueue_many(self, name, payloads, **fields):
+        """Queue one run of ``name`` per payload with a single bulk insert."""
+        get_task(name)
+        return self.bulk_create([self.model(name=name, payload=payload, **fields) for payload in payloads])
+
+    def claimable(self, now=None):
+        """Jobs that are due, or whose worker's lease has expired."""
+        now = now or timezone.now()
+        return self.filter(
+            Q(status=Job.Status.QUEUED, run_after__lte=now)
+            | Q(status=Job.Status.RUNNING, locked_until__lt=now),
+            attempts__lt=F('max_attempts'),
+        )
+
+    def claim(self, worker, lease=DEFAULT_LEASE, candidates=5):
+        """Lease the next due job to ``worker`` and return it, or None.
+
+        The claim is a compare-and-swap: the UPDATE only matches while the job
+        is still claimable with the ``attempts`` value that was read, and every
+        claim increments ``attempts``. Of several workers racing for a job
+        exactly one UPDATE changes a row, which holds under SQLite's
+        single-writer locking as well as on row-locking databases.
+        """
+        now = timezone.now()
+        due = self.claimable(now).order_by('run_after', 'pk').values_list('pk', 'attempts')[:candidates]
+        for pk, attempts in due:
+            claimed = self.claimable(now).filter(pk=pk, attempts=attempts).update(
+                status=Job.Status.RUNNING,
+                attempts=attempts + 1,
+                locked_by=worker,
+                locked_until=now + lease,
+                started_at=now,
+            )
+            if claimed:
+                return self.get(pk=pk)
+        return None
+
+    def fail_expired(self):
+        """Fail running jobs whose lease expired on their last attempt."""
+        return self.filter(
+            status=Job.Status.RUNNING,
+            locked_until__lt=timezone.now(),
+            attempts__gte=F('max_attempts'),
+        ).update(status=Job.Status.FAILED, error='Lease expired.', locked_until=None, finished_at=timezone.now())
+
+
+class Job(models.Model):
+    """A unit of background work, run by `manage.py run_worker`."""
+    class Status(models.TextChoices):
+        QUEUED = 'QUEUED', _('Queued')
+        RUNNING = 'RUNNING', _('Running')
+        SUCCEEDED = 'SUCCEEDED', _('Succeeded')
+        FAILED = 'FAILED', _('Failed')
+
+    name = models.CharField(_('name'), max_length=100)
+    payload = models.JSONField(_('payload'), default=dict, blank=True)
+    status = models.CharField(_('status'), max_length=10, choices=Status.choices, default=Status.QUEUED)
+    attempts = models.PositiveIntegerField(_('attempts'), default=0)
+    max_attempts = models.PositiveIntegerField(_('max attempts'), default=3)
+    run_after = models.DateTimeField(_('run after'), default=timezone.now)
+    locked_by = models.CharField(_('locked by'), max_length=100, blank=True)
+    locked_until = models.DateTimeField(_('locked until'), null=True, blank=True)
+    result = models.JSONField(_('result'), null=True, blank=True)
+    error = models.TextField(_('error'), blank=True)
+    created_at = models.DateTimeField(_('created at'), auto_now_add=True)
+    started_at = models.DateTimeField(_('started at'), null=True, blank=True)
+    finished_at = models.DateTimeField(_('finished at'), null=True, blank=True)
+
+    objects = JobManager()
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [models.Index(fields=['status', 'run_after'])]
+        verbose_name = _('job')
+        verbose_name_plural = _('jobs')
+
+    def __str__(self):
+        return f'{self.name} #{self.pk} ({self.status})'
+
+    def _owned(self):
+        # Only the worker holding the current lease may record the outcome
+        return Job.objects.filter(pk=self.pk, locked_by=self.locked_by, attempts=self.attempts)
+
+    def succeed(self, result):
+        """Record a successful run; returns False if the lease was lost."""
+        return bool(self._owned().update(
+            status=self.Status.SUCCEEDED,
+            result=result,
+            error='',
+            locked_until=None,
+            finished_at=timezone.now(),
+        ))
+
+    def fail(self, error, backoff=DEFAULT_BACKOFF):
+        """Record a failed run, queueing a retry while attempts remain."""
+        now = timezone.now()
+        if self.attempts < self.max_attempts:
+            fields = {'status': self.Status.QUEUED, 'run_after': now + backoff * 2 ** (self.attempts - 1)}
+        else:
+            fields = {'status': self.Status.FAILED, 'finished_at': now}
+        return bool(self._owned().update(error=error, locked_until=None, **fields))
@@ -0,0 +1,29 @@
+"""
+Registry of functions that can run as background jobs.
+
+Apps declare them in a ``tasks`` module, which ``JobsConfig.ready`` imports::
+
+    @task('newsletter.fan_out')
+    def fan_out(newsletter_id):
+        ...
+
+A job's JSON payload is passed as keyword arguments and the return value,
+which must be JSON serializable, is stored as the job's result.
+"""
+_tasks = {}
+
+
+def task(name):
+    def register(func):
+        if name in _tasks and _tasks[name] is not func:
+            raise ValueError(f'A task named {name!r} is already registered.')
+        _tasks[name] = func
+        return func
+    return register
+
+
+def get_task(name):
+    try:
+        return _tasks[name]
+    except KeyError:
+        raise LookupError(f'No task named {name!r} is registered.') from None
@@ -0,0 +1,93 @@
+from datetime import timedelta
+
+from django.test import TestCase
+from django.utils import timezone
+
+from .models import Job
+from .registry import task
+from .worker import Worker
+
+calls = []
+
+
+@task('jobs.tests.record')
+def record(value):
+    calls.append(value)
+    return {'value': value}
+
+
+@task('jobs.tests.explode')
+def explode():
+    raise RuntimeError('boom')
+
+
+class JobQueueTests(TestCase):
+    def setUp(self):
+        calls.clear()
+
+    def test_enqueue_rejects_unknown_tasks(self):
+        with self.assertRaises(LookupError):
+            Job.objects.enqueue('jobs.tests.missing')
+
+    def test_worker_runs_a_job_and_stores_its_result(self):
+        job = Job.objects.enqueue('jobs.tests.record', {'value': 7})
+
+        self.assertTrue(Worker('w1').run_once())
+        self.assertFalse(Worker('w1').run_once())
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.Status.SUCCEEDED)
+        self.assertEqual(job.result, {'value': 7})
+        self.assertEqual(job.attempts, 1)
+        self.assertEqual(calls, [7])
+
+    def test_a_job_is_claimed_once(self):
+        job = Job.objects.enqueue('jobs.tests.record', {'value': 1})
+
+        claimed = Job.objects.claim('w1')
+        self.assertEqual(claimed.pk, job.pk)
+        self.assertEqual(claimed.locked_by, 'w1')
+        self.assertIsNone(Job.objects.claim('w2'))
+
+    def test_a_stale_claim_cannot_record_an_outcome(self):
+        Job.objects.enqueue('jobs.tests.record', {'value': 1})
+        stale = Job.objects.claim('w1', lease=timedelta(seconds=-1))
+
+        # The lease has already expired, so another worker takes the job over
+        current = Job.objects.claim('w2')
+        self.assertEqual(current.pk, stale.pk)
+        self.assertEqual(current.attempts, 2)
+
+        self.assertFalse(stale.succeed({'value': 1}))
+        self.assertTrue(current.succeed({'value': 1}))
+
+    def test_failed_jobs_are_retried_with_backoff(self):
+        job = Job.objects.enqueue('jobs.tests.explode', max_attempts=2)
+        worker = Worker('w1', backoff=timedelta(seconds=10))
+
+        before = timezone.now()
+        self.assertTrue(worker.run_once())
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.Status.QUEUED)
+        self.assertIn('RuntimeError: boom', job.error)
+        self.assertGreaterEqual(job.run_after, before + timedelta(seconds=10))
+
+        # Not due yet
+        self.assertFalse(worker.run_once())
+
+        Job.objects.filter(pk=job.pk).update(run_after=timezone.now())
+        self.assertTrue(worker.run_once())
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.Status.FAILED)
+        self.assertEqual(job.attempts, 2)
+        self.assertIsNotNone(job.finished_at)
+
+    def test_an_expired_lease_on_the_last_attempt_fails_the_job(self):
+        job = Job.objects.enqueue('jobs.tests.record', {'value': 1}, max_attempts=1)
+        Job.objects.claim('w1', lease=timedelta(seconds=-1))
+
+        self.assertFalse(Worker('w2').run_once())
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.Status.FAILED)
+        self.assertEqual(job.error, 'Lease expired.')
+        self.assertEqual(calls, [])
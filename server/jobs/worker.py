@@ -0,0 +1,61 @@
+"""
+Job worker loop used by ``manage.py run_worker``.
+"""
+import logging
+import os
+import socket
+import time
+import traceback
+
+from django.db import OperationalError, close_old_connections
+
+from .models import DEFAULT_BACKOFF, DEFAULT_LEASE, Job
+from .registry import get_task
+
+logger = logging.getLogger(__name__)
+
+
+class Worker:
+    def __init__(self, name=None, lease=DEFAULT_LEASE, backoff=DEFAULT_BACKOFF, poll_interval=1.0):
+        self.name = name or f'{socket.gethostname()}:{os.getpid()}'
+        self.lease = lease
+        self.backoff = backoff
+        self.poll_interval = poll_interval
+        self.stopping = False
+
+    def run_job(self, job):
+        try:
+            result = get_task(job.name)(**job.payload)
+        except Exception:
+            logger.exception('Job %s failed', job)
+            job.fail(traceback.format_exc(), self.backoff)
+            return False
+        if not job.succeed(result):
+            logger.warning('Job %s finished after its lease was taken over', job)
+        return True
+
+    def run_once(self):
+        """Claim and run one job; return False when none was due."""
+        Job.objects.fail_expired()
+        job = Job.objects.claim(self.name, self.lease)
+        if job is None:
+            return False
+        self.run_job(job)
+        return True
+
+    def run(self, burst=False):
+        """Process jobs until ``stopping`` is set, or the queue is empty in burst mode."""
+        logger.info('Worker %s started', self.name)
+        while not self.stopping:
+            close_old_connections()
+            try:
+                worked = self.run_once()
+            except OperationalError:
+                # SQLite reports "database is locked" when writers collide
+                logger.warning('Worker %s could not claim a job; retrying', self.name, exc_info=True)
+                worked = False
+            if not worked:
+                if burst:
+                    break
+                time.sleep(self.poll_interval)
+        logger.info('Worker %s stopped', self.name)
@@ -1,12 +1,96 @@
 from django.contrib import admin
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Count
+from django.utils.functional import cached_property
 from django.utils.translation import gettext_lazy as _
 
+from daycare_project.caching import bump_version
+from jobs.models import Job
+
+from . import fulltext
 from .models import (
     Category, Newsletter, Announcement, Event,
-    SubscriptionGroup, Subscription, NewsletterRecipient
+    SubscriptionGroup, Subscription, NewsletterRecipient, NewsletterStats
 )
 
 
+class EstimatedCountPaginator(Paginator):
+    """Paginator for huge tables that never counts more than ``max_count`` rows.
+
+    An unfiltered changelist uses the planner's row estimate for the table
+    (``sqlite_stat1`` after ``ANALYZE``, ``pg_class.reltuples`` on
+    PostgreSQL). Filtered lists count at most ``max_count + 1`` rows, so
+    the last page number is only approximate beyond that.
+    """
+    max_count = 10000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        count = queryset.order_by()[:self.max_count + 1].count()
+        if count <= self.max_count:
+            return count
+        if not queryset.query.where:
+            estimate = self.estimate(queryset)
+            if estimate:
+                return max(estimate, count)
+        return count
+
+    @staticmethod
+    def estimate(queryset):
+        connection = connections[queryset.db]
+        table = queryset.model._meta.db_table
+        with connection.cursor() as cursor:
+            if connection.vendor == 'sqlite':
+                cursor.execute("SELECT name FROM sqlite_master WHERE name = 'sqlite_stat1'")
+                if not cursor.fetchone():
+                    return None
+                # The first number of an index's stat is the table's row count
+                cursor.execute('SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1', [table])
+                row = cursor.fetchone()
+                return int(row[0].split()[0]) if row else None
+            if connection.vendor == 'postgresql':
+                cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass', [table])
+                row = cursor.fetchone()
+                return row[0] if row and row[0] > 0 else None
+        return None
+
+
+class InputFilter(admin.SimpleListFilter):
+    """List filter typed into a text box instead of picked from every possible value."""
+    template = 'admin/input_filter.html'
+
+    def lookups(self, request, model_admin):
+        # A single dummy choice; the template renders an input instead
+        return ((None, None),)
+
+    def has_output(self):
+        return True
+
+    def choices(self, changelist):
+        query_params = changelist.get_filters_params()
+        query_params.pop(self.parameter_name, None)
+        yield {
+            'value': self.value() or '',
+            'hidden_params': sorted(query_params.items()),
+        }
+
+
+class NewsletterInputFilter(InputFilter):
+    """Filter by newsletter id, or by words in the newsletter title."""
+    title = _('newsletter')
+    parameter_name = 'newsletter'
+
+    def queryset(self, request, queryset):
+        value = (self.value() or '').strip()
+        if not value:
+            return queryset
+        if value.isdigit():
+            return queryset.filter(newsletter_id=value)
+        return queryset.filter(newsletter__in=Newsletter.objects.filter(title__icontains=value).values('pk'))
+
+
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
     list_display = ('name', 'description')
@@ -20,10 +104,27 @@ class EventInline(admin.TabularInline):
     verbose_name_plural = _('Events')
 
 
+class FullTextSearchMixin:
+    """Answer changelist searches from the FTS5 index (see ``newsletter.fulltext``).
+
+    ``search_fields`` still enables the search box and is the fallback on
+    databases without FTS5.
+    """
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term or not fulltext.is_available(queryset.db):
+            return super().get_search_results(request, queryset, search_term)
+        return fulltext.matching(queryset, search_term), False
+
+
 @admin.register(Newsletter)
-class NewsletterAdmin(admin.ModelAdmin):
-    list_display = ('title', 'status', 'created_by', 'created_at', 'published_at', 'featured', 'sent_to_all')
+class NewsletterAdmin(FullTextSearchMixin, admin.ModelAdmin):
+    list_display = (
+        'title', 'status', 'created_by', 'created_at', 'published_at', 'featured', 'sent_to_all',
+        'sent_count', 'open_rate', 'click_rate',
+    )
     list_filter = ('status', 'featured', 'sent_to_all', 'categories')
+    list_select_related = ('created_by', 'stats')
     search_fields = ('title', 'subtitle', 'content')
     date_hierarchy = 'created_at'
     filter_horizontal = ('categories',)
@@ -37,24 +138,52 @@ class NewsletterAdmin(admin.ModelAdmin):
     )
     inlines = [EventInline]
     
+    def _stats(self, obj):
+        try:
+            return obj.stats
+        except NewsletterStats.DoesNotExist:
+            return None
+    
+    def sent_count(self, obj):
+        stats = self._stats(obj)
+        return stats.sent if stats else 0
+    sent_count.short_description = _('Sent')
+    sent_count.admin_order_field = 'stats__sent'
+    
+    def open_rate(self, obj):
+        stats = self._stats(obj)
+        return f'{stats.open_rate:.0%}' if stats and stats.sent else '-'
+    open_rate.short_description = _('Opened')
+    
+    def click_rate(self, obj):
+        stats = self._stats(obj)
+        return f'{stats.click_rate:.0%}' if stats and stats.sent else '-'
+    click_rate.short_description = _('Clicked')
+    
     def publish_newsletters(self, request, queryset):
-        count = 0
-        for newsletter in queryset.filter(status=Newsletter.Status.DRAFT):
-            newsletter.publish()
-            count += 1
-        self.message_user(request, _(f'{count} newsletters were published successfully.'))
+        published = queryset.publish()
+        # update() bypasses post_save, so drop cached GraphQL results here
+        bump_version()
+        self.message_user(request, _(f'{len(published)} newsletters were published successfully.'))
+        # Recipients go through the usual chunked fan-out, one job per newsletter
+        fan_out = Newsletter.objects.filter(pk__in=published, sent_to_all=True).values_list('pk', flat=True)
+        jobs = Job.objects.enqueue_many('newsletter.fan_out', [{'newsletter_id': pk} for pk in fan_out])
+        if jobs:
+            self.message_user(request, _(f'Recipients are being added in the background ({len(jobs)} jobs).'))
     publish_newsletters.short_description = _('Publish selected newsletters')
     
     def archive_newsletters(self, request, queryset):
-        count = queryset.filter(status=Newsletter.Status.PUBLISHED).update(status=Newsletter.Status.ARCHIVED)
+        count = queryset.archive()
+        bump_version()
         self.message_user(request, _(f'{count} newsletters were archived successfully.'))
     archive_newsletters.short_description = _('Archive selected newsletters')
 
 
 @admin.register(Announcement)
-class AnnouncementAdmin(admin.ModelAdmin):
+class AnnouncementAdmin(FullTextSearchMixin, admin.ModelAdmin):
     list_display = ('title', 'priority', 'created_by', 'created_at', 'expiry_date', 'is_active', 'is_expired')
     list_filter = ('priority', 'is_active', 'categories')
+    list_select_related = ('created_by',)
     search_fields = ('title', 'content')
     date_hierarchy = 'created_at'
     filter_horizontal = ('categories',)
@@ -73,9 +202,10 @@ class AnnouncementAdmin(admin.ModelAdmin):
 
 
 @admin.register(Event)
-class EventAdmin(admin.ModelAdmin):
+class EventAdmin(FullTextSearchMixin, admin.ModelAdmin):
     list_display = ('title', 'start_date', 'end_date', 'location', 'created_by', 'is_active', 'is_past')
     list_filter = ('is_active', 'categories')
+    list_select_related = ('created_by',)
     search_fields = ('title', 'description', 'location')
     date_hierarchy = 'start_date'
     filter_horizontal = ('categories', 'newsletters')
@@ -98,44 +228,52 @@ class SubscriptionGroupAdmin(admin.ModelAdmin):
     list_display = ('name', 'description', 'subscriber_count')
     search_fields = ('name', 'description')
     
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(subscriber_count=Count('subscribers'))
+    
     def subscriber_count(self, obj):
-        return obj.subscribers.count()
+        return obj.subscriber_count
     subscriber_count.short_description = _('Subscribers')
+    subscriber_count.admin_order_field = 'subscriber_count'
 
 
 @admin.register(Subscription)
 class SubscriptionAdmin(admin.ModelAdmin):
     list_display = ('user', 'is_subscribed', 'subscribed_at', 'unsubscribed_at')
     list_filter = ('is_subscribed', 'groups')
+    list_select_related = ('user',)
     search_fields = ('user__email', 'user__first_name', 'user__last_name')
     filter_horizontal = ('groups',)
     readonly_fields = ('subscribed_at', 'unsubscribed_at')
     actions = ['resubscribe_users', 'unsubscribe_users']
     
     def resubscribe_users(self, request, queryset):
-        count = 0
-        for subscription in queryset.filter(is_subscribed=False):
-            subscription.resubscribe()
-            count += 1
+        count = queryset.resubscribe()
         self.message_user(request, _(f'{count} users were resubscribed successfully.'))
     resubscribe_users.short_description = _('Resubscribe selected users')
     
     def unsubscribe_users(self, request, queryset):
-        count = 0
-        for subscription in queryset.filter(is_subscribed=True):
-            subscription.unsubscribe()
-            count += 1
+        count = queryset.unsubscribe()
         self.message_user(request, _(f'{count} users were unsubscribed successfully.'))
     unsubscribe_users.short_description = _('Unsubscribe selected users')
 
 
 @admin.register(NewsletterRecipient)
 class NewsletterRecipientAdmin(admin.ModelAdmin):
-    list_display = ('newsletter', 'user', 'sent_at', 'opened_at', 'clicked')
-    list_filter = ('clicked', 'newsletter')
+    list_display = ('newsletter', 'user', 'sent_at', 'delivered_at', 'opened_at', 'clicked')
+    list_filter = (
+        NewsletterInputFilter,
+        'clicked',
+        ('delivered_at', admin.EmptyFieldListFilter),
+        ('sent_at', admin.DateFieldListFilter),
+    )
+    list_select_related = ('newsletter', 'user')
     search_fields = ('newsletter__title', 'user__email')
-    date_hierarchy = 'sent_at'
-    readonly_fields = ('sent_at', 'opened_at', 'clicked')
+    autocomplete_fields = ('newsletter', 'user')
+    readonly_fields = ('sent_at', 'delivering_at', 'delivered_at', 'opened_at', 'clicked')
+    # The table grows with every send: no full COUNT(*) and no per-date scan
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     
     def has_add_permission(self, request):
         return False
@@ -0,0 +1,133 @@
+"""
+Email delivery of published newsletters.
+
+After the fan-out has created the recipient rows, ``enqueue_delivery`` splits
+the undelivered recipients into jobs of ``NEWSLETTER_DELIVERY['BATCH_SIZE']``
+consecutive rows, so several worker processes can send the same newsletter at
+once. Each job opens one backend connection and sends through it with
+``send_messages``. ``RATE_LIMIT`` caps the messages per second of all
+workers together: before each send a job reserves its share of time in the
+``DeliveryThrottle`` row, so adding workers adds concurrency, not rate.
+
+A job claims each slice of recipients before sending it (``delivering_at``),
+so a job that was queued twice, or jobs with overlapping ranges, never email
+anyone twice. A recipient is marked delivered once its message was handed to
+the backend. When the backend fails the job releases its claim and is retried
+with the job queue's backoff, picking up only the recipients that are still
+undelivered; the claims of a worker that died mid-send expire after
+``CLAIM_TIMEOUT`` seconds.
+"""
+import time
+from datetime import timedelta
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from jobs.models import Job
+
+from . import tracking
+from .models import DeliveryThrottle, Newsletter, NewsletterRecipient
+
+DEFAULTS = {
+    'BATCH_SIZE': 200,
+    'RATE_LIMIT': None,
+    'CLAIM_TIMEOUT': 600,
+}
+
+
+def get_option(name):
+    return getattr(settings, 'NEWSLETTER_DELIVERY', {}).get(name, DEFAULTS[name])
+
+
+class RateLimiter:
+    """Spaces out calls to at most ``rate`` units per second across all processes (None = no limit)."""
+
+    def __init__(self, rate, clock=None, sleep=None):
+        self.interval = 1 / rate if rate else 0
+        # Wall-clock time, which all worker processes share
+        self.clock = clock or time.time
+        self.sleep = sleep or time.sleep
+
+    def wait(self, units=1):
+        if not self.interval:
+            return
+        now = self.clock()
+        start = DeliveryThrottle.objects.reserve(now, units * self.interval)
+        if start > now:
+            self.sleep(start - now)
+
+
+@lru_cache(maxsize=32)
+def _render(newsletter_id, updated_at):
+    newsletter = Newsletter.objects.get(pk=newsletter_id)
+    context = {'newsletter': newsletter}
+    return (
+        newsletter.title,
+        render_to_string('newsletter/email/newsletter.txt', context),
+        render_to_string('newsletter/email/newsletter.html', context),
+    )
+
+
+def render_newsletter(newsletter):
+    """Return the subject, text and HTML body, rendered once per newsletter version."""
+    return _render(newsletter.pk, newsletter.updated_at)
+
+
+def enqueue_delivery(newsletter, batch_size=None):
+    """Queue delivery jobs covering the newsletter's undelivered recipients.
+
+    The pk ranges are all read first, one short query per batch, and the jobs
+    are written in one insert afterwards: on SQLite, writing while a read
+    cursor is open fails at once when another connection committed meanwhile.
+    """
+    batch_size = batch_size or get_option('BATCH_SIZE')
+    undelivered = newsletter.recipients.filter(delivered_at__isnull=True).order_by('pk')
+    payloads = []
+    last_pk = None
+    while True:
+        remaining = undelivered if last_pk is None else undelivered.filter(pk__gt=last_pk)
+        pks = list(remaining.values_list('pk', flat=True)[:batch_size])
+        if not pks:
+            break
+        payloads.append({'newsletter_id': newsletter.pk, 'first_id': pks[0], 'last_id': pks[-1]})
+        last_pk = pks[-1]
+    return Job.objects.enqueue_many('newsletter.deliver', payloads)
+
+
+def deliver(newsletter, first_id, last_id, rate=None):
+    """Send the newsletter to its undelivered recipients in the pk range; return the count sent."""
+    subject, text, html = render_newsletter(newsletter)
+    limiter = RateLimiter(rate if rate is not None else get_option('RATE_LIMIT'))
+    # Send in one-second slices so a failure loses at most a slice's bookkeeping
+    step = max(1, int(1 / limiter.interval)) if limiter.interval else None
+    stale_after = timedelta(seconds=get_option('CLAIM_TIMEOUT'))
+
+    def claim():
+        return NewsletterRecipient.objects.claim_for_delivery(newsletter, first_id, last_id, stale_after, step)
+
+    pks = claim()
+    if not pks:
+        return 0
+
+    connection = get_connection()
+    sent = 0
+    with connection:
+        while pks:
+            messages = []
+            for recipient in newsletter.recipients.filter(pk__in=pks).select_related('user').order_by('pk'):
+                message = EmailMultiAlternatives(subject, text, to=[recipient.user.email], connection=connection)
+                message.attach_alternative(tracking.personalize(html, recipient.pk), 'text/html')
+                messages.append(message)
+            limiter.wait(len(messages))
+            try:
+                connection.send_messages(messages)
+            except Exception:
+                NewsletterRecipient.objects.release(pks)
+                raise
+            NewsletterRecipient.objects.filter(pk__in=pks).update(delivered_at=timezone.now())
+            sent += len(messages)
+            pks = claim()
+    return sent
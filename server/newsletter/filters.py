@@ -0,0 +1,112 @@
+"""
+django-filter FilterSets behind the arguments of the list queries.
+
+GraphQL arguments arrive as Python values; ``filter_queryset`` turns them
+into form data (lists become comma-separated values, range inputs become
+``<name>_after``/``<name>_before``) so the usual form validation applies.
+"""
+import django_filters
+from django.db.models import Exists, OuterRef, Q
+from graphql import GraphQLError
+
+from . import fulltext
+from .models import Newsletter, Announcement, Event
+
+
+class NumberInFilter(django_filters.BaseInFilter, django_filters.NumberFilter):
+    pass
+
+
+class CharInFilter(django_filters.BaseInFilter, django_filters.CharFilter):
+    pass
+
+
+class ContentFilterSet(django_filters.FilterSet):
+    """Filters shared by newsletters, announcements and events."""
+
+    category_ids = NumberInFilter(method='filter_category_ids')
+    search = django_filters.CharFilter(method='filter_search')
+
+    search_fields = ()
+
+    def filter_category_ids(self, queryset, name, value):
+        # EXISTS keeps one row per item however many categories match
+        model = queryset.model
+        through = model.categories.through
+        return queryset.filter(Exists(through.objects.filter(
+            **{f'{model._meta.model_name}_id': OuterRef('pk'), 'category_id__in': value}
+        )))
+
+    def filter_search(self, queryset, name, value):
+        if fulltext.is_available(queryset.db):
+            return fulltext.matching(queryset, value)
+        condition = Q()
+        for term in value.split():
+            term_condition = Q()
+            for field in self.search_fields:
+                term_condition |= Q(**{f'{field}__icontains': term})
+            condition &= term_condition
+        return queryset.filter(condition)
+
+
+class NewsletterFilter(ContentFilterSet):
+    featured = django_filters.BooleanFilter()
+    published_after = django_filters.IsoDateTimeFilter(field_name='published_at', lookup_expr='gte')
+    published_before = django_filters.IsoDateTimeFilter(field_name='published_at', lookup_expr='lt')
+    order_by = django_filters.OrderingFilter(fields=(('created_at', 'createdAt'), ('title', 'title')))
+
+    search_fields = ('title', 'subtitle', 'content')
+
+    class Meta:
+        model = Newsletter
+        fields = []
+
+
+class AnnouncementFilter(ContentFilterSet):
+    priority = CharInFilter(field_name='priority', lookup_expr='in')
+    published_after = django_filters.IsoDateTimeFilter(field_name='created_at', lookup_expr='gte')
+    published_before = django_filters.IsoDateTimeFilter(field_name='created_at', lookup_expr='lt')
+    order_by = django_filters.OrderingFilter(fields=(('created_at', 'createdAt'), ('title', 'title')))
+
+    search_fields = ('title', 'content')
+
+    class Meta:
+        model = Announcement
+        fields = []
+
+
+class EventFilter(ContentFilterSet):
+    starts_between = django_filters.IsoDateTimeFromToRangeFilter(field_name='start_date')
+    order_by = django_filters.OrderingFilter(fields=(('start_date', 'startDate'), ('title', 'title')))
+
+    search_fields = ('title', 'description', 'location')
+
+    class Meta:
+        model = Event
+        fields = []
+
+
+def filter_queryset(filterset_class, queryset, arguments):
+    """Apply ``filterset_class`` to ``queryset`` using resolver keyword arguments."""
+    data = {}
+    for name, value in arguments.items():
+        if value is None:
+            continue
+        if isinstance(value, (list, tuple)):
+            data[name] = ','.join(str(getattr(item, 'value', item)) for item in value)
+        elif isinstance(value, dict):
+            for key, bound in value.items():
+                if bound is not None:
+                    data[f'{name}_{key}'] = bound
+        else:
+            data[name] = value
+
+    filterset = filterset_class(data, queryset=queryset)
+    if not filterset.is_valid():
+        messages = [
+            f'{field}: {error}'
+            for field, errors in filterset.errors.items()
+            for error in errors
+        ]
+        raise GraphQLError('Invalid filter arguments. ' + ' '.join(messages))
+    return filterset.qs
@@ -0,0 +1,121 @@
+"""
+SQLite FTS5 full-text search over newsletters, announcements and events.
+
+Each model in ``COLUMNS`` has an external-content FTS5 table named
+``<db_table>_fts`` (see migration 0005). It stores only the index and reads
+the text back from the model's table for ``snippet()``; triggers keep it
+current on every insert, update and delete, whether it comes from the ORM,
+``bulk_create`` or raw SQL.
+
+User input never reaches the FTS5 query syntax: ``match_expression`` keeps
+only the words and matches each one as a quoted prefix, so "gard DAY" finds
+"Garden day". Matches are ranked with ``bm25``, weighting the title above the
+other columns.
+"""
+import re
+from html import escape
+
+from django.db import connections
+from django.db.models.expressions import RawSQL
+
+from .models import Announcement, Event, Newsletter
+
+COLUMNS = {
+    Newsletter: ('title', 'subtitle', 'content'),
+    Announcement: ('title', 'content'),
+    Event: ('title', 'description', 'location'),
+}
+
+TITLE_WEIGHT = 10.0
+
+# Control characters that prose does not contain, so the snippet can be
+# HTML-escaped before the markers become tags
+HIGHLIGHT_START = '\x02'
+HIGHLIGHT_END = '\x03'
+SNIPPET_TOKENS = 16
+
+WORD_RE = re.compile(r'\w+')
+
+
+def is_available(using):
+    return connections[using].vendor == 'sqlite'
+
+
+def fts_table(model):
+    return f'{model._meta.db_table}_fts'
+
+
+def match_expression(query):
+    """Return an FTS5 query matching every word of ``query`` as a prefix ('' if it has none)."""
+    return ' '.join(f'"{word}"*' for word in WORD_RE.findall(query))
+
+
+def rank_sql(model):
+    weights = [TITLE_WEIGHT] + [1.0] * (len(COLUMNS[model]) - 1)
+    return f"bm25({fts_table(model)}, {', '.join(map(str, weights))})"
+
+
+def matching(queryset, query):
+    """Restrict ``queryset`` to the rows matching ``query``."""
+    expression = match_expression(query)
+    if not expression:
+        return queryset.none()
+    table = fts_table(queryset.model)
+    return queryset.filter(pk__in=RawSQL(f'SELECT rowid FROM {table} WHERE {table} MATCH %s', [expression]))
+
+
+def rank(querysets, query, limit, after=None):
+    """Return up to ``limit`` ``(score, kind, pk)`` matches, best first.
+
+    ``querysets`` maps a kind to the searchable rows of its model; ``after`` is
+    the last key of the previous page. Lower scores rank higher.
+    """
+    expression = match_expression(query)
+    if not expression or not querysets:
+        return []
+
+    using = next(iter(querysets.values())).db
+    branches = []
+    params = []
+    for kind, queryset in sorted(querysets.items()):
+        table = fts_table(queryset.model)
+        visible, visible_params = queryset.order_by().values('pk').query.sql_with_params()
+        # The unary plus keeps SQLite from looping over the visible rows and
+        # running the MATCH once per rowid
+        branches.append(
+            f'SELECT {rank_sql(queryset.model)} AS score, %s AS kind, rowid AS id FROM {table} '
+            f'WHERE {table} MATCH %s AND +rowid IN ({visible})'
+        )
+        params += [kind, expression, *visible_params]
+
+    sql = f"SELECT score, kind, id FROM ({' UNION ALL '.join(branches)})"
+    if after:
+        sql += ' WHERE (score, kind, id) > (%s, %s, %s)'
+        params += list(after)
+    sql += ' ORDER BY score, kind, id LIMIT %s'
+    params.append(limit)
+
+    with connections[using].cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.fetchall()
+
+
+def snippets(model, query, pks, using):
+    """Return ``{pk: snippet}``, the best matching fragment of each row as HTML."""
+    expression = match_expression(query)
+    if not expression or not pks:
+        return {}
+    table = fts_table(model)
+    placeholders = ', '.join(['%s'] * len(pks))
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            f'SELECT rowid, snippet({table}, -1, %s, %s, %s, %s) FROM {table} '
+            f'WHERE {table} MATCH %s AND rowid IN ({placeholders})',
+            [HIGHLIGHT_START, HIGHLIGHT_END, '…', SNIPPET_TOKENS, expression, *pks],
+        )
+        return {pk: highlight(text) for pk, text in cursor.fetchall()}
+
+
+def highlight(snippet):
+    """Escape a raw snippet and wrap the matched words in ``<mark>``."""
+    return escape(snippet).replace(HIGHLIGHT_START, '<mark>').replace(HIGHLIGHT_END, '</mark>')
@@ -0,0 +1,33 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from newsletter.retention import archive
+
+
+class Command(BaseCommand):
+    help = (
+        'Move newsletter recipients sent more than --older-than days ago to the '
+        'archive table or to gzipped JSONL files, one short transaction per chunk.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than', type=int, required=True, help='Age in days of the rows to archive.')
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Rows moved per transaction.')
+        parser.add_argument('--output-dir', help='Write newsletter-<id>.jsonl.gz files here instead of the archive table.')
+        parser.add_argument('--pause', type=float, default=0.0, help='Seconds to wait between chunks.')
+
+    def handle(self, *args, **options):
+        if options['older_than'] < 0 or options['chunk_size'] < 1:
+            raise CommandError('--older-than must not be negative and --chunk-size must be positive.')
+        cutoff = timezone.now() - timedelta(days=options['older_than'])
+        moved = 0
+        chunks = 0
+        for count in archive(cutoff, options['chunk_size'], options['output_dir'], options['pause']):
+            moved += count
+            chunks += 1
+            if options['verbosity'] > 1:
+                self.stdout.write(f'Archived {moved} recipients so far.')
+        destination = options['output_dir'] or 'the archive table'
+        self.stdout.write(f'Archived {moved} recipients sent before {cutoff:%Y-%m-%d} in {chunks} chunks to {destination}.')
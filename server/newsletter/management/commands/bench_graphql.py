@@ -0,0 +1,108 @@
+import asyncio
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import AsyncClient, Client
+from django.test.utils import override_settings
+
+from accounts.models import User
+from newsletter.models import Category, Newsletter
+
+QUERY = """
+query ($first: Int) {
+    newsletters(first: $first) {
+        edges { node { title createdBy { email } categories { name } } }
+    }
+}
+"""
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare GraphQL throughput of the WSGI endpoint (a thread per request) '
+        'with the async endpoint under ASGI, on a throwaway test database.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500, help='Requests per endpoint.')
+        parser.add_argument('--concurrency', type=int, default=20, help='Requests in flight at once.')
+        parser.add_argument('--newsletters', type=int, default=100, help='Newsletters to seed.')
+        parser.add_argument('--first', type=int, default=20, help='Page size requested.')
+        parser.add_argument(
+            '--cached', action='store_true',
+            help='Keep the result cache enabled (by default every request executes).',
+        )
+
+    def handle(self, *args, **options):
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            self.seed(options['newsletters'])
+            payload = json.dumps({'query': QUERY, 'variables': {'first': options['first']}})
+            overrides = {'ALLOWED_HOSTS': ['testserver']}
+            if not options['cached']:
+                overrides.update({
+                    'CACHES': {
+                        'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+                        'results': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'},
+                    },
+                    'GRAPHQL_RESULT_CACHE': 'results',
+                })
+            with override_settings(**overrides):
+                for name, run in (('wsgi', self.run_wsgi), ('asgi', self.run_asgi)):
+                    started = time.perf_counter()
+                    failures = run(payload, options['requests'], options['concurrency'])
+                    elapsed = time.perf_counter() - started
+                    self.stdout.write(
+                        f"{name}: {options['requests']} requests in {elapsed:.2f}s "
+                        f"({options['requests'] / elapsed:.1f} req/s, {failures} failed)"
+                    )
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    def seed(self, count):
+        author = User.objects.create_user(email='bench@example.com', role=User.Role.STAFF)
+        categories = [Category.objects.create(name=f'Category {i}') for i in range(3)]
+        newsletters = Newsletter.objects.bulk_create(
+            Newsletter(
+                title=f'Newsletter {i}', content='Body', created_by=author,
+                status=Newsletter.Status.PUBLISHED,
+            )
+            for i in range(count)
+        )
+        Through = Newsletter.categories.through
+        Through.objects.bulk_create(
+            Through(newsletter_id=newsletter.pk, category_id=category.pk)
+            for newsletter in newsletters
+            for category in categories
+        )
+
+    @staticmethod
+    def is_success(response):
+        return response.status_code == 200 and 'errors' not in response.json()
+
+    def run_wsgi(self, payload, requests, concurrency):
+        def post(_):
+            response = Client().post('/graphql/', payload, content_type='application/json')
+            return self.is_success(response)
+
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            return sum(1 for ok in executor.map(post, range(requests)) if not ok)
+
+    def run_asgi(self, payload, requests, concurrency):
+        async def run():
+            client = AsyncClient()
+            semaphore = asyncio.Semaphore(concurrency)
+
+            async def post():
+                async with semaphore:
+                    response = await client.post('/graphql/async/', payload, content_type='application/json')
+                    return self.is_success(response)
+
+            results = await asyncio.gather(*(post() for _ in range(requests)))
+            return sum(1 for ok in results if not ok)
+
+        return asyncio.run(run())
@@ -0,0 +1,126 @@
+import multiprocessing
+import os
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connection, connections
+
+from accounts.models import User
+from newsletter.models import Announcement, Newsletter, NewsletterRecipient, Subscription
+
+MODES = {
+    # Django's stock behaviour: rollback journal, deferred transactions
+    'default': {'PRAGMAS': {}, 'TRANSACTION_MODE': 'DEFERRED'},
+    # Write paths begin IMMEDIATE through write_atomic()
+    'tuned': {'PRAGMAS': None, 'TRANSACTION_MODE': None},
+}
+
+
+def _read(author_id):
+    list(Newsletter.objects.filter(status=Newsletter.Status.PUBLISHED)[:20])
+    list(Announcement.objects.filter(is_active=True)[:20])
+
+
+def _write(author_id):
+    Announcement.objects.create(title='Bench', content='Body', created_by_id=author_id)
+    ids = NewsletterRecipient.objects.filter(opened_at__isnull=True).values_list('pk', flat=True)[:20]
+    NewsletterRecipient.objects.record_engagement(opened_ids=list(ids))
+
+
+def _fan_out(author_id):
+    newsletter = Newsletter.objects.create(
+        title='Fan-out', content='Body', created_by_id=author_id, status=Newsletter.Status.PUBLISHED,
+    )
+    newsletter.send_to_subscribers()
+
+
+OPERATIONS = {'reads': _read, 'writes': _write, 'fan_outs': _fan_out}
+
+
+def _loop(args):
+    """Run one role until the deadline; return ``(role, completed, locked errors)``."""
+    role, author_id, deadline = args
+    done = locked = 0
+    try:
+        while time.time() < deadline:
+            try:
+                OPERATIONS[role](author_id)
+            except OperationalError:
+                locked += 1
+            else:
+                done += 1
+    finally:
+        connections.close_all()
+    return role, done, locked
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure mixed read/write throughput on a throwaway SQLite file while '
+        'newsletters fan out, with default settings and with the tuned pragmas.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seconds', type=float, default=5.0, help='Duration of each run.')
+        parser.add_argument('--readers', type=int, default=4, help='Processes listing newsletters.')
+        parser.add_argument('--writers', type=int, default=2, help='Processes recording opens and announcements.')
+        parser.add_argument('--subscribers', type=int, default=5000, help='Subscribers to fan out to.')
+        parser.add_argument('--mode', choices=sorted(MODES), action='append', help='Run only these modes.')
+
+    def handle(self, *args, **options):
+        settings_dict = connection.settings_dict
+        saved = {key: settings_dict.get(key) for key in ('NAME', 'TEST', 'PRAGMAS', 'TRANSACTION_MODE')}
+        with tempfile.TemporaryDirectory() as directory:
+            try:
+                for mode in options['mode'] or list(MODES):
+                    connections.close_all()
+                    settings_dict.update(MODES[mode])
+                    settings_dict['TEST'] = {**(saved['TEST'] or {}), 'NAME': os.path.join(directory, f'{mode}.sqlite3')}
+                    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+                    try:
+                        self.seed(options['subscribers'])
+                        self.report(mode, self.run(options))
+                    finally:
+                        connection.creation.destroy_test_db(old_name, verbosity=0)
+            finally:
+                for key, value in saved.items():
+                    if value is None:
+                        settings_dict.pop(key, None)
+                    else:
+                        settings_dict[key] = value
+
+    def seed(self, subscribers):
+        self.author = User.objects.create_user(email='bench@example.com', role=User.Role.STAFF)
+        users = User.objects.bulk_create(
+            User(email=f'parent{i}@example.com', password='!') for i in range(subscribers)
+        )
+        Subscription.objects.bulk_create(Subscription(user=user) for user in users)
+        Newsletter.objects.bulk_create(
+            Newsletter(title=f'Newsletter {i}', content='Body', created_by=self.author, status=Newsletter.Status.PUBLISHED)
+            for i in range(50)
+        )
+
+    def run(self, options):
+        roles = ['fan_outs'] + ['reads'] * options['readers'] + ['writes'] * options['writers']
+        deadline = time.time() + options['seconds']
+        counts = {'reads': 0, 'writes': 0, 'fan_outs': 0, 'locked': 0}
+        # One process per role, like web and worker processes sharing the file;
+        # threads would also queue for the GIL while holding the write lock
+        connections.close_all()
+        started = time.monotonic()
+        with multiprocessing.get_context('fork').Pool(len(roles)) as pool:
+            for key, done, locked in pool.imap_unordered(_loop, [(role, self.author.pk, deadline) for role in roles]):
+                counts[key] += done
+                counts['locked'] += locked
+        counts['elapsed'] = time.monotonic() - started
+        counts['recipients'] = NewsletterRecipient.objects.count()
+        return counts
+
+    def report(self, mode, counts):
+        elapsed = counts['elapsed']
+        self.stdout.write(
+            f"{mode}: {counts['reads'] / elapsed:.0f} reads/s, {counts['writes'] / elapsed:.1f} writes/s, "
+            f"{counts['recipients'] / elapsed:.0f} recipients fanned out/s ({counts['fan_outs']} fan-outs), "
+            f"{counts['locked']} 'database is locked' errors"
+        )
@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from daycare_project.caching import bump_version
+from newsletter.models import Announcement
+
+
+class Command(BaseCommand):
+    help = 'Deactivate announcements past their expiry date, once or every --interval seconds.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, help='Keep running, sweeping every this many seconds.')
+
+    def handle(self, *args, **options):
+        while True:
+            expired = Announcement.objects.expire()
+            if expired:
+                # update() sends no post_save, so cached results are dropped here
+                bump_version()
+            self.stdout.write(f'Deactivated {expired} expired announcements.')
+            if not options['interval']:
+                return
+            time.sleep(options['interval'])
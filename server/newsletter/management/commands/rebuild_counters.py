@@ -0,0 +1,46 @@
+import multiprocessing
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.models import Max, Min
+
+from accounts.models import User
+from newsletter.models import UserNewsletterCounter
+
+
+def _rebuild(bounds):
+    try:
+        return UserNewsletterCounter.objects.rebuild(*bounds)
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = 'Recount every user\'s received and unread newsletters, fixing counters that drifted.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=1, help='Processes recounting chunks in parallel.')
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Users per chunk (by primary key).')
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size must be positive.')
+        bounds = User.objects.aggregate(first=Min('pk'), last=Max('pk'))
+        if bounds['first'] is None:
+            self.stdout.write('No users to recount.')
+            return
+        size = options['chunk_size']
+        chunks = [
+            (start, min(start + size - 1, bounds['last']))
+            for start in range(bounds['first'], bounds['last'] + 1, size)
+        ]
+
+        processes = max(1, options['processes'])
+        if processes == 1:
+            fixed = sum(UserNewsletterCounter.objects.rebuild(*chunk) for chunk in chunks)
+        else:
+            # Children must open their own connections rather than share the parent's
+            connections.close_all()
+            with multiprocessing.get_context('fork').Pool(processes) as pool:
+                fixed = sum(pool.imap_unordered(_rebuild, chunks))
+        self.stdout.write(f'Recounted {len(chunks)} chunks; fixed {fixed} counters.')
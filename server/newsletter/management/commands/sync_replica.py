@@ -0,0 +1,50 @@
+import sqlite3
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from daycare_project.routers import bump_generation
+
+
+class Command(BaseCommand):
+    help = (
+        'Copy the primary SQLite database into the read replica with the online '
+        'backup API, once or every --interval seconds.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='replica', help='Alias of the replica to refresh.')
+        parser.add_argument('--interval', type=float, help='Keep running, syncing every this many seconds.')
+        parser.add_argument('--pages', type=int, default=1024, help='Pages copied per step; 0 copies all at once.')
+
+    def handle(self, *args, **options):
+        alias = options['database']
+        if alias == DEFAULT_DB_ALIAS or alias not in connections.settings:
+            raise CommandError(f'{alias!r} is not a replica database alias.')
+        replica = connections[alias]
+        if replica.vendor != 'sqlite':
+            raise CommandError('sync_replica only copies SQLite databases.')
+
+        while True:
+            started = time.monotonic()
+            pages = self.sync(replica, options['pages'])
+            # Results cached from the previous copy are no longer served
+            bump_generation(alias)
+            self.stdout.write(f'Copied {pages} pages to {replica.settings_dict["NAME"]} in {time.monotonic() - started:.2f}s.')
+            if not options['interval']:
+                return
+            time.sleep(options['interval'])
+
+    def sync(self, replica, pages):
+        primary = connections[DEFAULT_DB_ALIAS]
+        primary.ensure_connection()
+        # Open connections to the old copy would keep reading stale pages
+        replica.close()
+        target = sqlite3.connect(replica.settings_dict['NAME'])
+        try:
+            # Writers are only paused between steps, not for the whole copy
+            primary.connection.backup(target, pages=pages or -1)
+            return target.execute('PRAGMA page_count').fetchone()[0]
+        finally:
+            target.close()
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.10 on 2026-10-17 02:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('newsletter', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='newsletterrecipient',
+            name='delivered_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='delivered at'),
+        ),
+    ]
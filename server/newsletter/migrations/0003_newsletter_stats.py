@@ -0,0 +1,47 @@
+# Generated by Django 4.2.10 on 2026-10-17 02:52
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_stats(apps, schema_editor):
+    NewsletterRecipient = apps.get_model('newsletter', 'NewsletterRecipient')
+    NewsletterStats = apps.get_model('newsletter', 'NewsletterStats')
+    totals = (
+        NewsletterRecipient.objects.order_by()
+        .values('newsletter_id')
+        .annotate(
+            sent=models.Count('pk'),
+            opened=models.Count('opened_at'),
+            clicked=models.Count('pk', filter=models.Q(clicked=True)),
+            first_opened_at=models.Min('opened_at'),
+            last_opened_at=models.Max('opened_at'),
+        )
+    )
+    NewsletterStats.objects.bulk_create([NewsletterStats(**row) for row in totals.iterator()], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('newsletter', '0002_recipient_delivered_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NewsletterStats',
+            fields=[
+                ('newsletter', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='newsletter.newsletter')),
+                ('sent', models.PositiveIntegerField(default=0, verbose_name='sent')),
+                ('opened', models.PositiveIntegerField(default=0, verbose_name='opened')),
+                ('clicked', models.PositiveIntegerField(default=0, verbose_name='clicked')),
+                ('first_opened_at', models.DateTimeField(blank=True, null=True, verbose_name='first opened at')),
+                ('last_opened_at', models.DateTimeField(blank=True, null=True, verbose_name='last opened at')),
+            ],
+            options={
+                'verbose_name': 'newsletter stats',
+                'verbose_name_plural': 'newsletter stats',
+            },
+        ),
+        migrations.RunPython(backfill_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 4.2.10 on 2026-10-17 02:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('newsletter', '0003_newsletter_stats'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='announcement',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['created_at'], name='announcement_active_created'),
+        ),
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['start_date'], name='event_active_start'),
+        ),
+        migrations.AddIndex(
+            model_name='newsletter',
+            index=models.Index(fields=['status', 'created_at'], name='newsletter_status_created'),
+        ),
+        migrations.AddIndex(
+            model_name='newsletter',
+            index=models.Index(condition=models.Q(('featured', True)), fields=['status', 'created_at'], name='newsletter_featured_created'),
+        ),
+        migrations.AddIndex(
+            model_name='newsletter',
+            index=models.Index(fields=['status', 'published_at'], name='newsletter_status_published'),
+        ),
+        migrations.AddIndex(
+            model_name='newsletterrecipient',
+            index=models.Index(condition=models.Q(('delivered_at', None)), fields=['newsletter', 'id'], name='recipient_undelivered'),
+        ),
+    ]
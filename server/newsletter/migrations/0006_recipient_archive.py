@@ -0,0 +1,37 @@
+# Generated by Django 4.2.10 on 2026-10-17 03:17
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('newsletter', '0005_fulltext_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='newsletterstats',
+            name='archived',
+            field=models.PositiveIntegerField(default=0, verbose_name='archived'),
+        ),
+        migrations.CreateModel(
+            name='ArchivedRecipient',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sent_at', models.DateTimeField(verbose_name='sent at')),
+                ('delivered_at', models.DateTimeField(blank=True, null=True, verbose_name='delivered at')),
+                ('opened_at', models.DateTimeField(blank=True, null=True, verbose_name='opened at')),
+                ('clicked', models.BooleanField(default=False, verbose_name='clicked')),
+                ('newsletter', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_recipients', to='newsletter.newsletter')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'archived recipient',
+                'verbose_name_plural': 'archived recipients',
+            },
+        ),
+    ]
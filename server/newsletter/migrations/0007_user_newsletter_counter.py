@@ -0,0 +1,43 @@
+# Generated by Django 4.2.10 on 2026-10-17 03:19
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_counters(apps, schema_editor):
+    NewsletterRecipient = apps.get_model('newsletter', 'NewsletterRecipient')
+    UserNewsletterCounter = apps.get_model('newsletter', 'UserNewsletterCounter')
+    totals = (
+        NewsletterRecipient.objects.order_by()
+        .values('user_id')
+        .annotate(
+            received=models.Count('pk'),
+            unread=models.Count('pk', filter=models.Q(opened_at__isnull=True)),
+        )
+    )
+    UserNewsletterCounter.objects.bulk_create([UserNewsletterCounter(**row) for row in totals.iterator()], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0002_child_indexes'),
+        ('newsletter', '0006_recipient_archive'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserNewsletterCounter',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='newsletter_counter', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('received', models.PositiveIntegerField(default=0, verbose_name='received')),
+                ('unread', models.PositiveIntegerField(default=0, verbose_name='unread')),
+            ],
+            options={
+                'verbose_name': 'newsletter counter',
+                'verbose_name_plural': 'newsletter counters',
+            },
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.10 on 2026-10-17 03:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('newsletter', '0007_user_newsletter_counter'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='announcement',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['expiry_date'], name='announcement_active_expiry'),
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 4.2.10 on 2026-10-17 03:32
+
+from importlib import import_module
+
+from django.db import migrations, models
+import django.utils.timezone
+
+fulltext = import_module('newsletter.migrations.0005_fulltext_search')
+
+
+def backfill_published_at(apps, schema_editor):
+    Newsletter = apps.get_model('newsletter', 'Newsletter')
+    Newsletter.objects.filter(status='PUBLISHED', published_at=None).update(published_at=models.F('created_at'))
+
+
+def recreate_event_triggers(apps, schema_editor):
+    # Adding created_at rebuilt newsletter_event on SQLite, which dropped the
+    # full-text triggers along with the old table
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    table = 'newsletter_event'
+    for statement in fulltext.create_statements(table, fulltext.COLUMNS[table])[1:]:
+        schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('newsletter', '0008_announcement_expiry_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, default=django.utils.timezone.now, verbose_name='created at'),
+            preserve_default=False,
+        ),
+        migrations.RunPython(recreate_event_triggers, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['created_at'], name='event_active_created'),
+        ),
+        migrations.RunPython(backfill_published_at, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.10 on 2026-10-17 03:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('newsletter', '0009_feed_timestamps'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='newsletterrecipient',
+            name='delivering_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='delivering since'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 4.2.10 on 2026-10-17 03:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('newsletter', '0010_recipient_delivering_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeliveryThrottle',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('next_at', models.FloatField(verbose_name='next send at')),
+            ],
+            options={
+                'verbose_name': 'delivery throttle',
+                'verbose_name_plural': 'delivery throttles',
+            },
+        ),
+    ]
@@ -1,7 +1,15 @@
-from django.db import models
+from collections import Counter, defaultdict
+
+from django.db import connections, models
+from django.db.models import Count, Exists, F, Max, Min, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
 from django.utils.translation import gettext_lazy as _
 from django.utils import timezone
-from accounts.models import User
+from accounts.models import User, Child
+from daycare_project.sqlite3.base import write_atomic
+
+# Recipient rows inserted per statement when fanning a newsletter out
+FAN_OUT_BATCH_SIZE = 1000
 
 
 class Category(models.Model):
@@ -17,6 +25,25 @@ class Category(models.Model):
         return self.name
 
 
+class NewsletterQuerySet(models.QuerySet):
+    def publish(self):
+        """Publish the drafts among these newsletters with one UPDATE; return their pks."""
+        now = timezone.now()
+        with write_atomic(using=self.db):
+            pks = list(self.select_for_update().filter(status=Newsletter.Status.DRAFT).values_list('pk', flat=True))
+            # update() skips auto_now, so updated_at is set like save() would
+            self.model.objects.filter(pk__in=pks).update(
+                status=Newsletter.Status.PUBLISHED, published_at=now, updated_at=now,
+            )
+        return pks
+    
+    def archive(self):
+        """Archive the published newsletters among these with one UPDATE; return how many."""
+        return self.filter(status=Newsletter.Status.PUBLISHED).update(
+            status=Newsletter.Status.ARCHIVED, updated_at=timezone.now(),
+        )
+
+
 class Newsletter(models.Model):
     """Main newsletter model for daycare communications."""
     class Status(models.TextChoices):
@@ -37,14 +64,30 @@ class Newsletter(models.Model):
     featured = models.BooleanField(_('featured'), default=False)
     sent_to_all = models.BooleanField(_('sent to all'), default=False)
     
+    objects = NewsletterQuerySet.as_manager()
+    
     class Meta:
         ordering = ['-created_at']
+        # Ascending columns: SQLite walks them backwards for the `-created_at, -id`
+        # pages. Status is bound as a parameter, so it has to be a key column;
+        # featured=True compiles to a bare column test that a partial index matches.
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='newsletter_status_created'),
+            models.Index(fields=['status', 'created_at'], name='newsletter_featured_created', condition=Q(featured=True)),
+            models.Index(fields=['status', 'published_at'], name='newsletter_status_published'),
+        ]
         verbose_name = _('newsletter')
         verbose_name_plural = _('newsletters')
     
     def __str__(self):
         return self.title
     
+    def save(self, *args, **kwargs):
+        # The feed orders published newsletters by published_at alone
+        if self.status == self.Status.PUBLISHED and self.published_at is None:
+            self.published_at = timezone.now()
+        super().save(*args, **kwargs)
+    
     def publish(self):
         """Publish the newsletter and record the time."""
         self.status = self.Status.PUBLISHED
@@ -56,6 +99,37 @@ class Newsletter(models.Model):
         self.status = self.Status.ARCHIVED
         self.save()
 
+    def send_to_subscribers(self, batch_size=FAN_OUT_BATCH_SIZE):
+        """Add every subscribed user as a recipient; return how many were added."""
+        subscribers = User.objects.filter(subscriptions__is_subscribed=True)
+        return NewsletterRecipient.objects.fan_out(self, subscribers, batch_size)
+
+    def send_to_groups(self, group_ids=(), child_groups=()):
+        """Add the audience of the given groups as recipients; return how many were added."""
+        return NewsletterRecipient.objects.fan_out(self, audience(group_ids, child_groups))
+
+
+class AnnouncementQuerySet(models.QuerySet):
+    def current(self, now=None):
+        """The active announcements that have not expired, filtered in SQL."""
+        now = now or timezone.now()
+        return self.filter(Q(expiry_date__isnull=True) | Q(expiry_date__gt=now), is_active=True)
+    
+    def inactive(self, now=None):
+        """The deactivated announcements, including expired ones the sweeper has not reached yet."""
+        now = now or timezone.now()
+        return self.filter(Q(is_active=False) | Q(expiry_date__lte=now))
+    
+    def expire(self, now=None):
+        """Deactivate the active announcements past their expiry date with one UPDATE; return how many."""
+        now = now or timezone.now()
+        return self.filter(is_active=True, expiry_date__lte=now).update(is_active=False)
+    
+    def next_expiry(self, now=None):
+        """When the next active announcement expires, or None."""
+        now = now or timezone.now()
+        return self.filter(is_active=True, expiry_date__gt=now).aggregate(next_expiry=Min('expiry_date'))['next_expiry']
+
 
 class Announcement(models.Model):
     """Quick announcements and updates for the daycare."""
@@ -75,8 +149,16 @@ class Announcement(models.Model):
     image = models.ImageField(upload_to='announcement_images/', blank=True, null=True)
     is_active = models.BooleanField(_('is active'), default=True)
     
+    objects = AnnouncementQuerySet.as_manager()
+    
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # is_active=True compiles to a bare column test, which a partial index matches
+            models.Index(fields=['created_at'], name='announcement_active_created', condition=Q(is_active=True)),
+            # The expiry sweep and the next expiry boundary
+            models.Index(fields=['expiry_date'], name='announcement_active_expiry', condition=Q(is_active=True)),
+        ]
         verbose_name = _('announcement')
         verbose_name_plural = _('announcements')
     
@@ -102,9 +184,15 @@ class Event(models.Model):
     categories = models.ManyToManyField(Category, blank=True, related_name='events')
     is_active = models.BooleanField(_('is active'), default=True)
     newsletters = models.ManyToManyField(Newsletter, blank=True, related_name='events')
+    created_at = models.DateTimeField(_('created at'), auto_now_add=True)
     
     class Meta:
         ordering = ['start_date']
+        indexes = [
+            models.Index(fields=['start_date'], name='event_active_start', condition=Q(is_active=True)),
+            # The dashboard feed, newest first
+            models.Index(fields=['created_at'], name='event_active_created', condition=Q(is_active=True)),
+        ]
         verbose_name = _('event')
         verbose_name_plural = _('events')
     
@@ -125,6 +213,16 @@ class SubscriptionGroup(models.Model):
         return self.name
 
 
+class SubscriptionQuerySet(models.QuerySet):
+    def unsubscribe(self):
+        """Unsubscribe these users with one UPDATE; return how many changed."""
+        return self.filter(is_subscribed=True).update(is_subscribed=False, unsubscribed_at=timezone.now())
+    
+    def resubscribe(self):
+        """Resubscribe these users with one UPDATE; return how many changed."""
+        return self.filter(is_subscribed=False).update(is_subscribed=True, unsubscribed_at=None)
+
+
 class Subscription(models.Model):
     """Newsletter subscriptions for users."""
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='subscriptions')
@@ -133,6 +231,8 @@ class Subscription(models.Model):
     subscribed_at = models.DateTimeField(_('subscribed at'), auto_now_add=True)
     unsubscribed_at = models.DateTimeField(_('unsubscribed at'), null=True, blank=True)
     
+    objects = SubscriptionQuerySet.as_manager()
+    
     class Meta:
         unique_together = ('user',)
         verbose_name = _('subscription')
@@ -154,16 +254,159 @@ class Subscription(models.Model):
         self.save()
 
 
+def audience(group_ids=(), child_groups=()):
+    """Users in any of the subscription groups or with a child in any of the child groups.
+
+    Both sides are EXISTS conditions on the user table, so a user matched
+    several times still appears once, and users who unsubscribed are left out.
+    """
+    targeted = Q()
+    if group_ids:
+        targeted |= Exists(Subscription.groups.through.objects.filter(
+            subscription__user=OuterRef('pk'), subscriptiongroup_id__in=group_ids,
+        ))
+    if child_groups:
+        targeted |= Exists(Child.objects.filter(parent=OuterRef('pk'), group__in=child_groups))
+    if not targeted:
+        return User.objects.none()
+    return User.objects.filter(targeted).exclude(
+        Exists(Subscription.objects.filter(user=OuterRef('pk'), is_subscribed=False))
+    )
+
+
+class NewsletterRecipientManager(models.Manager):
+    def fan_out(self, newsletter, users, batch_size=FAN_OUT_BATCH_SIZE):
+        """Add the ``users`` queryset as recipients and return how many were new.
+
+        Users are taken in primary-key order, ``batch_size`` at a time. Each
+        chunk is copied by ``insert_audience`` in its own short transaction
+        together with its stats and counters, so other writers get the write
+        lock between chunks. Only a chunk's ids are read up front and no
+        cursor stays open across the commits: on SQLite an open read would
+        pin a snapshot that the next chunk could not write from. Users who
+        already received the newsletter are skipped by the unique
+        constraint, so fanning out again, or finishing an interrupted
+        fan-out, is harmless.
+        """
+        users = users.order_by('pk')
+        created = 0
+        last_pk = None
+        while True:
+            remaining = users if last_pk is None else users.filter(pk__gt=last_pk)
+            pks = list(remaining.values_list('pk', flat=True)[:batch_size])
+            if not pks:
+                return created
+            created += self.insert_audience(newsletter, users.filter(pk__gte=pks[0], pk__lte=pks[-1]))
+            last_pk = pks[-1]
+
+    def last_id(self):
+        return self.aggregate(last_id=Max('pk'))['last_id'] or 0
+
+    def insert_audience(self, newsletter, users):
+        """Create recipient rows for the ``users`` queryset and return how many were new.
+
+        The users are never loaded: a single ``INSERT ... SELECT`` copies
+        their ids, and ``ON CONFLICT DO NOTHING`` skips existing recipients.
+        """
+        if users.query.is_empty():
+            return 0
+        connection = connections[self.db]
+        quote = connection.ops.quote_name
+        opts = self.model._meta
+        columns = ', '.join(quote(opts.get_field(name).column) for name in ('newsletter', 'user', 'sent_at', 'clicked'))
+        select, params = users.order_by().values('pk').query.sql_with_params()
+        sent_at = opts.get_field('sent_at').get_db_prep_value(timezone.now(), connection)
+        sql = (
+            f'INSERT INTO {quote(opts.db_table)} ({columns}) '
+            f'SELECT %s, audience.{quote(users.model._meta.pk.column)}, %s, %s FROM ({select}) audience '
+            # SQLite only parses an upsert clause after INSERT ... SELECT when the SELECT has a WHERE
+            'WHERE true ON CONFLICT DO NOTHING'
+        )
+        with write_atomic(using=self.db), connection.cursor() as cursor:
+            last_id = self.last_id()
+            cursor.execute(sql, [newsletter.pk, sent_at, False, *params])
+            NewsletterStats.objects.add(newsletter.pk, sent=cursor.rowcount)
+            UserNewsletterCounter.objects.add_recipients(self.filter(newsletter=newsletter, pk__gt=last_id))
+            return cursor.rowcount
+
+    def claim_for_delivery(self, newsletter, first_id, last_id, stale_after, limit=None):
+        """Claim up to ``limit`` undelivered recipients with pks in the range; return their pks.
+
+        A recipient can be claimed while no delivery job holds it, or once
+        its claim is older than ``stale_after`` (the worker died mid-send).
+        The candidates are read with ``select_for_update`` and stamped with
+        ``delivering_at`` in one transaction, so of two jobs covering the same
+        rows only one gets each recipient.
+        """
+        now = timezone.now()
+        claimable = self.filter(
+            Q(delivering_at__isnull=True) | Q(delivering_at__lt=now - stale_after),
+            newsletter=newsletter, pk__range=(first_id, last_id), delivered_at__isnull=True,
+        )
+        with write_atomic(using=self.db):
+            pks = list(claimable.select_for_update().order_by('pk').values_list('pk', flat=True)[:limit])
+            self.filter(pk__in=pks).update(delivering_at=now)
+        return pks
+
+    def release(self, pks):
+        """Give up the delivery claim on the undelivered recipients among ``pks``."""
+        return self.filter(pk__in=pks, delivered_at__isnull=True).update(delivering_at=None)
+
+    def record_engagement(self, opened_ids=(), clicked_ids=(), when=None):
+        """Mark recipients opened/clicked and add the changes to their newsletters' stats.
+
+        Clicks count as opens too. The rows that still need changing are read
+        with ``select_for_update`` in the same transaction as the writes, so
+        concurrent flushes cannot count one event twice (on SQLite the
+        later flush waits for the write lock instead). Returns the
+        number of rows changed.
+        """
+        when = when or timezone.now()
+        opened_ids = set(opened_ids) | set(clicked_ids)
+        with write_atomic(using=self.db):
+            opens = list(
+                self.select_for_update().filter(pk__in=opened_ids, opened_at__isnull=True)
+                .values_list('pk', 'newsletter_id', 'user_id')
+            )
+            clicks = list(
+                self.select_for_update().filter(pk__in=clicked_ids, clicked=False)
+                .values_list('pk', 'newsletter_id')
+            )
+            if opens:
+                self.filter(pk__in=[pk for pk, _, _ in opens], opened_at__isnull=True).update(opened_at=when)
+            if clicks:
+                self.filter(pk__in=[pk for pk, _ in clicks], clicked=False).update(clicked=True)
+
+            opened = Counter(newsletter_id for _, newsletter_id, _ in opens)
+            clicked = Counter(newsletter_id for _, newsletter_id in clicks)
+            for newsletter_id in opened.keys() | clicked.keys():
+                NewsletterStats.objects.add(
+                    newsletter_id, opened=opened[newsletter_id], clicked=clicked[newsletter_id], opened_at=when,
+                )
+            read = Counter(user_id for _, _, user_id in opens)
+            UserNewsletterCounter.objects.add({user_id: (0, -count) for user_id, count in read.items()})
+        return len(opens) + len(clicks)
+
+
 class NewsletterRecipient(models.Model):
     """Tracks which newsletters were sent to which users."""
     newsletter = models.ForeignKey(Newsletter, on_delete=models.CASCADE, related_name='recipients')
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='received_newsletters')
     sent_at = models.DateTimeField(_('sent at'), auto_now_add=True)
+    # Set while a delivery job is sending to the recipient
+    delivering_at = models.DateTimeField(_('delivering since'), null=True, blank=True)
+    delivered_at = models.DateTimeField(_('delivered at'), null=True, blank=True)
     opened_at = models.DateTimeField(_('opened at'), null=True, blank=True)
     clicked = models.BooleanField(_('clicked'), default=False)
     
+    objects = NewsletterRecipientManager()
+    
     class Meta:
         unique_together = ('newsletter', 'user')
+        indexes = [
+            # Delivery jobs page through the recipients still to be emailed
+            models.Index(fields=['newsletter', 'id'], name='recipient_undelivered', condition=Q(delivered_at=None)),
+        ]
         verbose_name = _('newsletter recipient')
         verbose_name_plural = _('newsletter recipients')
     
@@ -174,9 +417,188 @@ class NewsletterRecipient(models.Model):
         """Mark the newsletter as opened by the user."""
         if not self.opened_at:
             self.opened_at = timezone.now()
-            self.save()
+            NewsletterRecipient.objects.record_engagement(opened_ids=[self.pk], when=self.opened_at)
     
     def mark_as_clicked(self):
         """Mark the newsletter as clicked by the user."""
         self.clicked = True
-        self.save()
+        NewsletterRecipient.objects.record_engagement(clicked_ids=[self.pk])
+
+
+class ArchivedRecipient(models.Model):
+    """A recipient row moved out of ``NewsletterRecipient`` by ``archive_recipients``.
+
+    The cold table has no unique or partial indexes, so it is cheap to append
+    to; its rows are no longer tracked and only kept for reference.
+    """
+    newsletter = models.ForeignKey(Newsletter, on_delete=models.CASCADE, related_name='archived_recipients')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    sent_at = models.DateTimeField(_('sent at'))
+    delivered_at = models.DateTimeField(_('delivered at'), null=True, blank=True)
+    opened_at = models.DateTimeField(_('opened at'), null=True, blank=True)
+    clicked = models.BooleanField(_('clicked'), default=False)
+    
+    class Meta:
+        verbose_name = _('archived recipient')
+        verbose_name_plural = _('archived recipients')
+    
+    def __str__(self):
+        return f"{self.user_id} - {self.newsletter_id}"
+
+
+class NewsletterStatsManager(models.Manager):
+    def add(self, newsletter_id, sent=0, opened=0, clicked=0, opened_at=None, archived=0):
+        """Add to a newsletter's counters in place with ``F()`` expressions."""
+        changes = {}
+        if sent:
+            changes['sent'] = F('sent') + sent
+        if archived:
+            changes['archived'] = F('archived') + archived
+        if clicked:
+            changes['clicked'] = F('clicked') + clicked
+        if opened:
+            opened_at = Value(opened_at or timezone.now(), output_field=models.DateTimeField())
+            changes.update(
+                opened=F('opened') + opened,
+                first_opened_at=Coalesce(F('first_opened_at'), opened_at),
+                last_opened_at=opened_at,
+            )
+        if not changes:
+            return
+        self.bulk_create([self.model(newsletter_id=newsletter_id)], ignore_conflicts=True)
+        self.filter(newsletter_id=newsletter_id).update(**changes)
+
+
+class NewsletterStats(models.Model):
+    """Engagement counters of a newsletter, kept current as recipients are added and open it."""
+    newsletter = models.OneToOneField(Newsletter, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    sent = models.PositiveIntegerField(_('sent'), default=0)
+    opened = models.PositiveIntegerField(_('opened'), default=0)
+    clicked = models.PositiveIntegerField(_('clicked'), default=0)
+    first_opened_at = models.DateTimeField(_('first opened at'), null=True, blank=True)
+    last_opened_at = models.DateTimeField(_('last opened at'), null=True, blank=True)
+    # Recipients moved to the cold storage; they stay counted above
+    archived = models.PositiveIntegerField(_('archived'), default=0)
+    
+    objects = NewsletterStatsManager()
+    
+    class Meta:
+        verbose_name = _('newsletter stats')
+        verbose_name_plural = _('newsletter stats')
+    
+    def __str__(self):
+        return f"Stats for {self.newsletter_id}"
+    
+    @property
+    def open_rate(self):
+        return self.opened / self.sent if self.sent else 0.0
+    
+    @property
+    def click_rate(self):
+        return self.clicked / self.sent if self.sent else 0.0
+
+
+class UserNewsletterCounterManager(models.Manager):
+    def insert_missing(self, recipients):
+        """Create zeroed counter rows for the users of the ``recipients`` queryset that have none."""
+        connection = connections[self.db]
+        quote = connection.ops.quote_name
+        opts = self.model._meta
+        columns = ', '.join(quote(opts.get_field(name).column) for name in ('user', 'received', 'unread'))
+        select, params = recipients.order_by().values('user_id').distinct().query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {quote(opts.db_table)} ({columns}) SELECT users.user_id, 0, 0 FROM ({select}) users '
+                # SQLite only parses an upsert clause after INSERT ... SELECT when the SELECT has a WHERE
+                'WHERE true ON CONFLICT DO NOTHING',
+                params,
+            )
+
+    def add_recipients(self, recipients):
+        """Count the rows of the ``recipients`` queryset, at most one per user, as received and unread."""
+        with write_atomic(using=self.db):
+            self.insert_missing(recipients)
+            self.filter(user_id__in=recipients.order_by().values('user_id')).update(
+                received=F('received') + 1, unread=F('unread') + 1,
+            )
+
+    def add(self, changes):
+        """Apply ``{user_id: (received, unread)}`` changes in place, never going below zero.
+
+        Users with the same change share one ``UPDATE``; users without a
+        counter row are skipped.
+        """
+        by_change = defaultdict(list)
+        for user_id, change in changes.items():
+            if any(change):
+                by_change[change].append(user_id)
+        for (received, unread), user_ids in by_change.items():
+            self.filter(user_id__in=user_ids).update(
+                received=Greatest(F('received') + received, 0),
+                unread=Greatest(F('unread') + unread, 0),
+            )
+
+    def rebuild(self, first_user_id, last_user_id):
+        """Recount the users in the pk range from their recipient rows; return how many were wrong.
+
+        Each statement computes and writes the counts at once, so it cannot
+        overwrite a concurrent increment with a stale value.
+        """
+        recipients = NewsletterRecipient.objects.filter(user_id__gte=first_user_id, user_id__lte=last_user_id)
+        per_user = NewsletterRecipient.objects.filter(user_id=OuterRef('user_id')).order_by().values('user_id')
+        received = Coalesce(Subquery(per_user.annotate(count=Count('pk')).values('count')), 0)
+        unread = Coalesce(Subquery(per_user.filter(opened_at__isnull=True).annotate(count=Count('pk')).values('count')), 0)
+        with write_atomic(using=self.db):
+            self.insert_missing(recipients)
+            return (
+                self.filter(pk__gte=first_user_id, pk__lte=last_user_id)
+                .annotate(actual_received=received, actual_unread=unread)
+                .filter(~Q(received=F('actual_received')) | ~Q(unread=F('actual_unread')))
+                .update(received=received, unread=unread)
+            )
+
+
+class UserNewsletterCounter(models.Model):
+    """How many newsletters a user received and has not opened yet.
+
+    The counts cover the rows in ``NewsletterRecipient``: fan-outs add to
+    them, opens and archival subtract, all in the transaction that changes
+    the rows. ``manage.py rebuild_counters`` repairs any drift.
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='newsletter_counter')
+    received = models.PositiveIntegerField(_('received'), default=0)
+    unread = models.PositiveIntegerField(_('unread'), default=0)
+    
+    objects = UserNewsletterCounterManager()
+    
+    class Meta:
+        verbose_name = _('newsletter counter')
+        verbose_name_plural = _('newsletter counters')
+    
+    def __str__(self):
+        return f"Newsletter counts for {self.user_id}"
+
+
+class DeliveryThrottleManager(models.Manager):
+    def reserve(self, now, duration):
+        """Reserve ``duration`` seconds of sending, from ``now`` at the earliest; return when they start.
+
+        The single row is read with ``select_for_update`` and moved on in the
+        same transaction, so workers sending at once get consecutive slots.
+        """
+        with write_atomic(using=self.db):
+            self.bulk_create([self.model(pk=1, next_at=now)], ignore_conflicts=True)
+            start = max(now, self.select_for_update().values_list('next_at', flat=True).get(pk=1))
+            self.filter(pk=1).update(next_at=start + duration)
+        return start
+
+
+class DeliveryThrottle(models.Model):
+    """When delivery jobs may send next, as Unix time, shared by all worker processes."""
+    next_at = models.FloatField(_('next send at'))
+    
+    objects = DeliveryThrottleManager()
+    
+    class Meta:
+        verbose_name = _('delivery throttle')
+        verbose_name_plural = _('delivery throttles')
@@ -0,0 +1,89 @@
+"""
+Archival of old ``NewsletterRecipient`` rows.
+
+Every send adds a row per recipient, so the hot table and its unique index
+grow without bound. ``archive_recipients`` moves the rows sent before a
+cutoff out of it, ``chunk_size`` rows per transaction: each chunk is read,
+written to the cold storage, added to ``NewsletterStats.archived`` and
+deleted by primary-key range, so the write lock is held only for one chunk
+and the job workers and tracking flushes get in between chunks.
+
+The cold storage is the ``ArchivedRecipient`` table or, with ``output_dir``,
+one gzipped JSONL file per newsletter (``newsletter-<id>.jsonl.gz``). The
+files are appended to before the chunk commits, so a chunk whose transaction
+fails may be written twice but is never lost.
+
+Archived recipients keep counting in ``sent``/``opened``/``clicked``; late
+opens or clicks from them are no longer recorded. They leave the users'
+received and unread counts.
+"""
+import gzip
+import json
+import os
+import time
+from collections import Counter, defaultdict
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from daycare_project.sqlite3.base import write_atomic
+
+from .models import ArchivedRecipient, NewsletterRecipient, NewsletterStats, UserNewsletterCounter
+
+FIELDS = ('id', 'newsletter_id', 'user_id', 'sent_at', 'delivered_at', 'opened_at', 'clicked')
+
+
+def archive_chunk(cutoff, after_id=0, chunk_size=1000, output_dir=None):
+    """Archive up to ``chunk_size`` recipients sent before ``cutoff`` with pks above ``after_id``.
+
+    Returns ``(last_id, count)``; ``last_id`` is None once nothing is left.
+    """
+    with write_atomic():
+        rows = list(
+            NewsletterRecipient.objects.filter(pk__gt=after_id, sent_at__lt=cutoff)
+            .order_by('pk')
+            .values(*FIELDS)[:chunk_size]
+        )
+        if not rows:
+            return None, 0
+        first_id, last_id = rows[0]['id'], rows[-1]['id']
+
+        if output_dir:
+            write_jsonl(output_dir, rows)
+        else:
+            ArchivedRecipient.objects.bulk_create(
+                ArchivedRecipient(**{name: row[name] for name in FIELDS if name != 'id'}) for row in rows
+            )
+        for newsletter_id, count in Counter(row['newsletter_id'] for row in rows).items():
+            NewsletterStats.objects.add(newsletter_id, archived=count)
+        received = Counter(row['user_id'] for row in rows)
+        unread = Counter(row['user_id'] for row in rows if row['opened_at'] is None)
+        UserNewsletterCounter.objects.add({user_id: (-count, -unread[user_id]) for user_id, count in received.items()})
+        NewsletterRecipient.objects.filter(pk__range=(first_id, last_id), sent_at__lt=cutoff).delete()
+    return last_id, len(rows)
+
+
+def write_jsonl(output_dir, rows):
+    by_newsletter = defaultdict(list)
+    for row in rows:
+        by_newsletter[row['newsletter_id']].append(row)
+    for newsletter_id, newsletter_rows in by_newsletter.items():
+        path = os.path.join(output_dir, f'newsletter-{newsletter_id}.jsonl.gz')
+        # Appending adds a gzip member; readers see one continuous stream
+        with gzip.open(path, 'at', encoding='utf-8') as file:
+            for row in newsletter_rows:
+                record = {name: row[name] for name in FIELDS if name not in ('id', 'newsletter_id')}
+                file.write(json.dumps(record, cls=DjangoJSONEncoder, separators=(',', ':')) + '\n')
+
+
+def archive(cutoff, chunk_size=1000, output_dir=None, pause=0):
+    """Archive every recipient sent before ``cutoff``; yield the size of each chunk."""
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    last_id = 0
+    while True:
+        last_id, count = archive_chunk(cutoff, last_id, chunk_size, output_dir)
+        if last_id is None:
+            return
+        yield count
+        if pause:
+            time.sleep(pause)
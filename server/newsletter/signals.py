@@ -0,0 +1,41 @@
+"""Invalidate cached GraphQL results when public content changes and keep user counters in step."""
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.dispatch import receiver
+
+from daycare_project.caching import bump_version
+from .models import Category, Newsletter, Announcement, Event, UserNewsletterCounter
+
+
+@receiver(post_save, sender=Newsletter)
+@receiver(post_save, sender=Announcement)
+@receiver(post_save, sender=Event)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Newsletter)
+@receiver(post_delete, sender=Announcement)
+@receiver(post_delete, sender=Event)
+@receiver(post_delete, sender=Category)
+def content_changed(sender, **kwargs):
+    bump_version()
+
+
+@receiver(m2m_changed, sender=Newsletter.categories.through)
+@receiver(m2m_changed, sender=Announcement.categories.through)
+@receiver(m2m_changed, sender=Event.categories.through)
+@receiver(m2m_changed, sender=Event.newsletters.through)
+def relations_changed(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        bump_version()
+
+
+@receiver(pre_delete, sender=Newsletter)
+def newsletter_deleted(sender, instance, **kwargs):
+    # The recipient rows go with the newsletter; each user has at most one
+    recipients = instance.recipients.order_by()
+    UserNewsletterCounter.objects.filter(user_id__in=recipients.values('user_id')).update(
+        received=Greatest(F('received') - 1, 0),
+    )
+    UserNewsletterCounter.objects.filter(user_id__in=recipients.filter(opened_at__isnull=True).values('user_id')).update(
+        unread=Greatest(F('unread') - 1, 0),
+    )
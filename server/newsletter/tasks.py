@@ -0,0 +1,27 @@
+from jobs.registry import task
+
+from . import delivery
+from .models import Newsletter
+
+
+@task('newsletter.fan_out')
+def fan_out(newsletter_id, group_ids=(), child_groups=()):
+    """Add the recipients of a published newsletter and queue their delivery.
+
+    Without groups every subscribed user receives it; otherwise only the
+    audience of the subscription and child groups does.
+    """
+    newsletter = Newsletter.objects.get(pk=newsletter_id)
+    if group_ids or child_groups:
+        created = newsletter.send_to_groups(group_ids, child_groups)
+    else:
+        created = newsletter.send_to_subscribers()
+    jobs = delivery.enqueue_delivery(newsletter)
+    return {'recipients_created': created, 'delivery_jobs': [job.pk for job in jobs]}
+
+
+@task('newsletter.deliver')
+def deliver(newsletter_id, first_id, last_id):
+    """Email the newsletter to the undelivered recipients with pks in the range."""
+    newsletter = Newsletter.objects.get(pk=newsletter_id)
+    return {'delivered': delivery.deliver(newsletter, first_id, last_id)}
@@ -1,3 +1,1514 @@
-from django.test import TestCase
+import gzip
+import json
+import os
+import re
+import sqlite3
+import tempfile
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core import mail
+from django.core.cache import cache
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.mail.backends.locmem import EmailBackend
+from django.core.management import call_command
+from django.db import OperationalError, connection, connections, transaction
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from graphql import parse
+from graphql_jwt.shortcuts import get_token
+
+from accounts.models import User, Child
+from daycare_project import routers
+from daycare_project.caching import VERSION_KEY, get_shared_cache, get_version, is_cacheable
+from daycare_project.documents import PERSISTED_QUERY_NOT_FOUND, get_document_cache, query_hash
+from daycare_project.metrics import registry
+from daycare_project.schema import schema
+from jobs.models import Job
+from jobs.worker import Worker
+from . import delivery, fulltext, retention, tracking
+from .models import (
+    ArchivedRecipient, Category, DeliveryThrottle, Newsletter, Announcement, Event, NewsletterRecipient, NewsletterStats,
+    Subscription, SubscriptionGroup, UserNewsletterCounter, audience,
+)
+
+
+class GraphQLTestCase(TestCase):
+    """Posts operations to the GraphQL endpoint and decodes the response."""
+
+    def setUp(self):
+        # Cached results outlive the per-test transaction rollback
+        cache.clear()
+        get_shared_cache().clear()
+
+    def query(self, query, variables=None, **extra):
+        response = self.client.post(
+            '/graphql/',
+            json.dumps({'query': query, 'variables': variables or {}}),
+            content_type='application/json',
+            **extra
+        )
+        return response.json()
+
+
+class NestedRelationBatchingTests(GraphQLTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        categories = [Category.objects.create(name=f'Category {i}') for i in range(3)]
+        for i in range(10):
+            author = User.objects.create_user(email=f'staff{i}@example.com', role=User.Role.STAFF)
+            newsletter = Newsletter.objects.create(
+                title=f'Newsletter {i}', content='Body', created_by=author,
+                status=Newsletter.Status.PUBLISHED,
+            )
+            newsletter.categories.set(categories)
+            event = Event.objects.create(
+                title=f'Event {i}', description='Details', created_by=author,
+                start_date=timezone.now(), end_date=timezone.now(),
+            )
+            event.newsletters.add(newsletter)
+
+    def test_nested_selection_costs_fixed_number_of_queries(self):
+        query = '''
+        {
+            newsletters {
+                edges {
+                    node {
+                        title
+                        createdBy { email firstName lastName }
+                        categories { name }
+                        events { title createdBy { email } }
+                    }
+                }
+            }
+        }
+        '''
+        # newsletters joined to authors, categories, events joined to authors
+        with self.assertNumQueries(3):
+            result = self.query(query)
+        self.assertNotIn('errors', result)
+        self.assertEqual(len(result['data']['newsletters']['edges']), 10)
+        first = result['data']['newsletters']['edges'][0]['node']
+        self.assertEqual(len(first['categories']), 3)
+        self.assertEqual(first['events'][0]['createdBy']['email'], first['createdBy']['email'])
+
+
+class SelectionSetOptimizerTests(GraphQLTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user(email='staff@example.com', bio='Long biography')
+        cls.newsletter = Newsletter.objects.create(
+            title='Weekly', content='Very long body', created_by=author,
+            status=Newsletter.Status.PUBLISHED,
+        )
+
+    def test_unrequested_columns_are_not_read(self):
+        with CaptureQueriesContext(connection) as queries:
+            result = self.query('{ newsletters { edges { node { title createdBy { email } } } } }')
+        self.assertEqual(
+            result['data']['newsletters']['edges'],
+            [{'node': {'title': 'Weekly', 'createdBy': {'email': 'staff@example.com'}}}],
+        )
+        self.assertEqual(len(queries), 1)
+        sql = queries[0]['sql']
+        self.assertNotIn('"content"', sql)
+        self.assertNotIn('"bio"', sql)
+
+    def test_detail_resolver_reads_requested_columns(self):
+        with CaptureQueriesContext(connection) as queries:
+            result = self.query(
+                'query ($id: ID) { newsletter(id: $id) { title content } }', {'id': self.newsletter.pk}
+            )
+        self.assertEqual(result['data']['newsletter']['content'], 'Very long body')
+        self.assertNotIn('"subtitle"', queries[0]['sql'])
+
+
+class KeysetPaginationTests(GraphQLTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user(email='staff@example.com')
+        for i in range(5):
+            Newsletter.objects.create(
+                title=f'Newsletter {i}', content='Body', created_by=author,
+                status=Newsletter.Status.PUBLISHED,
+            )
+
+    def test_pages_follow_created_at_ordering(self):
+        query = """
+        query ($after: String) {
+            newsletters(first: 2, after: $after) {
+                edges { node { title } }
+                pageInfo { hasNextPage endCursor }
+            }
+        }
+        """
+        titles = []
+        after = None
+        while True:
+            page = self.query(query, {'after': after})['data']['newsletters']
+            titles.extend(edge['node']['title'] for edge in page['edges'])
+            if not page['pageInfo']['hasNextPage']:
+                break
+            after = page['pageInfo']['endCursor']
+        expected = list(Newsletter.objects.values_list('title', flat=True))
+        self.assertEqual(titles, expected)
+        self.assertEqual(len(titles), 5)
+
+    def test_invalid_cursor_is_rejected(self):
+        result = self.query('{ newsletters(after: "bogus") { edges { node { title } } } }')
+        self.assertEqual(result['errors'][0]['message'], 'Invalid cursor.')
+
+
+class FeedTests(GraphQLTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user(email='staff@example.com')
+        cls.school = Category.objects.create(name='School')
+        now = timezone.now()
+        for i in range(3):
+            newsletter = Newsletter.objects.create(
+                title=f'Newsletter {i}', content='Body', created_by=author,
+                status=Newsletter.Status.PUBLISHED, published_at=now - timedelta(days=i),
+            )
+            if i == 0:
+                newsletter.categories.add(cls.school)
+            Announcement.objects.create(title=f'Announcement {i}', content='Body', created_by=author)
+            Event.objects.create(
+                title=f'Event {i}', description='Details', created_by=author,
+                start_date=now + timedelta(days=i + 1), end_date=now + timedelta(days=i + 2),
+            )
+        Newsletter.objects.create(title='Draft', content='Body', created_by=author)
+
+    feed_query = """
+    query ($first: Int, $after: String, $types: [FeedItemKind], $categoryIds: [ID]) {
+        feed(first: $first, after: $after, types: $types, categoryIds: $categoryIds) {
+            edges {
+                timestamp
+                node {
+                    __typename
+                    ... on NewsletterType { title }
+                    ... on AnnouncementType { title }
+                    ... on EventType { title }
+                }
+            }
+            pageInfo { hasNextPage endCursor }
+        }
+    }
+    """
+
+    def test_feed_merges_and_pages_newest_first(self):
+        edges = []
+        after = None
+        while True:
+            page = self.query(self.feed_query, {'first': 4, 'after': after})['data']['feed']
+            edges.extend(page['edges'])
+            if not page['pageInfo']['hasNextPage']:
+                break
+            after = page['pageInfo']['endCursor']
+        self.assertEqual(len(edges), 9)
+        timestamps = [edge['timestamp'] for edge in edges]
+        self.assertEqual(timestamps, sorted(timestamps, reverse=True))
+        self.assertNotIn('Draft', [edge['node']['title'] for edge in edges])
+
+    def test_feed_filters_by_type_and_category(self):
+        result = self.query(self.feed_query, {'types': ['NEWSLETTER'], 'categoryIds': [self.school.pk]})
+        edges = result['data']['feed']['edges']
+        self.assertEqual([edge['node']['title'] for edge in edges], ['Newsletter 0'])
+        self.assertEqual(edges[0]['node']['__typename'], 'NewsletterType')
+
+    def test_events_are_placed_by_creation_time(self):
+        author = User.objects.get()
+        far = timezone.now() + timedelta(days=365)
+        Event.objects.create(title='Next year', description='Details', created_by=author, start_date=far, end_date=far)
+        Newsletter.objects.create(title='Latest', content='Body', created_by=author, status=Newsletter.Status.PUBLISHED)
+        edges = self.query(self.feed_query, {'first': 2})['data']['feed']['edges']
+        self.assertEqual([edge['node']['title'] for edge in edges], ['Latest', 'Next year'])
+
+
+class FilterArgumentTests(GraphQLTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user(email='staff@example.com')
+        cls.school, cls.outdoor = Category.objects.create(name='School'), Category.objects.create(name='Outdoor')
+        for i, title in enumerate(['Zoo trip', 'Art week', 'Menu update', 'Garden day']):
+            newsletter = Newsletter.objects.create(
+                title=title, content=f'Body {i}', created_by=author,
+                status=Newsletter.Status.PUBLISHED, featured=i % 2 == 0,
+            )
+            newsletter.categories.set([cls.school, cls.outdoor] if i < 2 else [cls.outdoor])
+        for priority in ['LOW', 'HIGH', 'URGENT']:
+            Announcement.objects.create(title=priority, content='Body', created_by=author, priority=priority)
+        now = timezone.now()
+        for days in [1, 10, 40]:
+            Event.objects.create(
+                title=f'In {days} days', description='Details', created_by=author,
+                start_date=now + timedelta(days=days), end_date=now + timedelta(days=days),
+            )
+
+    def titles(self, field, arguments, variables=None, declarations='($categoryIds: [ID])'):
+        if variables is None:
+            declarations = ''
+        result = self.query(f'query {declarations} {{ {field}({arguments}) {{ edges {{ node {{ title }} }} }} }}', variables)
+        self.assertNotIn('errors', result)
+        return [edge['node']['title'] for edge in result['data'][field]['edges']]
+
+    def test_newsletter_filters(self):
+        self.assertEqual(
+            self.titles('newsletters', 'categoryIds: $categoryIds, featured: true', {'categoryIds': [self.school.pk]}),
+            ['Zoo trip'],
+        )
+        # Matching both categories still returns each newsletter once
+        self.assertEqual(
+            len(self.titles('newsletters', 'categoryIds: $categoryIds', {'categoryIds': [self.school.pk, self.outdoor.pk]})),
+            4,
+        )
+        self.assertEqual(self.titles('newsletters', 'search: "garden DAY"'), ['Garden day'])
+
+    def test_order_by_pages_with_keyset_cursor(self):
+        query = """
+        query ($after: String) {
+            newsletters(orderBy: "title", first: 3, after: $after) {
+                edges { node { title } }
+                pageInfo { endCursor }
+            }
+        }
+        """
+        first_page = self.query(query)['data']['newsletters']
+        second_page = self.query(query, {'after': first_page['pageInfo']['endCursor']})['data']['newsletters']
+        titles = [edge['node']['title'] for page in (first_page, second_page) for edge in page['edges']]
+        self.assertEqual(titles, ['Art week', 'Garden day', 'Menu update', 'Zoo trip'])
+
+    def test_announcement_priority_and_event_window(self):
+        self.assertEqual(
+            sorted(self.titles('announcements', 'priority: ["HIGH", "URGENT"]')), ['HIGH', 'URGENT']
+        )
+        now = timezone.now()
+        window = {'after': now.isoformat(), 'before': (now + timedelta(days=30)).isoformat()}
+        self.assertEqual(
+            self.titles('events', 'startsBetween: $window', {'window': window}, '($window: DateTimeRangeInput)'),
+            ['In 1 days', 'In 10 days'],
+        )
+
+    def test_invalid_arguments_are_rejected(self):
+        result = self.query('{ newsletters(orderBy: "content") { edges { node { title } } } }')
+        self.assertIn('Invalid filter arguments', result['errors'][0]['message'])
+
+
+class SearchTests(GraphQLTestCase):
+    QUERY = """
+    query ($query: String!, $types: [FeedItemKind], $first: Int, $after: String) {
+        search(query: $query, types: $types, first: $first, after: $after) {
+            edges {
+                cursor
+                snippet
+                node {
+                    __typename
+                    ... on NewsletterType { title }
+                    ... on AnnouncementType { title }
+                    ... on EventType { title }
+                }
+            }
+            pageInfo { hasNextPage endCursor }
+        }
+    }
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(email='staff@example.com', role=User.Role.STAFF)
+        published = Newsletter.Status.PUBLISHED
+        cls.newsletter = Newsletter.objects.create(
+            title='Garden day', content='We plant <tomatoes> together.', created_by=cls.author, status=published,
+        )
+        Newsletter.objects.create(
+            title='Weekly news', content='The garden needs volunteers.', created_by=cls.author, status=published,
+        )
+        Newsletter.objects.create(title='Gardening plans', content='Draft', created_by=cls.author)
+        Announcement.objects.create(title='Gardens closed', content='Storm damage.', created_by=cls.author)
+        Announcement.objects.create(title='Garden tools', content='Old', created_by=cls.author, is_active=False)
+        now = timezone.now()
+        Event.objects.create(
+            title='Harvest party', description='Bring food from your garden.', location='Garden shed',
+            start_date=now, end_date=now, created_by=cls.author,
+        )
+
+    def search(self, query, **variables):
+        result = self.query(self.QUERY, {'query': query, **variables})
+        self.assertNotIn('errors', result)
+        return result['data']['search']
+
+    def titles(self, query, **variables):
+        return [edge['node']['title'] for edge in self.search(query, **variables)['edges']]
+
+    def test_ranks_title_matches_first(self):
+        titles = self.titles('garden')
+        self.assertCountEqual(titles, ['Garden day', 'Gardens closed', 'Weekly news', 'Harvest party'])
+        self.assertCountEqual(titles[:2], ['Garden day', 'Gardens closed'])
+
+    def test_prefix_and_case_insensitive_matching(self):
+        self.assertEqual(self.titles('GARD DAY'), ['Garden day'])
+        self.assertEqual(self.titles('tomato'), ['Garden day'])
+        self.assertEqual(self.titles('garden', types=['EVENT']), ['Harvest party'])
+
+    def test_query_syntax_is_not_interpreted(self):
+        self.assertEqual(self.titles('tomatoes" OR NEAR(*'), [])
+        self.assertEqual(self.titles('"tomatoes"'), ['Garden day'])
+        self.assertEqual(self.titles('!!!'), [])
+
+    def test_snippets_are_escaped_and_highlighted(self):
+        edge = self.search('tomato')['edges'][0]
+        self.assertEqual(edge['snippet'], 'We plant &lt;<mark>tomatoes</mark>&gt; together.')
+
+    def test_pages_with_cursor(self):
+        titles = []
+        after = None
+        while True:
+            page = self.search('garden', first=1, after=after)
+            titles += [edge['node']['title'] for edge in page['edges']]
+            if not page['pageInfo']['hasNextPage']:
+                break
+            after = page['pageInfo']['endCursor']
+        self.assertEqual(titles, self.titles('garden'))
+
+    def test_index_follows_writes(self):
+        self.newsletter.title = 'Compost day'
+        self.newsletter.save()
+        self.assertEqual(self.titles('compost'), ['Compost day'])
+        self.assertNotIn('Compost day', self.titles('garden'))
+        self.newsletter.delete()
+        self.assertEqual(self.titles('compost'), [])
+
+    def test_list_filter_and_admin_use_the_index(self):
+        self.assertEqual(
+            list(fulltext.matching(Newsletter.objects.all(), 'gard').values_list('title', flat=True).order_by('title')),
+            ['Garden day', 'Gardening plans', 'Weekly news'],
+        )
+        admin = User.objects.create_superuser(email='admin@example.com', password='secret')
+        self.client.force_login(admin)
+        response = self.client.get('/admin/newsletter/newsletter/', {'q': 'gardening'})
+        self.assertEqual([item.title for item in response.context['cl'].result_list], ['Gardening plans'])
+
+
+class PublishFanOutTests(GraphQLTestCase):
+    mutation = """
+    mutation ($id: ID!) {
+        publishNewsletter(id: $id, sendToAll: true) { newsletter { title } job { id status } }
+    }
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user(email='staff@example.com', role=User.Role.ADMIN)
+        for i in range(25):
+            parent = User.objects.create_user(email=f'parent{i}@example.com')
+            Subscription.objects.create(user=parent, is_subscribed=i < 20)
+        cls.newsletter = Newsletter.objects.create(title='Weekly', content='Body', created_by=cls.staff)
+
+    def publish(self):
+        auth = {'HTTP_AUTHORIZATION': f'JWT {get_token(self.staff)}'}
+        job = self.query(self.mutation, {'id': self.newsletter.pk}, **auth)['data']['publishNewsletter']['job']
+        self.assertEqual(job['status'], 'QUEUED')
+        worker = Worker()
+        while worker.run_once():
+            pass
+        poll = self.query('query ($id: ID!) { job(id: $id) { status result } }', {'id': job['id']}, **auth)
+        self.assertEqual(poll['data']['job']['status'], 'SUCCEEDED')
+        return json.loads(poll['data']['job']['result'])
+
+    def test_fan_out_runs_in_a_job_and_is_idempotent(self):
+        self.assertEqual(self.publish()['recipients_created'], 20)
+        self.assertEqual(NewsletterRecipient.objects.filter(newsletter=self.newsletter).count(), 20)
+        self.assertEqual(self.publish()['recipients_created'], 0)
+        self.assertEqual(NewsletterRecipient.objects.filter(newsletter=self.newsletter).count(), 20)
+
+    def test_fan_out_inserts_in_batches(self):
+        subscribers = User.objects.filter(subscriptions__is_subscribed=True)
+        with CaptureQueriesContext(connection) as queries:
+            created = NewsletterRecipient.objects.fan_out(self.newsletter, subscribers, batch_size=8)
+        self.assertEqual(created, 20)
+        inserts = [query for query in queries if query['sql'].startswith('INSERT INTO "newsletter_newsletterrecipient"')]
+        self.assertEqual(len(inserts), 3)
+
+
+class GroupPublishTests(GraphQLTestCase):
+    mutation = """
+    mutation ($id: ID!, $groupIds: [ID], $childGroups: [String]) {
+        publishNewsletter(id: $id, groupIds: $groupIds, childGroups: $childGroups) { job { id } }
+    }
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user(email='staff@example.com', role=User.Role.ADMIN)
+        cls.newsletter = Newsletter.objects.create(title='Weekly', content='Body', created_by=cls.staff)
+        cls.toddlers = SubscriptionGroup.objects.create(name='Toddlers')
+        cls.parents = {}
+        for name, in_group, child_group, subscribed in [
+            ('group', True, '', True),
+            ('both', True, 'Bears', True),
+            ('child', False, 'Bears', None),
+            ('unsubscribed', False, 'Bears', False),
+            ('other', False, 'Owls', True),
+        ]:
+            parent = cls.parents[name] = User.objects.create_user(email=f'{name}@example.com')
+            if subscribed is not None:
+                subscription = Subscription.objects.create(user=parent, is_subscribed=subscribed)
+                if in_group:
+                    subscription.groups.add(cls.toddlers)
+            if child_group:
+                for first_name in ('Ann', 'Bob'):
+                    Child.objects.create(
+                        parent=parent, first_name=first_name, last_name=name,
+                        date_of_birth='2021-01-01', group=child_group,
+                    )
+
+    def emails(self, users):
+        return sorted(user.email.split('@')[0] for user in users)
+
+    def test_audience_unions_groups_without_duplicates(self):
+        self.assertEqual(self.emails(audience([self.toddlers.pk])), ['both', 'group'])
+        self.assertEqual(self.emails(audience(child_groups=['Bears'])), ['both', 'child'])
+        self.assertEqual(self.emails(audience([self.toddlers.pk], ['Bears'])), ['both', 'child', 'group'])
+        self.assertEqual(list(audience()), [])
+
+    def test_recipients_are_inserted_in_one_statement(self):
+        with CaptureQueriesContext(connection) as queries:
+            created = self.newsletter.send_to_groups([self.toddlers.pk], ['Bears'])
+        self.assertEqual(created, 3)
+        inserts = [query for query in queries if query['sql'].startswith('INSERT INTO "newsletter_newsletterrecipient"')]
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(
+            self.emails(User.objects.filter(received_newsletters__newsletter=self.newsletter)),
+            ['both', 'child', 'group'],
+        )
+
+        self.assertEqual(self.newsletter.send_to_groups([self.toddlers.pk], ['Bears', 'Owls']), 1)
+        self.assertEqual(NewsletterRecipient.objects.filter(newsletter=self.newsletter).count(), 4)
+
+    def test_publish_to_groups_through_a_job(self):
+        auth = {'HTTP_AUTHORIZATION': f'JWT {get_token(self.staff)}'}
+        variables = {'id': self.newsletter.pk, 'groupIds': [self.toddlers.pk], 'childGroups': ['Bears']}
+        self.assertIsNotNone(self.query(self.mutation, variables, **auth)['data']['publishNewsletter']['job'])
+        self.assertTrue(Worker().run_once())
+        self.assertEqual(NewsletterRecipient.objects.filter(newsletter=self.newsletter).count(), 3)
+        self.assertFalse(self.newsletter.recipients.filter(user=self.parents['unsubscribed']).exists())
+
+    def test_send_to_all_and_groups_are_exclusive(self):
+        auth = {'HTTP_AUTHORIZATION': f'JWT {get_token(self.staff)}'}
+        mutation = self.mutation.replace('$childGroups: [String]', '$childGroups: [String], $sendToAll: Boolean')
+        mutation = mutation.replace('childGroups: $childGroups', 'childGroups: $childGroups, sendToAll: $sendToAll')
+        variables = {'id': self.newsletter.pk, 'groupIds': [self.toddlers.pk], 'sendToAll': True}
+        result = self.query(mutation, variables, **auth)
+        self.assertIn('not both', result['errors'][0]['message'])
+        self.newsletter.refresh_from_db()
+        self.assertEqual((self.newsletter.status, self.newsletter.sent_to_all), (Newsletter.Status.DRAFT, False))
+        self.assertFalse(Job.objects.exists())
+
+
+class CountingBackend(EmailBackend):
+    """locmem backend that records how it was used, optionally failing once."""
+    opened = 0
+    batches = []
+    fail_next = False
+
+    def open(self):
+        CountingBackend.opened += 1
+        return super().open()
+
+    def send_messages(self, messages):
+        if CountingBackend.fail_next:
+            CountingBackend.fail_next = False
+            raise OSError('Connection refused')
+        CountingBackend.batches.append(len(messages))
+        return super().send_messages(messages)
+
+
+@override_settings(
+    EMAIL_BACKEND='newsletter.tests.CountingBackend',
+    NEWSLETTER_DELIVERY={'BATCH_SIZE': 8, 'RATE_LIMIT': None},
+)
+class DeliveryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user(email='staff@example.com', role=User.Role.ADMIN)
+        for i in range(20):
+            parent = User.objects.create_user(email=f'parent{i}@example.com')
+            Subscription.objects.create(user=parent)
+        cls.newsletter = Newsletter.objects.create(title='Weekly', content='Body', created_by=cls.staff)
+
+    def setUp(self):
+        CountingBackend.opened = 0
+        CountingBackend.batches = []
+        CountingBackend.fail_next = False
+        delivery._render.cache_clear()
+        self.newsletter.publish()
+        Job.objects.enqueue('newsletter.fan_out', {'newsletter_id': self.newsletter.pk})
+
+    def run_jobs(self):
+        worker = Worker()
+        while worker.run_once():
+            pass
+
+    def test_each_recipient_gets_one_message(self):
+        with mock.patch.object(delivery, 'render_to_string', wraps=delivery.render_to_string) as render:
+            self.run_jobs()
+
+        self.assertEqual(sorted(message.to[0] for message in mail.outbox), sorted(
+            f'parent{i}@example.com' for i in range(20)
+        ))
+        self.assertEqual(mail.outbox[0].subject, 'Weekly')
+        self.assertEqual(mail.outbox[0].alternatives[0][1], 'text/html')
+        self.assertFalse(self.newsletter.recipients.filter(delivered_at__isnull=True).exists())
+        # One job and connection per batch of 8, and the body is rendered once
+        self.assertEqual(Job.objects.filter(name='newsletter.deliver').count(), 3)
+        self.assertEqual(CountingBackend.opened, 3)
+        self.assertEqual(sorted(CountingBackend.batches), [4, 8, 8])
+        self.assertEqual(render.call_count, 2)
+
+    def test_failed_batches_are_retried_without_resending(self):
+        Worker().run_once()
+        CountingBackend.fail_next = True
+        with self.assertLogs('jobs.worker', 'ERROR'):
+            self.run_jobs()
+
+        failed = Job.objects.get(name='newsletter.deliver', attempts=1, status=Job.Status.QUEUED)
+        self.assertIn('Connection refused', failed.error)
+        self.assertEqual(len(mail.outbox), 12)
+
+        Job.objects.filter(pk=failed.pk).update(run_after=timezone.now())
+        self.run_jobs()
+        self.assertEqual(len(mail.outbox), 20)
+        self.assertEqual(len({message.to[0] for message in mail.outbox}), 20)
+
+    def test_jobs_are_queued_after_reading_the_ranges(self):
+        Worker().run_once()
+        Job.objects.filter(name='newsletter.deliver').delete()
+        pks = list(self.newsletter.recipients.order_by('pk').values_list('pk', flat=True))
+        with CaptureQueriesContext(connection) as queries:
+            jobs = delivery.enqueue_delivery(self.newsletter)
+
+        self.assertEqual(
+            [(job.payload['first_id'], job.payload['last_id']) for job in jobs],
+            [(pks[0], pks[7]), (pks[8], pks[15]), (pks[16], pks[19])],
+        )
+        # One insert for all jobs, after the last read
+        inserts = [i for i, query in enumerate(queries) if query['sql'].startswith('INSERT')]
+        self.assertEqual(inserts, [len(queries) - 1])
+
+    def test_overlapping_jobs_send_each_message_once(self):
+        Worker().run_once()
+        pks = list(self.newsletter.recipients.order_by('pk').values_list('pk', flat=True))
+        send_messages = CountingBackend.send_messages
+        raced = None
+
+        def send_and_race(backend, messages):
+            nonlocal raced
+            if raced is None:
+                # A duplicate job for the whole range runs while the first batch is being sent
+                raced = 0
+                raced = delivery.deliver(self.newsletter, pks[0], pks[-1])
+            return send_messages(backend, messages)
+
+        with mock.patch.object(CountingBackend, 'send_messages', send_and_race):
+            self.run_jobs()
+
+        self.assertEqual(raced, 12)
+        self.assertEqual(len(mail.outbox), 20)
+        self.assertEqual(len({message.to[0] for message in mail.outbox}), 20)
+
+    @override_settings(NEWSLETTER_DELIVERY={'BATCH_SIZE': 8, 'RATE_LIMIT': None, 'CLAIM_TIMEOUT': 60})
+    def test_claims_of_dead_workers_expire(self):
+        Worker().run_once()
+        pks = list(self.newsletter.recipients.order_by('pk').values_list('pk', flat=True))
+        NewsletterRecipient.objects.filter(pk__in=pks[:4]).update(delivering_at=timezone.now())
+        NewsletterRecipient.objects.filter(pk__in=pks[4:8]).update(delivering_at=timezone.now() - timedelta(minutes=5))
+        self.run_jobs()
+
+        self.assertEqual(len(mail.outbox), 16)
+        self.assertEqual(
+            set(self.newsletter.recipients.filter(delivered_at__isnull=True).values_list('pk', flat=True)), set(pks[:4]),
+        )
+
+    @override_settings(NEWSLETTER_DELIVERY={'BATCH_SIZE': 8, 'RATE_LIMIT': 4})
+    def test_sending_is_rate_limited(self):
+        clock = [0.0]
+
+        def sleep(seconds):
+            clock[0] += seconds
+
+        with mock.patch('time.time', lambda: clock[0]), mock.patch('time.sleep', sleep):
+            self.run_jobs()
+
+        # A second's worth of messages per send, and the jobs share the budget
+        self.assertEqual(sorted(CountingBackend.batches), [4, 4, 4, 4, 4])
+        self.assertEqual(clock[0], 4.0)
+
+    def test_workers_share_the_rate_limit(self):
+        clock = [100.0]
+        sleeps = []
+        # One limiter per worker process, both at 4 messages per second
+        limiters = [delivery.RateLimiter(4, clock=lambda: clock[0], sleep=sleeps.append) for _ in range(2)]
+        for limiter in limiters:
+            limiter.wait(4)
+        limiters[0].wait(2)
+        self.assertEqual(sleeps, [1.0, 2.0])
+        self.assertEqual(DeliveryThrottle.objects.get().next_at, 102.5)
+
+
+@override_settings(NEWSLETTER_TRACKING={'BASE_URL': 'http://testserver', 'FLUSH_INTERVAL': None, 'MAX_BUFFER': 100})
+class TrackingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        staff = User.objects.create_user(email='staff@example.com', role=User.Role.ADMIN)
+        cls.newsletter = Newsletter.objects.create(
+            title='Weekly', content='Photos at https://example.com/photos?week=1&day=2', created_by=staff,
+        )
+        cls.recipients = [
+            NewsletterRecipient.objects.create(newsletter=cls.newsletter, user=User.objects.create_user(email=f'parent{i}@example.com'))
+            for i in range(3)
+        ]
+
+    def setUp(self):
+        tracking.buffer.flush()
+        delivery._render.cache_clear()
+
+    def links(self, recipient):
+        html = tracking.personalize(delivery.render_newsletter(self.newsletter)[2], recipient.pk)
+        pixel, = re.findall(r'src="http://testserver(/newsletter/open/[^"]+)"', html)
+        click, = re.findall(r'href="http://testserver(/newsletter/click/[^"]+)"', html)
+        return pixel, click
+
+    def test_opens_are_buffered_and_written_in_one_update(self):
+        pixels = [self.links(recipient)[0] for recipient in self.recipients[:2]]
+        with self.assertNumQueries(0):
+            for pixel in pixels + pixels[:1]:
+                response = self.client.get(pixel)
+                self.assertEqual(response['Content-Type'], 'image/gif')
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(tracking.buffer.flush(), 2)
+        updates = [query for query in queries if query['sql'].startswith('UPDATE "newsletter_newsletterrecipient"')]
+        self.assertEqual(len(updates), 1)
+        self.assertIn('"opened_at" IS NULL', updates[0]['sql'])
+
+        opened = NewsletterRecipient.objects.filter(opened_at__isnull=False)
+        self.assertEqual(set(opened.values_list('pk', flat=True)), {r.pk for r in self.recipients[:2]})
+        first_open = opened.get(pk=self.recipients[0].pk).opened_at
+
+        self.client.get(self.links(self.recipients[0])[0])
+        self.assertEqual(tracking.buffer.flush(), 0)
+        self.assertEqual(opened.get(pk=self.recipients[0].pk).opened_at, first_open)
+
+    def test_flush_thread_survives_errors(self):
+        class Stop(BaseException):
+            pass
+
+        flusher = tracking.TrackingBuffer()
+        # Two sleeps and flushes, the first of which fails, then stop the loop
+        with mock.patch('time.sleep', side_effect=[None, None, Stop]), mock.patch.object(tracking, 'connection'):
+            with mock.patch.object(flusher, 'flush', side_effect=[RuntimeError('boom'), 0]) as flush:
+                with self.assertLogs('newsletter.tracking', 'ERROR'), self.assertRaises(Stop):
+                    flusher._run(1)
+        self.assertEqual(flush.call_count, 2)
+
+    def test_click_redirects_to_the_signed_url(self):
+        recipient = self.recipients[2]
+        response = self.client.get(self.links(recipient)[1])
+        self.assertRedirects(response, 'https://example.com/photos?week=1&day=2', fetch_redirect_response=False)
+
+        tracking.buffer.flush()
+        recipient.refresh_from_db()
+        self.assertTrue(recipient.clicked)
+        self.assertIsNotNone(recipient.opened_at)
+
+    def test_tampered_tokens_record_nothing(self):
+        pixel, click = self.links(self.recipients[0])
+        self.assertEqual(self.client.get(pixel[:-3] + 'x/').status_code, 200)
+        self.assertEqual(self.client.get(click[:-3] + 'x/').status_code, 404)
+        forged = tracking.make_token(self.recipients[0].pk).replace(':', ':x', 1)
+        self.assertEqual(self.client.get(f'/newsletter/click/{forged}/').status_code, 404)
+        self.assertEqual(len(tracking.buffer), 0)
+
+    @override_settings(NEWSLETTER_TRACKING={'BASE_URL': 'http://testserver', 'FLUSH_INTERVAL': None, 'MAX_BUFFER': 2})
+    def test_a_full_buffer_is_flushed_inline(self):
+        for recipient in self.recipients[:2]:
+            self.client.get(self.links(recipient)[0])
+        self.assertEqual(len(tracking.buffer), 0)
+        self.assertEqual(NewsletterRecipient.objects.filter(opened_at__isnull=False).count(), 2)
+
+
+class UserNewsletterCounterTests(GraphQLTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(email='staff@example.com', role=User.Role.STAFF)
+        cls.parents = [User.objects.create_user(email=f'parent{i}@example.com') for i in range(3)]
+        Subscription.objects.bulk_create(Subscription(user=parent) for parent in cls.parents)
+        cls.group = SubscriptionGroup.objects.create(name='Toddlers')
+        cls.group.subscribers.add(Subscription.objects.get(user=cls.parents[0]))
+        cls.newsletter = Newsletter.objects.create(title='Weekly', content='Body', created_by=cls.author)
+        cls.other = Newsletter.objects.create(title='Toddlers', content='Body', created_by=cls.author)
+
+    def counts(self):
+        return {
+            counter.user.email: (counter.received, counter.unread)
+            for counter in UserNewsletterCounter.objects.select_related('user').order_by('user__email')
+        }
+
+    def test_fan_out_and_opens_keep_counts(self):
+        self.newsletter.send_to_subscribers()
+        self.other.send_to_groups([self.group.pk])
+        # Fanning out again adds nobody
+        self.newsletter.send_to_subscribers()
+        self.assertEqual(self.counts(), {
+            'parent0@example.com': (2, 2), 'parent1@example.com': (1, 1), 'parent2@example.com': (1, 1),
+        })
+
+        recipient = self.newsletter.recipients.get(user=self.parents[0])
+        recipient.mark_as_opened()
+        recipient.mark_as_clicked()
+        NewsletterRecipient.objects.record_engagement(opened_ids=[recipient.pk])
+        self.assertEqual(self.counts()['parent0@example.com'], (2, 1))
+
+        self.other.delete()
+        self.assertEqual(self.counts()['parent0@example.com'], (1, 0))
+
+    def test_archival_removes_rows_from_counts(self):
+        self.newsletter.send_to_subscribers()
+        self.newsletter.recipients.update(sent_at=timezone.now() - timedelta(days=60))
+        list(retention.archive(timezone.now() - timedelta(days=30)))
+        self.assertEqual(set(self.counts().values()), {(0, 0)})
+
+    def test_me_shows_own_counts_only(self):
+        self.newsletter.send_to_subscribers()
+        parent = self.parents[0]
+        headers = {'HTTP_AUTHORIZATION': f'JWT {get_token(parent)}'}
+        with self.assertNumQueries(2):
+            result = self.query('{ me { unreadNewsletters receivedNewsletterCount } }', **headers)
+        self.assertEqual(result['data']['me'], {'unreadNewsletters': 1, 'receivedNewsletterCount': 1})
+
+        admin = User.objects.create_user(email='admin@example.com', role=User.Role.ADMIN)
+        result = self.query(
+            'query ($id: ID) { user(id: $id) { unreadNewsletters } }', {'id': parent.pk},
+            HTTP_AUTHORIZATION=f'JWT {get_token(admin)}',
+        )
+        self.assertIn('Cannot query field', result['errors'][0]['message'])
+
+    def test_counts_never_reach_the_result_cache(self):
+        self.newsletter.publish()
+        self.newsletter.send_to_subscribers()
+        other = User.objects.create_user(email='other@example.com', role=User.Role.STAFF)
+        NewsletterRecipient.objects.insert_audience(self.newsletter, User.objects.filter(pk=self.author.pk))
+        cached = '{ newsletters { edges { node { createdBy { unreadNewsletters } } } } }'
+        for user, unread in ((self.author, 1), (other, 0)):
+            headers = {'HTTP_AUTHORIZATION': f'JWT {get_token(user)}'}
+            self.assertIn('Cannot query field', self.query(cached, **headers)['errors'][0]['message'])
+            result = self.query('{ newsletters { edges { node { title } } } me { unreadNewsletters } }', **headers)
+            self.assertEqual(result['data']['me'], {'unreadNewsletters': unread})
+
+    def test_rebuild_fixes_drift(self):
+        self.newsletter.send_to_subscribers()
+        self.other.send_to_groups([self.group.pk])
+        self.newsletter.recipients.filter(user=self.parents[1]).update(opened_at=timezone.now())
+        UserNewsletterCounter.objects.filter(user=self.parents[0]).update(received=7)
+        UserNewsletterCounter.objects.filter(user=self.parents[2]).delete()
+
+        out = mock.MagicMock()
+        call_command('rebuild_counters', chunk_size=2, stdout=out)
+        self.assertIn('fixed 3 counters', out.write.call_args[0][0])
+        self.assertEqual(self.counts(), {
+            'parent0@example.com': (2, 2), 'parent1@example.com': (1, 0), 'parent2@example.com': (1, 1),
+        })
+        call_command('rebuild_counters', stdout=out)
+        self.assertIn('fixed 0 counters', out.write.call_args[0][0])
+
+
+class NewsletterStatsTests(GraphQLTestCase):
+    query_text = """
+    query ($id: ID!) {
+        newsletterStats(id: $id) { sent opened clicked openRate clickRate firstOpenedAt lastOpenedAt }
+    }
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user(email='staff@example.com', role=User.Role.ADMIN)
+        cls.newsletter = Newsletter.objects.create(title='Weekly', content='Body', created_by=cls.staff)
+        for i in range(4):
+            Subscription.objects.create(user=User.objects.create_user(email=f'parent{i}@example.com'))
+
+    def stats(self):
+        auth = {'HTTP_AUTHORIZATION': f'JWT {get_token(self.staff)}'}
+        return self.query(self.query_text, {'id': self.newsletter.pk}, **auth)['data']['newsletterStats']
+
+    def test_counters_follow_fan_out_and_tracking(self):
+        self.assertEqual(self.stats()['sent'], 0)
+
+        self.newsletter.send_to_subscribers()
+        self.newsletter.send_to_subscribers()
+        recipients = list(self.newsletter.recipients.order_by('pk'))
+        tracking.buffer.opened.update(r.pk for r in recipients[:2])
+        tracking.buffer.clicked.add(recipients[2].pk)
+        tracking.buffer.flush()
+        recipients[0].mark_as_clicked()
+        recipients[0].mark_as_opened()
+
+        stats = self.stats()
+        self.assertEqual((stats['sent'], stats['opened'], stats['clicked']), (4, 3, 2))
+        self.assertEqual((stats['openRate'], stats['clickRate']), (0.75, 0.5))
+        self.assertIsNotNone(stats['firstOpenedAt'])
+
+        # The counters agree with a full count of the recipient rows
+        recipients = self.newsletter.recipients
+        self.assertEqual(
+            NewsletterStats.objects.values_list('sent', 'opened', 'clicked').get(newsletter=self.newsletter),
+            (recipients.count(), recipients.filter(opened_at__isnull=False).count(), recipients.filter(clicked=True).count()),
+        )
+
+    def test_stats_are_staff_only(self):
+        parent = User.objects.get(email='parent0@example.com')
+        auth = {'HTTP_AUTHORIZATION': f'JWT {get_token(parent)}'}
+        result = self.query(self.query_text, {'id': self.newsletter.pk}, **auth)
+        self.assertIsNone(result['data']['newsletterStats'])
+
+
+class RecipientArchiveTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user(email='staff@example.com', role=User.Role.STAFF)
+        cls.old = Newsletter.objects.create(title='Old', content='Body', created_by=author)
+        cls.new = Newsletter.objects.create(title='New', content='Body', created_by=author)
+        parents = [User.objects.create_user(email=f'parent{i}@example.com') for i in range(3)]
+        Subscription.objects.bulk_create(Subscription(user=parent) for parent in parents)
+        cls.old.send_to_subscribers()
+        cls.new.send_to_subscribers()
+        cls.cutoff = timezone.now() - timedelta(days=30)
+        cls.old.recipients.update(sent_at=cls.cutoff - timedelta(days=1))
+        NewsletterRecipient.objects.record_engagement(opened_ids=[cls.old.recipients.first().pk])
+
+    def test_moves_old_rows_in_chunks(self):
+        self.assertEqual(list(retention.archive(self.cutoff, chunk_size=2)), [2, 1])
+        self.assertFalse(self.old.recipients.exists())
+        self.assertEqual(self.new.recipients.count(), 3)
+        archived = ArchivedRecipient.objects.filter(newsletter=self.old)
+        self.assertEqual(archived.count(), 3)
+        self.assertEqual(archived.filter(opened_at__isnull=False).count(), 1)
+
+        stats = NewsletterStats.objects.get(newsletter=self.old)
+        self.assertEqual((stats.sent, stats.opened, stats.archived), (3, 1, 3))
+        self.assertEqual(NewsletterStats.objects.get(newsletter=self.new).archived, 0)
+
+    def test_command_writes_jsonl_per_newsletter(self):
+        with tempfile.TemporaryDirectory() as directory:
+            out = mock.MagicMock()
+            call_command('archive_recipients', older_than=30, chunk_size=2, output_dir=directory, stdout=out)
+            self.assertEqual(os.listdir(directory), [f'newsletter-{self.old.pk}.jsonl.gz'])
+            with gzip.open(os.path.join(directory, os.listdir(directory)[0]), 'rt') as file:
+                records = [json.loads(line) for line in file]
+        self.assertEqual(len(records), 3)
+        self.assertEqual(
+            set(records[0]), {'user_id', 'sent_at', 'delivered_at', 'opened_at', 'clicked'},
+        )
+        self.assertFalse(ArchivedRecipient.objects.exists())
+        self.assertFalse(self.old.recipients.exists())
+        self.assertIn('Archived 3 recipients', out.write.call_args[0][0])
+
+
+class AdminActionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(email='admin@example.com', password='secret')
+        cls.drafts = [
+            Newsletter.objects.create(title=f'Draft {i}', content='Body', created_by=cls.admin, sent_to_all=i % 2 == 0)
+            for i in range(30)
+        ]
+        Newsletter.objects.create(
+            title='Old', content='Body', created_by=cls.admin, status=Newsletter.Status.ARCHIVED,
+        )
+        for i in range(30):
+            Subscription.objects.create(user=User.objects.create_user(email=f'parent{i}@example.com'), is_subscribed=i < 20)
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def run_action(self, model, action, pks):
+        url = f'/admin/newsletter/{model}/'
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(url, {'action': action, '_selected_action': pks})
+        self.assertEqual(response.status_code, 302)
+        return [query['sql'] for query in queries if query['sql'].startswith(('UPDATE', 'INSERT'))]
+
+    def test_publish_is_one_update_and_queues_fan_out(self):
+        pks = list(Newsletter.objects.values_list('pk', flat=True))
+        writes = self.run_action('newsletter', 'publish_newsletters', pks)
+
+        self.assertEqual(len([sql for sql in writes if sql.startswith('UPDATE "newsletter_newsletter"')]), 1)
+        published = Newsletter.objects.filter(status=Newsletter.Status.PUBLISHED)
+        self.assertEqual(published.count(), 30)
+        self.assertEqual(published.values('published_at').distinct().count(), 1)
+        self.assertTrue(Newsletter.objects.filter(title='Old', status=Newsletter.Status.ARCHIVED, published_at=None).exists())
+        self.assertEqual(
+            sorted(job.payload['newsletter_id'] for job in Job.objects.filter(name='newsletter.fan_out')),
+            sorted(newsletter.pk for newsletter in self.drafts if newsletter.sent_to_all),
+        )
+
+        self.run_action('newsletter', 'archive_newsletters', pks)
+        self.assertEqual(Newsletter.objects.filter(status=Newsletter.Status.ARCHIVED).count(), 31)
+
+    def test_subscription_actions_are_single_updates(self):
+        pks = list(Subscription.objects.values_list('pk', flat=True))
+
+        self.assertEqual(len(self.run_action('subscription', 'unsubscribe_users', pks)), 1)
+        self.assertFalse(Subscription.objects.filter(is_subscribed=True).exists())
+        self.assertEqual(Subscription.objects.exclude(unsubscribed_at=None).count(), 20)
+
+        self.assertEqual(len(self.run_action('subscription', 'resubscribe_users', pks)), 1)
+        self.assertEqual(Subscription.objects.filter(is_subscribed=True, unsubscribed_at=None).count(), 30)
+
+
+class AdminChangelistTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(email='admin@example.com', password='secret')
+        cls.weekly = Newsletter.objects.create(title='Weekly news', content='Body', created_by=cls.admin)
+        cls.monthly = Newsletter.objects.create(title='Monthly digest', content='Body', created_by=cls.admin)
+        for i in range(12):
+            parent = User.objects.create_user(email=f'parent{i}@example.com')
+            subscription = Subscription.objects.create(user=parent)
+            group = SubscriptionGroup.objects.create(name=f'Group {i}')
+            group.subscribers.add(subscription)
+            NewsletterRecipient.objects.create(newsletter=cls.weekly, user=parent)
+            if i % 3 == 0:
+                NewsletterRecipient.objects.create(newsletter=cls.monthly, user=parent)
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def changelist(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response.context['cl'], len(queries)
+
+    def test_query_count_does_not_grow_with_rows(self):
+        for model in ('subscriptiongroup', 'newsletterrecipient', 'announcement', 'event', 'subscription'):
+            _, before = self.changelist(f'/admin/newsletter/{model}/')
+            parent = User.objects.create_user(email=f'late-{model}@example.com')
+            subscription = Subscription.objects.create(user=parent)
+            SubscriptionGroup.objects.create(name=f'Late {model}').subscribers.add(subscription)
+            NewsletterRecipient.objects.create(newsletter=self.monthly, user=parent)
+            Announcement.objects.create(title='A', content='B', created_by=parent)
+            Event.objects.create(
+                title='E', description='D', start_date=timezone.now(), end_date=timezone.now(), created_by=parent,
+            )
+            _, after = self.changelist(f'/admin/newsletter/{model}/')
+            self.assertEqual(before, after, model)
+
+    def test_subscriber_counts_are_annotated(self):
+        cl, _ = self.changelist('/admin/newsletter/subscriptiongroup/')
+        self.assertEqual({group.subscriber_count for group in cl.result_list}, {1})
+
+    def test_recipients_filter_by_newsletter_id_or_title(self):
+        cl, _ = self.changelist(f'/admin/newsletter/newsletterrecipient/?newsletter={self.monthly.pk}')
+        self.assertEqual(cl.result_count, 4)
+        cl, _ = self.changelist('/admin/newsletter/newsletterrecipient/?newsletter=weekly&clicked__exact=0')
+        self.assertEqual(cl.result_count, 12)
+        response = self.client.get('/admin/newsletter/newsletterrecipient/?newsletter=weekly&clicked__exact=0')
+        self.assertContains(response, '<input type="search" name="newsletter" value="weekly">', html=True)
+        self.assertContains(response, '<input type="hidden" name="clicked__exact" value="0">', html=True)
+
+    def test_recipient_count_is_bounded(self):
+        with mock.patch('newsletter.admin.EstimatedCountPaginator.max_count', 5):
+            cl, _ = self.changelist('/admin/newsletter/newsletterrecipient/?newsletter=weekly')
+            self.assertEqual(cl.paginator.count, 6)
+
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+            cl, _ = self.changelist('/admin/newsletter/newsletterrecipient/')
+            self.assertEqual(cl.paginator.count, 16)
+
+
+class IndexUsageTests(TestCase):
+    """The hot read paths must be answered from an index, never a table scan."""
+
+    def assertUsesIndex(self, queryset, index):
+        plan = queryset.explain()
+        self.assertIn(index, plan)
+        for line in plan.splitlines():
+            self.assertNotRegex(line, r'SCAN \w+$', plan)
+
+    def test_list_resolvers(self):
+        from daycare_project.schema import Query
+
+        page = ('-created_at', '-pk')
+        self.assertUsesIndex(Query.resolve_newsletters(None, None).order_by(*page)[:11], 'newsletter_status_created')
+        self.assertUsesIndex(
+            Query.resolve_newsletters(None, None, status='ARCHIVED').order_by(*page)[:11], 'newsletter_status_created',
+        )
+        self.assertUsesIndex(
+            Newsletter.objects.filter(featured=True, status=Newsletter.Status.PUBLISHED).order_by(*page),
+            'newsletter_featured_created',
+        )
+        self.assertUsesIndex(
+            Query.resolve_newsletters(None, None, published_after=timezone.now(), order_by='title'),
+            'newsletter_status_published',
+        )
+        self.assertUsesIndex(Query.resolve_announcements(None, None).order_by(*page)[:11], 'announcement_active_created')
+        now = timezone.now()
+        self.assertUsesIndex(Announcement.objects.filter(is_active=True, expiry_date__lte=now).order_by(), 'announcement_active_expiry')
+        self.assertUsesIndex(Announcement.objects.filter(is_active=True, expiry_date__gt=now).order_by(), 'announcement_active_expiry')
+        self.assertUsesIndex(Query.resolve_events(None, None).order_by('start_date', 'pk')[:11], 'event_active_start')
+        self.assertUsesIndex(Query.resolve_upcoming_events(None, None).order_by('start_date', 'pk')[:11], 'event_active_start')
+
+    def test_audience_and_delivery(self):
+        plan = audience(child_groups=['Bears']).explain()
+        self.assertIn('child_parent_group', plan)
+        # With statistics showing most recipients delivered, the partial index wins
+        staff = User.objects.create_user(email='staff@example.com')
+        newsletter = Newsletter.objects.create(title='Weekly', content='Body', created_by=staff)
+        NewsletterRecipient.objects.bulk_create(
+            NewsletterRecipient(newsletter=newsletter, user=User.objects.create_user(email=f'parent{i}@example.com'))
+            for i in range(50)
+        )
+        newsletter.recipients.filter(pk__gt=min(newsletter.recipients.values_list('pk', flat=True)) + 2).update(
+            delivered_at=timezone.now(),
+        )
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        self.assertUsesIndex(
+            newsletter.recipients.filter(delivered_at__isnull=True).order_by('pk').values('pk'),
+            'recipient_undelivered',
+        )
+        self.assertUsesIndex(Child.objects.filter(group='Bears'), 'child_group')
+
+    def test_feed_branches(self):
+        from daycare_project import feed
+
+        plan = feed.feed_keys(11, (timezone.now(), feed.EVENT, 1)).explain()
+        for index in ('newsletter_status_published', 'announcement_active_created', 'event_active_created'):
+            self.assertIn(index, plan)
+        for line in plan.splitlines():
+            self.assertNotRegex(line, r'SCAN \w+$', plan)
+
+
+class SQLiteBackendTests(TestCase):
+    def make_connection(self, directory, **settings_dict):
+        from daycare_project.sqlite3.base import DatabaseWrapper
+
+        wrapper = DatabaseWrapper({**connection.settings_dict, 'NAME': os.path.join(directory, 'db.sqlite3'), **settings_dict})
+        self.addCleanup(wrapper.close)
+        return wrapper
+
+    def test_new_connections_apply_the_pragmas(self):
+        with tempfile.TemporaryDirectory() as directory:
+            wrapper = self.make_connection(directory)
+            with wrapper.cursor() as cursor:
+                values = {
+                    name: cursor.execute(f'PRAGMA {name}').fetchone()[0]
+                    for name in ('journal_mode', 'synchronous', 'busy_timeout', 'cache_size')
+                }
+            self.assertEqual(values, {'journal_mode': 'wal', 'synchronous': 1, 'busy_timeout': 5000, 'cache_size': -65536})
+
+    def test_only_write_blocks_take_the_write_lock_up_front(self):
+        from daycare_project.sqlite3.base import write_atomic
+
+        with tempfile.TemporaryDirectory() as directory:
+            wrapper = self.make_connection(directory, PRAGMAS={'busy_timeout': 0})
+            other = self.make_connection(directory, PRAGMAS={'busy_timeout': 0})
+            with mock.patch('django.db.transaction.get_connection', return_value=wrapper):
+                with transaction.atomic():
+                    wrapper.cursor().execute('SELECT 1')
+                    other.cursor().execute('BEGIN IMMEDIATE')
+                    other.cursor().execute('ROLLBACK')
+                with write_atomic():
+                    with self.assertRaisesMessage(OperationalError, 'database is locked'):
+                        other.cursor().execute('BEGIN IMMEDIATE')
+
+
+@override_settings(GRAPHQL_READ_REPLICA='replica')
+class ReadReplicaTests(TransactionTestCase):
+    # The test replica mirrors the in-memory test database but runs on its own
+    # connection, which only sees committed rows
+    databases = {'default', 'replica'}
+    query = GraphQLTestCase.query
+
+    def setUp(self):
+        cache.clear()
+        get_shared_cache().clear()
+        self.author = User.objects.create_user(email='staff@example.com', role=User.Role.ADMIN)
+        Newsletter.objects.create(
+            title='Published', content='Body', created_by=self.author, status=Newsletter.Status.PUBLISHED,
+        )
+
+    def run_counted(self, operation, **extra):
+        with CaptureQueriesContext(connections['default']) as primary:
+            with CaptureQueriesContext(connections['replica']) as replica:
+                result = self.query(operation, **extra)
+        self.assertNotIn('errors', result)
+        return len(primary), len(replica)
+
+    def test_queries_read_from_the_replica(self):
+        primary, replica = self.run_counted('{ newsletters { edges { node { title } } } }')
+        self.assertEqual(primary, 0)
+        self.assertGreater(replica, 0)
+
+    @override_settings(GRAPHQL_READ_REPLICA=None)
+    def test_queries_use_the_primary_without_a_replica(self):
+        primary, replica = self.run_counted('{ newsletters { edges { node { title } } } }')
+        self.assertGreater(primary, 0)
+        self.assertEqual(replica, 0)
+
+    def test_client_reads_its_own_writes(self):
+        headers = {'HTTP_AUTHORIZATION': f'JWT {get_token(self.author)}'}
+        primary, replica = self.run_counted(
+            'mutation { createNewsletter(title: "New", content: "Body") { newsletter { id } } }', **headers
+        )
+        self.assertGreater(primary, 0)
+        self.assertEqual(replica, 0)
+
+        primary, replica = self.run_counted('{ me { email } }', **headers)
+        self.assertGreater(primary, 0)
+        self.assertEqual(replica, 0)
+
+        # Other clients are not held on the primary
+        primary, replica = self.run_counted('{ categories { name } }')
+        self.assertEqual(primary, 0)
+
+    def test_users_are_authenticated_on_the_primary(self):
+        headers = {'HTTP_AUTHORIZATION': f'JWT {get_token(self.author)}'}
+        with CaptureQueriesContext(connections['default']) as primary:
+            with CaptureQueriesContext(connections['replica']) as replica:
+                self.assertNotIn('errors', self.query('{ newsletters { edges { node { title } } } }', **headers))
+        self.assertTrue(any('"accounts_user"' in query['sql'] for query in primary))
+        self.assertFalse(any('FROM "accounts_user"' in query['sql'] for query in replica))
+
+    def test_cached_results_are_kept_per_replica_copy(self):
+        operation = '{ newsletters { edges { node { title } } } }'
+        headers = {'HTTP_AUTHORIZATION': f'JWT {get_token(self.author)}'}
+        self.assertGreater(self.run_counted(operation, **headers)[1], 0)
+        self.assertEqual(self.run_counted(operation, **headers)[1], 0)
+
+        # A client held on the primary is not served what was read from the replica
+        routers.record_write(RequestFactory().get('/', **headers))
+        primary, replica = self.run_counted(operation, **headers)
+        self.assertGreater(primary, 1)
+        self.assertEqual(replica, 0)
+
+        # Nor is anyone once the replica has been refreshed
+        self.assertGreater(self.run_counted(operation)[1], 0)
+        self.assertEqual(self.run_counted(operation)[1], 0)
+        with tempfile.TemporaryDirectory() as directory:
+            self.sync_replica(directory)
+        self.assertGreater(self.run_counted(operation)[1], 0)
+
+    def sync_replica(self, directory):
+        name = os.path.join(directory, 'replica.sqlite3')
+        with mock.patch.dict(connections['replica'].settings_dict, NAME=name):
+            call_command('sync_replica', stdout=mock.MagicMock())
+        return name
+
+    def test_sync_replica_copies_the_primary(self):
+        with tempfile.TemporaryDirectory() as directory:
+            copy = sqlite3.connect(self.sync_replica(directory))
+            self.addCleanup(copy.close)
+            titles = copy.execute('SELECT title FROM newsletter_newsletter').fetchall()
+        self.assertEqual(titles, [('Published',)])
+
+    def test_sync_replica_reaches_other_processes(self):
+        # What another web worker sees: its own cache instance on the same files
+        worker_cache = FileBasedCache(settings.CACHES['shared']['LOCATION'], {})
+        key = routers.GENERATION_PREFIX + 'replica'
+        self.assertEqual(worker_cache.get(key, 0), 0)
+        with tempfile.TemporaryDirectory() as directory:
+            self.sync_replica(directory)
+        self.assertEqual(worker_cache.get(key, 0), 1)
+
+        request = RequestFactory().get('/', REMOTE_ADDR='10.0.0.1')
+        routers.record_write(request)
+        self.assertTrue(worker_cache.get(routers.client_key(request)))
+
+
+class PersistedQueryTests(GraphQLTestCase):
+    def post(self, body):
+        return self.client.post('/graphql/', json.dumps(body), content_type='application/json').json()
+
+    def test_hash_only_request_after_registration(self):
+        query = '{ categories { name } }'
+        extensions = {'persistedQuery': {'version': 1, 'sha256Hash': query_hash(query)}}
+
+        result = self.post({'extensions': extensions})
+        self.assertEqual(result['errors'][0]['message'], PERSISTED_QUERY_NOT_FOUND)
+
+        result = self.post({'query': query, 'extensions': extensions})
+        self.assertEqual(result['data'], {'categories': []})
+
+        result = self.post({'extensions': extensions})
+        self.assertEqual(result['data'], {'categories': []})
+
+    def test_mismatched_hash_is_rejected(self):
+        extensions = {'persistedQuery': {'version': 1, 'sha256Hash': 'abc'}}
+        result = self.post({'query': '{ categories { name } }', 'extensions': extensions})
+        self.assertIn('does not match', result['errors'][0]['message'])
+
+    def test_validation_errors_are_cached_per_document(self):
+        cache = get_document_cache(schema)
+        cache.clear()
+        for _ in range(2):
+            result = self.query('{ categories { missing } }')
+            self.assertIn('Cannot query field', result['errors'][0]['message'])
+        self.assertEqual(len(cache._documents), 1)
+
+
+class ResultCacheTests(GraphQLTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(email='staff@example.com')
+        cls.newsletter = Newsletter.objects.create(title='Draft', content='Body', created_by=cls.author)
+
+    def titles(self):
+        result = self.query('{ newsletters { edges { node { title } } } }')
+        return [edge['node']['title'] for edge in result['data']['newsletters']['edges']]
+
+    def test_repeated_operation_is_served_from_cache(self):
+        self.assertEqual(self.titles(), [])
+        with self.assertNumQueries(0):
+            self.assertEqual(self.titles(), [])
+
+    def test_publish_and_archive_invalidate_cached_results(self):
+        self.assertEqual(self.titles(), [])
+        self.newsletter.publish()
+        self.assertEqual(self.titles(), ['Draft'])
+        self.newsletter.archive()
+        self.assertEqual(self.titles(), [])
+
+    def test_category_changes_invalidate_cached_results(self):
+        self.newsletter.publish()
+        query = '{ newsletters { edges { node { categories { name } } } } }'
+        self.assertEqual(self.query(query)['data']['newsletters']['edges'][0]['node']['categories'], [])
+        self.newsletter.categories.add(Category.objects.create(name='School'))
+        result = self.query(query)
+        self.assertEqual(result['data']['newsletters']['edges'][0]['node']['categories'], [{'name': 'School'}])
+
+    def test_private_fields_are_not_cached(self):
+        document = parse('{ me { email } newsletters { edges { cursor } } }')
+        self.assertFalse(is_cacheable(document, document.definitions[0]))
+
+
+class AnnouncementExpiryTests(GraphQLTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(email='staff@example.com')
+        cls.now = timezone.now()
+        for title, expiry in (('Lapsed', -60), ('Soon', 60), ('Later', 3600), ('Forever', None)):
+            Announcement.objects.create(
+                title=title, content='Body', created_by=cls.author,
+                expiry_date=cls.now + timedelta(seconds=expiry) if expiry is not None else None,
+            )
+
+    def titles(self, arguments=''):
+        result = self.query(f'{{ announcements{arguments} {{ edges {{ node {{ title }} }} }} }}')
+        return sorted(edge['node']['title'] for edge in result['data']['announcements']['edges'])
+
+    def test_expired_announcements_are_filtered_in_sql(self):
+        self.assertEqual(self.titles(), ['Forever', 'Later', 'Soon'])
+        self.assertEqual(self.titles('(isActive: false)'), ['Lapsed'])
+        self.assertEqual(Announcement.objects.next_expiry(self.now), self.now + timedelta(seconds=60))
+
+    def test_sweep_deactivates_in_one_update(self):
+        out = mock.MagicMock()
+        with self.assertNumQueries(1):
+            call_command('expire_announcements', stdout=out)
+        self.assertIn('Deactivated 1 expired', out.write.call_args[0][0])
+        self.assertEqual(list(Announcement.objects.filter(is_active=False).values_list('title', flat=True)), ['Lapsed'])
+
+    def test_sweep_invalidates_results_cached_by_other_processes(self):
+        # What a web worker sees: its own cache instance on the same files
+        worker_cache = FileBasedCache(settings.CACHES['shared']['LOCATION'], {})
+        version = get_version()
+        self.assertEqual(worker_cache.get(VERSION_KEY), version)
+        call_command('expire_announcements', stdout=mock.MagicMock())
+        self.assertEqual(worker_cache.get(VERSION_KEY), version + 1)
+
+    def test_cached_results_lapse_at_the_next_expiry(self):
+        self.assertEqual(self.titles(), ['Forever', 'Later', 'Soon'])
+        with self.assertNumQueries(0):
+            self.assertEqual(self.titles(), ['Forever', 'Later', 'Soon'])
+
+        boundary = self.now + timedelta(seconds=60)
+        with mock.patch('daycare_project.caching.time') as clock, mock.patch('django.utils.timezone.now') as now:
+            clock.time.return_value = boundary.timestamp() - 0.001
+            with self.assertNumQueries(0):
+                self.assertEqual(self.titles(), ['Forever', 'Later', 'Soon'])
+            clock.time.return_value = boundary.timestamp()
+            now.return_value = boundary
+            self.assertEqual(self.titles(), ['Forever', 'Later'])
+
+
+class QueryCostTests(GraphQLTestCase):
+    def test_cost_is_reported_in_extensions(self):
+        result = self.query('{ newsletters(first: 5) { edges { node { title createdBy { email } } } } }')
+        self.assertEqual(result['extensions']['cost']['requested'], 1 + 5 * (1 + 1 + 1))
+        self.assertEqual(result['extensions']['cost']['depth'], 4)
+
+    def test_page_size_variables_are_taken_into_account(self):
+        query = 'query ($first: Int) { newsletters(first: $first) { edges { node { title } } } }'
+        result = self.query(query, {'first': 2})
+        self.assertEqual(result['extensions']['cost']['requested'], 1 + 2 * 2)
+
+    def test_union_items_are_charged_for_their_own_fragment(self):
+        query = """
+        {
+            feed(first: 5) {
+                edges {
+                    node {
+                        ... on NewsletterType { createdBy { email } }
+                        ... on AnnouncementType { createdBy { email } }
+                        ... on EventType { title }
+                    }
+                }
+            }
+        }
+        """
+        result = self.query(query)
+        self.assertEqual(result['extensions']['cost']['requested'], 1 + 5 * (1 + 1 + 1))
+        self.assertEqual(result['extensions']['cost']['depth'], 4)
+
+    def test_recursive_relations_are_rejected(self):
+        query = """
+        {
+            newsletters {
+                edges { node { recipients { user { receivedNewsletters { newsletter { recipients { id } } } } } } }
+            }
+        }
+        """
+        result = self.query(query)
+        self.assertNotIn('data', result)
+        self.assertEqual(result['errors'][0]['extensions']['code'], 'QUERY_TOO_COMPLEX')
+        self.assertGreater(result['extensions']['cost']['requested'], result['extensions']['cost']['maximum'])
+
+
+class ResolverMetricsTests(GraphQLTestCase):
+    query_text = 'query Recent { newsletters { edges { node { title createdBy { email } } } } }'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user(email='staff@example.com', is_staff=True)
+        for i in range(3):
+            Newsletter.objects.create(
+                title=f'Newsletter {i}', content='Body', created_by=cls.staff,
+                status=Newsletter.Status.PUBLISHED,
+            )
+
+    def post(self, body, **extra):
+        return self.client.post('/graphql/', json.dumps(body), content_type='application/json', **extra).json()
+
+    def test_staff_can_request_metrics_in_extensions(self):
+        result = self.post(
+            {'query': self.query_text, 'extensions': {'metrics': True}},
+            HTTP_AUTHORIZATION=f'JWT {get_token(self.staff)}',
+        )
+        metrics = result['extensions']['metrics']
+        self.assertEqual(metrics['operation'], 'Recent')
+        resolvers = {entry['path']: entry for entry in metrics['resolvers']}
+        self.assertEqual(resolvers['newsletters']['count'], 1)
+        self.assertEqual(resolvers['newsletters']['sqlCount'], 1)
+        self.assertEqual(resolvers['newsletters.edges.node.createdBy']['count'], 3)
+        self.assertNotIn('newsletters.edges.node.title', resolvers)
+        self.assertGreaterEqual(metrics['sqlCount'], 1)
+
+    def test_metrics_are_not_reported_to_anonymous_clients(self):
+        result = self.post({'query': self.query_text, 'extensions': {'metrics': True}})
+        self.assertNotIn('metrics', result['extensions'])
+
+    def test_histogram_dump(self):
+        registry.reset()
+        self.post({'query': self.query_text})
+        self.client.force_login(self.staff)
+        snapshot = self.client.get('/graphql/metrics/').json()
+        operation = snapshot['operations']['Recent']
+        self.assertEqual(operation['count'], 1)
+        self.assertEqual(operation['resolvers']['newsletters.edges.node.createdBy']['count'], 1)
+
+    def test_operation_names_are_bounded(self):
+        registry.reset()
+        with mock.patch('daycare_project.metrics.MAX_OPERATIONS', 2), mock.patch('daycare_project.metrics.MAX_RESOLVERS', 3):
+            for name in ('First', 'Second', 'Third', 'Fourth'):
+                self.post({'query': self.query_text.replace('Recent', name)})
+        operations = registry.snapshot()['operations']
+        self.assertEqual(sorted(operations), ['<other>', 'First', 'Second'])
+        self.assertEqual(operations['<other>']['count'], 2)
+        self.assertEqual(len(operations['First']['resolvers']), 4)
+        self.assertEqual(list(operations['Second']['resolvers']), ['<other>'])
+        self.assertEqual(operations['<other>']['resolvers']['<other>']['count'], 2 * 4)
+
+
+class AsyncGraphQLTests(GraphQLTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(email='staff@example.com', role=User.Role.ADMIN)
+        cls.category = Category.objects.create(name='School')
+        for i in range(3):
+            newsletter = Newsletter.objects.create(
+                title=f'Newsletter {i}', content='Body', created_by=cls.author,
+                status=Newsletter.Status.PUBLISHED,
+            )
+            newsletter.categories.add(cls.category)
+        cls.newsletter = newsletter
+
+    async def aquery(self, query, variables=None, **extra):
+        response = await self.async_client.post(
+            '/graphql/async/',
+            json.dumps({'query': query, 'variables': variables or {}}),
+            content_type='application/json',
+            **extra
+        )
+        return response.json()
+
+    async def test_matches_synchronous_endpoint(self):
+        query = """
+        query ($id: ID) {
+            newsletters(first: 2) {
+                edges { cursor node { title createdBy { email } categories { name } } }
+                pageInfo { hasNextPage endCursor }
+            }
+            newsletter(id: $id) { title }
+            categories { name }
+        }
+        """
+        variables = {'id': self.newsletter.pk}
+        result = await self.aquery(query, variables)
+        self.assertNotIn('errors', result)
+        await sync_to_async(cache.clear)()
+        expected = await sync_to_async(self.query)(query, variables)
+        self.assertEqual(result['data'], expected['data'])
+        self.assertTrue(result['data']['newsletters']['pageInfo']['hasNextPage'])
+
+    async def test_me_shows_own_counts(self):
+        await UserNewsletterCounter.objects.acreate(user=self.author, received=3, unread=2)
+        token = await sync_to_async(get_token)(self.author)
+        result = await self.aquery(
+            '{ me { email unreadNewsletters receivedNewsletterCount } }',
+            headers={'Authorization': f'JWT {token}'},
+        )
+        self.assertNotIn('errors', result)
+        self.assertEqual(
+            result['data']['me'],
+            {'email': 'staff@example.com', 'unreadNewsletters': 2, 'receivedNewsletterCount': 3},
+        )
+
+    async def test_authenticated_mutation(self):
+        token = await sync_to_async(get_token)(self.author)
+        result = await self.aquery(
+            'mutation { createNewsletter(title: "Async", content: "Body") { newsletter { title createdBy { email } } } }',
+            headers={'Authorization': f'JWT {token}'},
+        )
+        self.assertEqual(
+            result['data']['createNewsletter']['newsletter'],
+            {'title': 'Async', 'createdBy': {'email': 'staff@example.com'}},
+        )
+
+    async def test_invalid_token_is_rejected(self):
+        result = await self.aquery('{ me { email } }', headers={'Authorization': 'JWT invalid'})
+        self.assertEqual(result['errors'][0]['message'], 'Error decoding signature')
@@ -0,0 +1,152 @@
+"""
+Open and click tracking for delivered newsletters.
+
+Every delivered message carries a tracking pixel and click redirects whose
+URLs embed a signed token naming the recipient (and, for clicks, the target
+URL), so recording an event needs neither a login nor a lookup.
+
+Events are not written as they arrive: a burst of opens right after a send
+would otherwise queue up on SQLite's single writer lock. They are collected in
+a per-process ``TrackingBuffer`` and flushed as a handful of set-based
+``UPDATE ... WHERE opened_at IS NULL`` statements, by a background thread every
+``FLUSH_INTERVAL`` seconds or inline once ``MAX_BUFFER`` events are pending.
+"""
+import atexit
+import logging
+import re
+import threading
+import time
+from html import unescape
+
+from django.conf import settings
+from django.core import signing
+from django.db import OperationalError, connection
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import NewsletterRecipient
+
+logger = logging.getLogger(__name__)
+
+SALT = 'newsletter.tracking'
+
+DEFAULTS = {
+    'BASE_URL': 'http://localhost:8000',
+    'FLUSH_INTERVAL': 5,
+    'MAX_BUFFER': 1000,
+}
+
+# Events written per transaction; SQLite caps the bound parameters per statement
+UPDATE_CHUNK_SIZE = 500
+
+LINK_RE = re.compile(r'href="(https?://[^"]+)"')
+
+
+def get_option(name):
+    return getattr(settings, 'NEWSLETTER_TRACKING', {}).get(name, DEFAULTS[name])
+
+
+def make_token(recipient_id, url=None):
+    value = [recipient_id, url] if url else [recipient_id]
+    return signing.dumps(value, salt=SALT, compress=True)
+
+
+def read_token(token):
+    """Return ``(recipient_id, url)`` from a token, or raise ``signing.BadSignature``."""
+    value = signing.loads(token, salt=SALT)
+    if not isinstance(value, list) or not value or not isinstance(value[0], int):
+        raise signing.BadSignature('Malformed tracking token.')
+    return value[0], value[1] if len(value) > 1 else None
+
+
+def absolute_url(path):
+    return get_option('BASE_URL').rstrip('/') + path
+
+
+def personalize(html, recipient_id):
+    """Point the links of a rendered body at the click redirect and add the pixel."""
+    def track(match):
+        token = make_token(recipient_id, unescape(match.group(1)))
+        return 'href="%s"' % absolute_url(reverse('newsletter:click', args=[token]))
+
+    pixel = absolute_url(reverse('newsletter:open', args=[make_token(recipient_id)]))
+    img = f'<img src="{pixel}" width="1" height="1" alt="">'
+    html = LINK_RE.sub(track, html)
+    if '</body>' in html:
+        return html.replace('</body>', img + '</body>', 1)
+    return html + img
+
+
+class TrackingBuffer:
+    """Open and click events waiting to be written."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.opened = set()
+        self.clicked = set()
+        self.thread = None
+
+    def __len__(self):
+        return len(self.opened) + len(self.clicked)
+
+    def add(self, recipient_id, clicked=False):
+        with self.lock:
+            (self.clicked if clicked else self.opened).add(recipient_id)
+            full = len(self) >= get_option('MAX_BUFFER')
+        if full:
+            self.flush()
+        else:
+            self.start()
+
+    def start(self):
+        """Start the background flusher unless it runs already or is disabled."""
+        interval = get_option('FLUSH_INTERVAL')
+        if not interval or (self.thread and self.thread.is_alive()):
+            return
+        with self.lock:
+            if self.thread and self.thread.is_alive():
+                return
+            self.thread = threading.Thread(target=self._run, args=(interval,), name='tracking-flush', daemon=True)
+            self.thread.start()
+
+    def _run(self, interval):
+        while True:
+            time.sleep(interval)
+            try:
+                self.flush()
+            except Exception:
+                # Losing one flush beats a dead thread and a buffer that only grows
+                logger.exception('Could not flush tracking events')
+            finally:
+                connection.close()
+
+    def flush(self):
+        """Write the pending events; return how many rows changed."""
+        with self.lock:
+            opened, self.opened = self.opened, set()
+            clicked, self.clicked = self.clicked, set()
+        if not opened and not clicked:
+            return 0
+
+        now = timezone.now()
+        try:
+            changed = 0
+            opened_ids, clicked_ids = sorted(opened), sorted(clicked)
+            for start in range(0, max(len(opened_ids), len(clicked_ids)), UPDATE_CHUNK_SIZE):
+                changed += NewsletterRecipient.objects.record_engagement(
+                    opened_ids[start:start + UPDATE_CHUNK_SIZE],
+                    clicked_ids[start:start + UPDATE_CHUNK_SIZE],
+                    now,
+                )
+        except OperationalError:
+            # The database is busy; keep the events for the next flush
+            logger.warning('Could not flush tracking events; retrying later', exc_info=True)
+            with self.lock:
+                self.opened |= opened
+                self.clicked |= clicked
+            return 0
+        return changed
+
+
+buffer = TrackingBuffer()
+atexit.register(buffer.flush)
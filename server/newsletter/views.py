@@ -1,3 +1,38 @@
-from django.shortcuts import render
+import base64
 
-# Create your views here.
+from django.core import signing
+from django.http import Http404, HttpResponse, HttpResponseRedirect
+from django.views.decorators.cache import never_cache
+from django.views.decorators.http import require_GET
+
+from . import tracking
+
+# A transparent 1x1 GIF
+PIXEL = base64.b64decode('R0lGODlhAQABAIAAAAAAAP///yH5BAEAAAAALAAAAAABAAEAAAIBRAA7')
+
+
+@require_GET
+@never_cache
+def track_open(request, token):
+    """Record that a recipient opened a newsletter and serve the tracking pixel."""
+    try:
+        recipient_id, _ = tracking.read_token(token)
+    except signing.BadSignature:
+        pass
+    else:
+        tracking.buffer.add(recipient_id)
+    return HttpResponse(PIXEL, content_type='image/gif')
+
+
+@require_GET
+@never_cache
+def track_click(request, token):
+    """Record that a recipient followed a link and redirect to its target."""
+    try:
+        recipient_id, url = tracking.read_token(token)
+    except signing.BadSignature:
+        raise Http404('Invalid tracking link.')
+    if not url:
+        raise Http404('Invalid tracking link.')
+    tracking.buffer.add(recipient_id, clicked=True)
+    return HttpResponseRedirect(url)